@@ -1,3 +1,5 @@
+import multiprocessing
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -7,11 +9,13 @@ from datetime import datetime, timezone
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from config import config_by_name
+from .cache import SharedCache
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 migrate = Migrate()
 csrf = CSRFProtect()
+cache = SharedCache()
 scheduler = BackgroundScheduler(daemon=True)
 
 login_manager.login_view = 'auth.login'
@@ -33,12 +37,48 @@ def create_app(config_name='dev'):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
+    cache.init_app(app)
 
     from . import models
+    from . import counters
+    app.cli.add_command(counters.counters_cli)
+
+    from .receipts import receipt_cache
+    receipt_cache.init_app(app)
+
+    from .qr_codes import qr_cache
+    qr_cache.init_app(app)
+
+    from .numbering import document_numbers
+    document_numbers.init_app(app)
+
+    from .product_index import product_index
+    product_index.init_app(app)
+
+    from . import search
+    app.cli.add_command(search.search_cli)
+
+    from . import rollups
+    app.cli.add_command(rollups.rollups_cli)
+
+    from .importer import import_cli
+    app.cli.add_command(import_cli)
+
+    from .line_messaging import line_bot, schedule_line_jobs
+    line_bot.init_app(app)
+
+    from .notifications import job_notifier, line_cli
+    job_notifier.init_app(app)
+    app.cli.add_command(line_cli)
+
+    from .user_cache import user_cache
+
+    from .fragment_cache import fragment_cache
+    fragment_cache.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(models.User, int(user_id))
+        return user_cache.get(int(user_id))
 
     @app.context_processor
     def inject_global_vars():
@@ -76,10 +116,8 @@ def create_app(config_name='dev'):
     app.register_blueprint(settings_bp, url_prefix='/settings')
 
     from .blueprints.linebot import linebot_bp
-    from .blueprints.linebot.routes import handler as linebot_handler
-    
-    if app.config['LINE_CHANNEL_SECRET']:
-        linebot_handler.channel_secret = app.config['LINE_CHANNEL_SECRET']
+    # LINE ยืนยันคำขอด้วยลายเซ็น X-Line-Signature แทน CSRF token
+    csrf.exempt(linebot_bp)
     app.register_blueprint(linebot_bp, url_prefix='/linebot')
 
     from .blueprints.ai_tools import ai_tools_bp
@@ -102,9 +140,14 @@ def create_app(config_name='dev'):
             db.session.add(admin_user)
             db.session.commit()
             print("Default admin user created.")
+
+        counters.ensure_counter_rows()
+        search.ensure_search_index()
         
-        if not scheduler.running:
-            # Add scheduled jobs here in the future
+        # process ลูกของ process pool (spawn) ที่ import โมดูลหลักซ้ำ ไม่ต้องมีงานตั้งเวลาของตัวเอง
+        if not scheduler.running and multiprocessing.parent_process() is None:
+            rollups.schedule_rollup_jobs(app, scheduler)
+            schedule_line_jobs(app, scheduler)
             scheduler.start()
 
     return app
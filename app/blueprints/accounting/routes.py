@@ -1,21 +1,169 @@
-from flask import render_template, Response
+from flask import render_template, Response, request, url_for, send_file, jsonify, current_app, stream_with_context
 from flask_login import login_required
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 from . import accounting_bp
-from app.models import Sale
-from app.utils import generate_receipt_pdf
+from app import db
+from app.models import Sale, PaymentStatus
+from app.pagination import keyset_paginate, decode_cursor, clamp_page_size
+from app.utils import generate_receipt_pdf, parse_date_arg, thai_day_start_utc, THAILAND_TZ
+from app.receipts import receipt_cache, receipt_fingerprint, load_sale_items, iter_receipts_zip
+from app.decorators import admin_required
+from app.rollups import sales_summary
+from app.exports import sales_export_rows, export_response
+
+def _selected_period(year_to_date=False):
+    """ช่วงวันที่ที่เลือก (ตามเวลาไทย) หากไม่ระบุจะใช้ตั้งแต่ต้นเดือน (หรือต้นปี) ปัจจุบันถึงวันนี้"""
+    today = datetime.now(THAILAND_TZ).date()
+    date_from = parse_date_arg('date_from') or today.replace(month=1 if year_to_date else today.month, day=1)
+    date_to = parse_date_arg('date_to') or today
+    if date_to < date_from:
+        date_from, date_to = date_to, date_from
+    return date_from, date_to
+
+def _period_filter(date_from, date_to):
+    return (
+        Sale.created_at >= thai_day_start_utc(date_from),
+        Sale.created_at < thai_day_start_utc(date_to + timedelta(days=1)),
+    )
+
+def _period_summary(period_filter, cursor):
+    """
+    คำนวณยอดสรุปของช่วงวันที่ที่เลือกด้วย aggregate query เดียว:
+    จำนวนบิล, ยอดรวม, ยอดแยกตามสถานะการชำระ และยอดของแถวที่แสดงไปแล้วในหน้าก่อนๆ
+    (ใช้หา "ยอดสะสม" ของแถวแรกในหน้านี้โดยไม่ต้องรวมยอดใน Python)
+    """
+    shown_before = None
+    position = decode_cursor(cursor)
+    if position:
+        last_created, last_id = position
+        shown_before = or_(
+            Sale.created_at > last_created,
+            and_(Sale.created_at == last_created, Sale.id >= last_id)
+        )
+
+    row = db.session.query(
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.total_amount), 0),
+        func.coalesce(func.sum(case((Sale.payment_status == PaymentStatus.PAID, Sale.total_amount), else_=0)), 0),
+        func.coalesce(func.sum(case((Sale.payment_status == PaymentStatus.PENDING, Sale.total_amount), else_=0)), 0),
+        func.coalesce(func.sum(case((shown_before, Sale.total_amount), else_=0)), 0) if shown_before is not None else db.literal(0),
+    ).filter(*period_filter).one()
+
+    return {
+        'count': row[0],
+        'total': float(row[1]),
+        'paid': float(row[2]),
+        'pending': float(row[3]),
+        'shown_before': float(row[4]),
+    }
 
 @accounting_bp.route('/')
 @login_required
 def sale_history():
-    sales = Sale.query.order_by(Sale.created_at.desc()).all()
-    return render_template('accounting/sale_list.html', sales=sales)
+    date_from, date_to = _selected_period()
+    period_filter = _period_filter(date_from, date_to)
+    cursor = request.args.get('cursor', type=str)
+
+    # โหลดลูกค้าและพนักงานขายมาใน query เดียวกับรายการขาย
+    sales_query = Sale.query.options(
+        joinedload(Sale.customer),
+        joinedload(Sale.salesperson)
+    ).filter(*period_filter)
+    page = keyset_paginate(sales_query, Sale.created_at, Sale.id,
+                           cursor=cursor,
+                           limit=clamp_page_size(request.args.get('per_page', type=int), default=50))
+    summary = _period_summary(period_filter, cursor)
+
+    # ยอดสะสมตั้งแต่ต้นช่วงจนถึงแต่ละแถว (รายการเรียงจากใหม่ไปเก่า จึงไล่ลดลงทีละแถว)
+    running_totals = []
+    running = summary['total'] - summary['shown_before']
+    for sale in page.items:
+        running_totals.append(running)
+        running -= sale.total_amount
+
+    period_args = {'date_from': date_from.isoformat(), 'date_to': date_to.isoformat()}
+    next_url = url_for('accounting.sale_history', cursor=page.next_cursor, **period_args) if page.has_more else None
+    first_page_url = url_for('accounting.sale_history', **period_args) if cursor else None
+
+    return render_template('accounting/sale_list.html',
+                           sales=zip(page.items, running_totals),
+                           summary=summary,
+                           date_from=date_from,
+                           date_to=date_to,
+                           next_url=next_url,
+                           first_page_url=first_page_url)
+
+@accounting_bp.route('/export/sales.<any(csv, xlsx):fmt>')
+@login_required
+def export_sales(fmt):
+    """ส่งออกบิลพร้อมรายการสินค้าในช่วงวันที่ที่เลือกเป็น CSV หรือ Excel (อ่านและส่งทีละชุด)"""
+    date_from, date_to = _selected_period()
+    header, rows = sales_export_rows(_period_filter(date_from, date_to))
+    return export_response(f"sales_{date_from.isoformat()}_{date_to.isoformat()}", fmt, header, rows)
+
+@accounting_bp.route('/summary')
+@login_required
+def sales_report():
+    """สรุปยอดขายตามเดือน สถานะการชำระ สินค้า และพนักงานขาย — อ่านจากตารางสรุปรายวันเท่านั้น"""
+    date_from, date_to = _selected_period(year_to_date=True)
+    return render_template('accounting/sales_summary.html',
+                           report=sales_summary(date_from, date_to),
+                           payment_statuses=list(PaymentStatus),
+                           date_from=date_from,
+                           date_to=date_to)
+
+def _receipt_headers(response, key, sale):
+    response.set_etag(key)
+    # URL /receipt/<id>/pdf ให้ใบเสร็จที่ต่างกันได้เมื่อชื่อลูกค้า/พนักงานเปลี่ยน จึงให้ถามซ้ำทุกครั้ง (ได้ 304 ถ้าไม่เปลี่ยน)
+    # เก็บไว้ได้นานแบบ immutable เฉพาะเมื่อ URL ระบุ ?v=<key> ตรงกับเนื้อหาปัจจุบัน (private เพราะต้องล็อกอิน)
+    if request.args.get('v') == key:
+        response.headers['Cache-Control'] = f"private, max-age={current_app.config['RECEIPT_CACHE_MAX_AGE']}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Content-Disposition'] = f'attachment;filename=receipt_{sale.sale_number}.pdf'
+    return response
 
 @accounting_bp.route('/receipt/<int:sale_id>/pdf')
 @login_required
 def receipt_pdf(sale_id):
-    sale = Sale.query.get_or_404(sale_id)
-    pdf_data = generate_receipt_pdf(sale)
-    
-    return Response(pdf_data,
-                    mimetype='application/pdf',
-                    headers={'Content-Disposition': f'attachment;filename=receipt_{sale.sale_number}.pdf'})
+    sale = Sale.query.options(
+        joinedload(Sale.customer),
+        joinedload(Sale.salesperson)
+    ).filter(Sale.id == sale_id).first_or_404()
+    items = load_sale_items(sale)
+    key = receipt_fingerprint(sale, items)
+
+    # เบราว์เซอร์มีไฟล์นี้อยู่แล้ว ไม่ต้องอ่านไฟล์หรือ render ใหม่
+    if key in request.if_none_match:
+        return _receipt_headers(Response(status=304), key, sale)
+
+    path, pdf_data = receipt_cache.get_or_render(key, lambda: generate_receipt_pdf(sale, items))
+    if path:
+        response = send_file(path, mimetype='application/pdf', conditional=False, etag=False)
+    else:
+        response = Response(pdf_data, mimetype='application/pdf')
+    return _receipt_headers(response, key, sale)
+
+@accounting_bp.route('/receipt/cache_stats')
+@login_required
+@admin_required
+def receipt_cache_stats():
+    """สถิติ hit/miss ของ cache ใบเสร็จสำหรับ monitoring"""
+    return jsonify(receipt_cache.snapshot())
+
+@accounting_bp.route('/receipts/export.zip')
+@login_required
+def export_receipts():
+    """
+    ดาวน์โหลดใบเสร็จทุกใบในช่วงวันที่ที่เลือกเป็นไฟล์ ZIP
+    ส่งข้อมูลออกไปทีละส่วนระหว่างที่ render (ไม่เก็บ ZIP ทั้งไฟล์ไว้ในหน่วยความจำ)
+    """
+    date_from, date_to = _selected_period()
+    stream = iter_receipts_zip(_period_filter(date_from, date_to),
+                               workers=current_app.config['RECEIPT_EXPORT_WORKERS'])
+    filename = f"receipts_{date_from.isoformat()}_{date_to.isoformat()}.zip"
+    return Response(stream_with_context(stream),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment;filename={filename}'})
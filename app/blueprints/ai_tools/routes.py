@@ -1,36 +1,124 @@
-from flask import jsonify
+import hashlib
+import json
+
+from flask import jsonify, request, Response, stream_with_context
 from flask_login import login_required
 # [แก้ไข] Import Blueprint object จาก __init__.py เข้ามาใช้งาน
 from . import ai_tools_bp
 from app import db
-from app.models import ServiceJob
+from app.models import ServiceJob, JobUpdate, User
+from sqlalchemy import func, exists
+
+# จำนวน update สูงสุดต่อการเรียกหนึ่งครั้ง (เมื่อใช้ since/limit)
+HISTORY_MAX_LIMIT = 500
+# จำนวนแถวที่อ่านจากฐานข้อมูลต่อครั้งระหว่างส่งแบบ ndjson
+HISTORY_STREAM_BATCH = 200
+
+def _history_etag(job, since, limit, fmt):
+    """
+    ETag ของประวัติงาน คำนวณจาก update ล่าสุด (id สูงสุดและจำนวน ผ่าน index (service_job_id, id))
+    รวมกับข้อมูลงานและพารามิเตอร์ของคำขอ — ไม่ต้องอ่าน update ทั้งหมดเพื่อตอบ 304
+    """
+    last_id, count = db.session.query(func.max(JobUpdate.id), func.count(JobUpdate.id)) \
+        .filter(JobUpdate.service_job_id == job.id).one()
+    raw = json.dumps([job.id, last_id, count, job.title, job.problem_description, since, limit, fmt],
+                     ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _history_query(job_id, since, until=None):
+    """update ที่ id อยู่ในช่วง (since, until] เรียงจากเก่าไปใหม่ พร้อมชื่อผู้บันทึกใน query เดียว"""
+    query = db.session.query(
+        JobUpdate.id, JobUpdate.created_at, JobUpdate.summary, User.first_name, User.last_name
+    ).join(User, User.id == JobUpdate.author_id) \
+        .filter(JobUpdate.service_job_id == job_id, JobUpdate.id > since)
+    if until is not None:
+        query = query.filter(JobUpdate.id <= until)
+    return query.order_by(JobUpdate.id)
+
+def _history_page(job_id, since, limit):
+    """
+    (next_since, has_more) ของหน้าที่ขอ — อ่านเฉพาะ index (service_job_id, id) ไม่อ่านเนื้อหา update
+    ทำให้ส่งข้อมูลหน้านั้นทีละชุดได้โดยรู้ข้อมูลการแบ่งหน้าตั้งแต่บรรทัดแรก
+    """
+    ids = db.session.query(JobUpdate.id) \
+        .filter(JobUpdate.service_job_id == job_id, JobUpdate.id > since) \
+        .order_by(JobUpdate.id)
+    if limit is not None:
+        ids = ids.limit(limit)
+    last_id = db.session.query(func.max(ids.subquery().c.id)).scalar()
+    if last_id is None:
+        return since, False
+    has_more = limit is not None and db.session.query(
+        exists().where(JobUpdate.service_job_id == job_id, JobUpdate.id > last_id)
+    ).scalar()
+    return last_id, has_more
+
+def _update_dict(row):
+    return {
+        "id": row.id,
+        "created_at": row.created_at.isoformat(),
+        "author": f"{row.first_name} {row.last_name}",
+        "summary": row.summary,
+    }
+
+def _history_headers(response, etag):
+    response.set_etag(etag)
+    # ให้ client ถามซ้ำทุกครั้ง (ได้ 304 ถ้าไม่มี update ใหม่)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @ai_tools_bp.route('/get_job_history/<int:job_id>')
 @login_required
 def get_job_history(job_id):
     """
-    API Endpoint ที่ส่งคืนประวัติการอัปเดตทั้งหมดของงานซ่อม
-    ในรูปแบบ JSON เพื่อให้ JavaScript นำไปใช้ต่อ
+    API Endpoint ที่ส่งคืนประวัติการอัปเดตของงานซ่อม เรียงจากเก่าไปใหม่เพื่อให้ AI อ่านง่าย
+    - since: ส่งเฉพาะ update ที่ id มากกว่าค่านี้ (ใช้ next_since ของคำตอบก่อนหน้า)
+    - limit: จำนวน update ต่อครั้ง (ไม่เกิน HISTORY_MAX_LIMIT)
+      ถ้าไม่ระบุทั้ง since และ limit จะส่งประวัติทั้งหมดเหมือนเดิม (ผู้เรียกเดิมได้ครบทุก update)
+    - format=ndjson: ส่งแบบ newline-delimited JSON ทีละบรรทัด (บรรทัดแรกเป็นข้อมูลงาน)
+    รองรับ If-None-Match — ถ้าไม่มีอะไรเปลี่ยนจะตอบ 304 โดยไม่อ่านประวัติ
     """
     job = db.session.get(ServiceJob, job_id)
     if not job:
         return jsonify({"error": "Job not found"}), 404
 
-    history = []
-    # ดึงข้อมูลจาก relationship 'updates' ที่เราสร้างไว้ใน model
-    for update in job.updates:
-        history.append(
-            f"- {update.created_at.strftime('%d/%m/%Y %H:%M')} "
-            f"โดย {update.author.full_name}: {update.summary}"
-        )
-    
-    # เรียงลำดับจากเก่าไปใหม่เพื่อให้ AI อ่านง่าย
-    history.reverse()
-    
-    history_text = "\n".join(history)
-    
-    return jsonify({
+    since = max(request.args.get('since', 0, type=int), 0)
+    limit = request.args.get('limit', type=int)
+    if 'since' not in request.args and 'limit' not in request.args:
+        limit = None
+    else:
+        limit = HISTORY_MAX_LIMIT if not limit or limit < 1 else min(limit, HISTORY_MAX_LIMIT)
+    fmt = 'ndjson' if request.args.get('format') == 'ndjson' else 'json'
+
+    etag = _history_etag(job, since, limit, fmt)
+    if etag in request.if_none_match:
+        return _history_headers(Response(status=304), etag)
+
+    next_since, has_more = _history_page(job.id, since, limit)
+    meta = {
         "job_title": job.title,
         "problem_description": job.problem_description,
-        "history": history_text
-    })
+        "next_since": next_since,
+        "has_more": has_more,
+    }
+
+    if fmt == 'ndjson':
+        def generate():
+            yield json.dumps(meta, ensure_ascii=False) + '\n'
+            # อ่านทีละ HISTORY_STREAM_BATCH แถวระหว่างส่ง — ไม่เก็บประวัติทั้งหน้าไว้ในหน่วยความจำ
+            result = db.session.execute(
+                _history_query(job.id, since, next_since).statement
+                .execution_options(yield_per=HISTORY_STREAM_BATCH)
+            )
+            for row in result:
+                yield json.dumps(_update_dict(row), ensure_ascii=False) + '\n'
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        return _history_headers(response, etag)
+
+    rows = _history_query(job.id, since, next_since).all()
+    history_text = "\n".join(
+        f"- {row.created_at.strftime('%d/%m/%Y %H:%M')} โดย {row.first_name} {row.last_name}: {row.summary}"
+        for row in rows
+    )
+    response = jsonify(dict(meta, history=history_text, updates=[_update_dict(row) for row in rows]))
+    return _history_headers(response, etag)
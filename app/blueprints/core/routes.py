@@ -1,48 +1,98 @@
-from flask import render_template
+from flask import render_template, current_app, request, jsonify, url_for
 from flask_login import login_required
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from . import core_bp
-from app.models import ServiceJob, ServiceJobStatus
+from app import db, cache
+from app.models import ServiceJob
+from app.counters import job_counts, PENDING_JOB_STATUSES
+from app.search import search, SEARCH_SOURCES
+from app.conditional import conditional_view, read_table_versions
 from datetime import datetime, timedelta
 import pytz
 
 THAILAND_TZ = pytz.timezone('Asia/Bangkok')
 
+def _compute_job_stats(today_start_thai):
+    """
+    สถิติงานสำหรับ Dashboard: จำนวนรวม/เสร็จแล้ว/ค้างอยู่ อ่านจาก stat_counter (O(1))
+    ส่วน "งานนัดหมายวันนี้" ขึ้นกับวันที่ จึงนับด้วย query ช่วงเวลาบน index ของ due_date
+    """
+    today_start_utc = today_start_thai.astimezone(pytz.utc)
+    today_end_utc = (today_start_thai + timedelta(days=1)).astimezone(pytz.utc)
+
+    stats = job_counts()
+    stats['today'] = db.session.query(func.count(ServiceJob.id)).filter(
+        ServiceJob.due_date >= today_start_utc,
+        ServiceJob.due_date < today_end_utc,
+        ServiceJob.status.in_(PENDING_JOB_STATUSES)
+    ).scalar()
+    return stats
+
 @core_bp.route('/')
 @core_bp.route('/dashboard')
 @login_required
+# จำนวน "งานวันนี้" เปลี่ยนตามวัน จึงรวมวันที่ (เวลาไทย) ไว้ใน ETag ด้วย
+@conditional_view('service_job', 'customer', key=lambda: datetime.now(THAILAND_TZ).date().isoformat())
 def dashboard():
     """
     หน้า Dashboard หลักที่ได้รับการปรับปรุง UI/UX
     """
-    jobs_query = ServiceJob.query
+    today_start_thai = datetime.now(THAILAND_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
 
     # --- Logic การนับสถิติ ---
-    total_jobs = jobs_query.count()
-    completed_jobs = jobs_query.filter(ServiceJob.status == ServiceJobStatus.COMPLETED).count()
-    
-    pending_jobs = jobs_query.filter(
-        ServiceJob.status.notin_([ServiceJobStatus.COMPLETED, ServiceJobStatus.CANCELLED])
-    ).count()
+    # แคชไว้สั้นๆ และใช้ร่วมกันทุก worker เพื่อให้การรีเฟรชถี่ๆ ไปถึงฐานข้อมูลเพียงครั้งเดียว
+    # key มีวันที่ (จำนวน "งานวันนี้" เปลี่ยนตามวัน) และ version ของตาราง service_job ตัวเดียวกับที่ใช้ทำ ETag
+    # — แก้งานเมื่อไหร่ก็ได้ key ใหม่ทันที ไม่มีทางที่หน้าเก่าจะได้ ETag ใหม่
+    (job_version,), _ = read_table_versions(['service_job'])
+    stats = cache.get_or_set(
+        f"dashboard:job_stats:{today_start_thai.date().isoformat()}:{job_version}",
+        lambda: _compute_job_stats(today_start_thai),
+        ttl=current_app.config['DASHBOARD_CACHE_SECONDS']
+    )
 
-    today_start_thai = datetime.now(THAILAND_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end_thai = today_start_thai + timedelta(days=1)
-    
-    today_start_utc = today_start_thai.astimezone(pytz.utc)
-    today_end_utc = today_end_thai.astimezone(pytz.utc)
-    
-    today_jobs_count = jobs_query.filter(
-        ServiceJob.due_date >= today_start_utc,
-        ServiceJob.due_date < today_end_utc,
-        ServiceJob.status.notin_([ServiceJobStatus.COMPLETED, ServiceJobStatus.CANCELLED])
-    ).count()
+    recent_jobs = ServiceJob.query.options(joinedload(ServiceJob.customer)) \
+        .order_by(ServiceJob.created_at.desc(), ServiceJob.id.desc()).limit(10).all()
 
-    stats = {
-        'total': total_jobs,
-        'completed': completed_jobs,
-        'pending': pending_jobs,
-        'today': today_jobs_count
-    }
+    return render_template('core/dashboard.html', stats=stats, recent_jobs=recent_jobs)
 
-    recent_jobs = jobs_query.order_by(ServiceJob.created_at.desc()).limit(10).all()
+SEARCH_TYPE_LABELS = {'customer': 'ลูกค้า', 'job': 'งานซ่อม', 'product': 'สินค้า'}
 
-    return render_template('core/dashboard.html', stats=stats, recent_jobs=recent_jobs)
+def _search_args():
+    """อ่านคำค้น/ประเภท/หน้า จาก query string (ประเภทที่ไม่รู้จักถือว่าค้นทั้งหมด)"""
+    query = request.args.get('q', '', type=str).strip()
+    entity_type = request.args.get('type', '', type=str)
+    if entity_type not in SEARCH_SOURCES:
+        entity_type = ''
+    page = max(request.args.get('page', 1, type=int), 1)
+    return query, entity_type, page
+
+@core_bp.route('/search')
+@login_required
+@conditional_view('customer', 'service_job', 'product')
+def global_search():
+    """ค้นหารวม ลูกค้า / งานซ่อม / สินค้า เรียงตามความเกี่ยวข้อง"""
+    query, entity_type, page = _search_args()
+    results = search(query, entity_type or None, page=page)
+    args = dict(q=query, type=entity_type or None)
+    return render_template(
+        'core/search.html',
+        query=query,
+        entity_type=entity_type,
+        type_labels=SEARCH_TYPE_LABELS,
+        results=results,
+        prev_url=url_for('core.global_search', page=page - 1, **args) if page > 1 else None,
+        next_url=url_for('core.global_search', page=page + 1, **args) if results.has_more else None
+    )
+
+@core_bp.route('/api/search')
+@login_required
+@conditional_view('customer', 'service_job', 'product')
+def global_search_api():
+    query, entity_type, page = _search_args()
+    results = search(query, entity_type or None, page=page)
+    return jsonify({
+        'items': [item._asdict() for item in results.items],
+        'page': results.page,
+        'has_more': results.has_more
+    })
@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SubmitField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import BooleanField, StringField, TextAreaField, SubmitField
 from wtforms.validators import DataRequired, Length, Email, Optional
 
 class CustomerForm(FlaskForm):
@@ -9,3 +10,11 @@ class CustomerForm(FlaskForm):
     email = StringField('อีเมล', validators=[Optional(), Email()])
     address = TextAreaField('ที่อยู่', validators=[Optional(), Length(max=500)])
     submit = SubmitField('บันทึกข้อมูล')
+
+class CustomerImportForm(FlaskForm):
+    """Form for bulk importing from a CSV/Excel file."""
+    file = FileField('ไฟล์ CSV หรือ Excel (.xlsx)', validators=[
+        FileRequired('กรุณาเลือกไฟล์'), FileAllowed(['csv', 'xlsx'], 'รองรับเฉพาะไฟล์ .csv และ .xlsx')
+    ])
+    update_existing = BooleanField('อัปเดตลูกค้าที่มีเบอร์โทรอยู่แล้ว', default=True)
+    submit = SubmitField('นำเข้าข้อมูล')
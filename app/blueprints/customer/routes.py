@@ -1,16 +1,38 @@
-from flask import render_template, redirect, url_for, flash
+from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from . import customer_bp
-from .forms import CustomerForm
+from .forms import CustomerForm, CustomerImportForm
 from app import db
 from app.models import Customer
+from app.fields import lookup_response
+from app.importer import import_file, ImportFileError
+from app.conditional import conditional_view
 
 @customer_bp.route('/')
 @login_required
+@conditional_view('customer')
 def list_customers():
     customers = Customer.query.order_by(Customer.name).all()
     return render_template('customer/customer_list.html', customers=customers)
 
+@customer_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_customers():
+    """นำเข้ารายชื่อลูกค้าจากไฟล์ (ใช้เบอร์โทรเป็นคีย์)"""
+    form = CustomerImportForm()
+    result = None
+    if form.validate_on_submit():
+        try:
+            result = import_file('customers', form.file.data.stream, form.file.data.filename,
+                                 update_existing=form.update_existing.data)
+        except ImportFileError as e:
+            flash(str(e), 'danger')
+        else:
+            flash(f'นำเข้าลูกค้าเรียบร้อย: เพิ่ม {result.created} ราย, อัปเดต {result.updated} ราย', 'success')
+    return render_template('import_form.html', title='นำเข้าลูกค้าจากไฟล์', form=form, result=result,
+                           columns='name / ชื่อ, phone / เบอร์โทร (ไม่บังคับ), address / ที่อยู่ (ไม่บังคับ)',
+                           back_url=url_for('customer.list_customers'))
+
 @customer_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add_customer():
@@ -47,3 +69,12 @@ def edit_customer(id):
         return redirect(url_for('customer.list_customers'))
         
     return render_template('customer/customer_form.html', title='แก้ไขข้อมูลลูกค้า', form=form)
+
+@customer_bp.route('/api/lookup')
+@login_required
+@conditional_view('customer')
+def lookup():
+    """รายการลูกค้าแบบแบ่งหน้าสำหรับช่องเลือกลูกค้า (?q=ชื่อหรือเบอร์โทร&page=)"""
+    query = request.args.get('q', '', type=str)
+    page = max(request.args.get('page', 1, type=int), 1)
+    return jsonify(lookup_response('customer', query, page))
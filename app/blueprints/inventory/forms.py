@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SubmitField, FloatField, IntegerField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import BooleanField, StringField, TextAreaField, SubmitField, FloatField, IntegerField
 from wtforms.validators import DataRequired, Length, Optional, NumberRange
 
 class ProductForm(FlaskForm):
@@ -10,3 +11,11 @@ class ProductForm(FlaskForm):
     price = FloatField('ราคาขาย', validators=[DataRequired(), NumberRange(min=0)])
     stock_quantity = IntegerField('จำนวนในสต็อก', validators=[DataRequired(), NumberRange(min=0)])
     submit = SubmitField('บันทึกข้อมูล')
+
+class ProductImportForm(FlaskForm):
+    """Form for bulk importing from a CSV/Excel file."""
+    file = FileField('ไฟล์ CSV หรือ Excel (.xlsx)', validators=[
+        FileRequired('กรุณาเลือกไฟล์'), FileAllowed(['csv', 'xlsx'], 'รองรับเฉพาะไฟล์ .csv และ .xlsx')
+    ])
+    update_existing = BooleanField('อัปเดตสินค้าที่มี SKU อยู่แล้ว', default=True)
+    submit = SubmitField('นำเข้าข้อมูล')
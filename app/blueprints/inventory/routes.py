@@ -1,16 +1,47 @@
 from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from . import inventory_bp
-from .forms import ProductForm
+from .forms import ProductForm, ProductImportForm
 from app import db
 from app.models import Product
+from app.product_index import product_index
+from app.fields import lookup_response
+from app.exports import stock_export_rows, export_response
+from app.importer import import_file, ImportFileError
+from app.conditional import conditional_view
 
 @inventory_bp.route('/')
 @login_required
+@conditional_view('product')
 def list_products():
     products = Product.query.order_by(Product.name).all()
     return render_template('inventory/product_list.html', products=products)
 
+@inventory_bp.route('/export/stock.<any(csv, xlsx):fmt>')
+@login_required
+def export_stock(fmt):
+    """ส่งออกรายการสินค้าและจำนวนคงเหลือเป็น CSV หรือ Excel"""
+    header, rows = stock_export_rows()
+    return export_response('stock', fmt, header, rows)
+
+@inventory_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_products():
+    """นำเข้ารายการสินค้า/ราคาจากไฟล์ (ใช้ SKU เป็นคีย์)"""
+    form = ProductImportForm()
+    result = None
+    if form.validate_on_submit():
+        try:
+            result = import_file('products', form.file.data.stream, form.file.data.filename,
+                                 update_existing=form.update_existing.data)
+        except ImportFileError as e:
+            flash(str(e), 'danger')
+        else:
+            flash(f'นำเข้าสินค้าเรียบร้อย: เพิ่ม {result.created} รายการ, อัปเดต {result.updated} รายการ', 'success')
+    return render_template('import_form.html', title='นำเข้าสินค้าจากไฟล์', form=form, result=result,
+                           columns='sku / รหัสสินค้า, name / ชื่อสินค้า, price / ราคา, stock_quantity / คงเหลือ (ไม่บังคับ)',
+                           back_url=url_for('inventory.list_products'))
+
 @inventory_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add_product():
@@ -19,7 +50,6 @@ def add_product():
         new_product = Product(
             name=form.name.data,
             sku=form.sku.data,
-            description=form.description.data,
             price=form.price.data,
             stock_quantity=form.stock_quantity.data
         )
@@ -52,15 +82,16 @@ def edit_product(id):
 
 @inventory_bp.route('/api/search_products')
 @login_required
+@conditional_view('product')
 def search_products():
     query = request.args.get('q', '', type=str)
     if not query:
         return jsonify([])
 
-    # ค้นหาทั้งในชื่อและ SKU
-    products = Product.query.filter(
-        Product.name.ilike(f'%{query}%') | Product.sku.ilike(f'%{query}%')
-    ).limit(10).all()
+    # ค้นหาจากดัชนีในหน่วยความจำ (SKU ตรง/ขึ้นต้น, ชื่อขึ้นต้น, ส่วนใดก็ได้ของชื่อ) แล้วอ่านราคา/สต็อกล่าสุดด้วย primary key
+    ids = product_index.search(query, limit=10)
+    by_id = {p.id: p for p in Product.query.filter(Product.id.in_(ids))} if ids else {}
+    products = [by_id[pid] for pid in ids if pid in by_id]
 
     results = [
         {
@@ -73,3 +104,12 @@ def search_products():
         for p in products
     ]
     return jsonify(results)
+
+@inventory_bp.route('/api/lookup')
+@login_required
+@conditional_view('product')
+def lookup():
+    """รายการสินค้าแบบแบ่งหน้าสำหรับช่องเลือกสินค้า (?q=ชื่อหรือ SKU&page=)"""
+    query = request.args.get('q', '', type=str)
+    page = max(request.args.get('page', 1, type=int), 1)
+    return jsonify(lookup_response('product', query, page))
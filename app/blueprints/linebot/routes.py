@@ -1,58 +1,127 @@
-from flask import request, abort, current_app
+import heapq
+from itertools import islice
+
+from flask import request, abort
 from . import linebot_bp
-from app.models import ServiceJob, ServiceJobStatus
-from datetime import date
+from app import db
+from app.models import ServiceJob, ServiceJobStatus, Customer
+from app.counters import job_counts, sale_totals, PENDING_JOB_STATUSES
+from app.line_messaging import line_bot, format_thai_datetime
+from app.utils import THAILAND_TZ, thai_day_start_utc
+from datetime import datetime, timedelta
 
-from linebot.v3 import WebhookHandler
 from linebot.v3.exceptions import InvalidSignatureError
-from linebot.v3.messaging import (
-    Configuration, ApiClient, MessagingApi,
-    ReplyMessageRequest, TextMessage
-)
 from linebot.v3.webhooks import MessageEvent, TextMessageContent
 
-# สร้าง Handler ไว้ก่อน แต่จะไปตั้งค่า Channel Secret จริงๆ ใน app/__init__.py
-# เพื่อป้องกันปัญหา Circular Import และใช้ค่า Config ล่าสุดเสมอ
-handler = WebhookHandler("placeholder_secret")
+# จำนวนงานสูงสุดที่แสดงในข้อความตอบกลับหนึ่งข้อความ
+MAX_JOBS_IN_REPLY = 10
+
+STATUS_LABELS = {
+    ServiceJobStatus.RECEIVED: 'รับงาน',
+    ServiceJobStatus.IN_PROGRESS: 'กำลังซ่อม',
+    ServiceJobStatus.COMPLETED: 'เสร็จแล้ว',
+    ServiceJobStatus.CANCELLED: 'ยกเลิก',
+}
 
 @linebot_bp.route("/callback", methods=['POST'])
 def callback():
-    signature = request.headers['X-Line-Signature']
+    signature = request.headers.get('X-Line-Signature', '')
     body = request.get_data(as_text=True)
-    
+
     try:
-        # Handler จะมี Channel Secret ที่ถูกต้องแล้ว ณ จุดนี้
-        handler.handle(body, signature)
+        events = line_bot.parse(body, signature)
     except InvalidSignatureError:
         abort(400)
-    except Exception as e:
-        current_app.logger.error(f"Error handling webhook: {e}")
-        abort(500)
 
+    # ประมวลผลใน worker — ตอบ LINE ทันทีโดยไม่รอ query หรือการส่งข้อความตอบกลับ
+    line_bot.enqueue(line_bot.new_events(events))
     return 'OK'
 
-@handler.add(MessageEvent, message=TextMessageContent)
+@line_bot.on(MessageEvent)
 def handle_message(event):
-    text = event.message.text.strip().lower()
-    
-    with ApiClient(Configuration(access_token=current_app.config['LINE_CHANNEL_ACCESS_TOKEN'])) as api_client:
-        line_bot_api = MessagingApi(api_client)
-        reply_text = process_command(text)
-        
-        if reply_text:
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text=reply_text)]
-                )
-            )
+    if not isinstance(event.message, TextMessageContent):
+        return
+    reply_text = process_command(event.message.text.strip().lower())
+    if reply_text:
+        line_bot.reply(event.reply_token, reply_text)
+
+def _job_rows(*conditions, order_by):
+    """งานตามเงื่อนไข (id และคอลัมน์ที่ใช้แสดง) ไม่เกิน MAX_JOBS_IN_REPLY งาน"""
+    return db.session.query(
+        ServiceJob.id, ServiceJob.job_number, ServiceJob.title, ServiceJob.status, ServiceJob.due_date, Customer.name
+    ).join(Customer, Customer.id == ServiceJob.customer_id) \
+        .filter(*conditions).order_by(*order_by).limit(MAX_JOBS_IN_REPLY).all()
+
+def _format_jobs(rows):
+    return '\n'.join(
+        f"- {job_number} {title} ({customer}) [{STATUS_LABELS[status]}] กำหนด {format_thai_datetime(due_date)}"
+        for _, job_number, title, status, due_date, customer in rows
+    )
+
+def today_jobs_text():
+    """งานที่รับเข้าหรือครบกำหนดวันนี้ (ตามเวลาไทย) ใช้ index ของ created_at และ due_date แบบ half-open"""
+    today = datetime.now(THAILAND_TZ).date()
+    start, end = thai_day_start_utc(today), thai_day_start_utc(today + timedelta(days=1))
+    received = _job_rows(ServiceJob.created_at >= start, ServiceJob.created_at < end,
+                         order_by=(ServiceJob.created_at, ServiceJob.id))
+    due = _job_rows(ServiceJob.due_date >= start, ServiceJob.due_date < end,
+                    ServiceJob.status.in_(PENDING_JOB_STATUSES),
+                    order_by=(ServiceJob.due_date, ServiceJob.id))
+    if not received and not due:
+        return f"งานวันนี้ ({today.strftime('%d/%m/%Y')})\nไม่มีงานรับเข้าหรือครบกำหนดวันนี้"
+    lines = [f"งานวันนี้ ({today.strftime('%d/%m/%Y')})"]
+    if received:
+        lines += ['', 'รับเข้าวันนี้:', _format_jobs(received)]
+    if due:
+        lines += ['', 'ครบกำหนดวันนี้ (ยังไม่เสร็จ):', _format_jobs(due)]
+    return '\n'.join(lines)
+
+def _pending_rows():
+    """
+    งานค้างที่ครบกำหนดก่อน MAX_JOBS_IN_REPLY งาน (ที่ไม่มีกำหนดอยู่ท้าย เรียงตาม id)
+    status IN (...) ORDER BY due_date ต้อง sort ทุกแถวที่ตรงเงื่อนไข จึง query ทีละสถานะแทน —
+    แต่ละ query อ่าน index (status, due_date, id) ตามลำดับแล้วหยุดที่ LIMIT — แล้วรวมผลใน Python
+    """
+    dated = heapq.merge(*(
+        _job_rows(ServiceJob.status == status, ServiceJob.due_date.is_not(None),
+                  order_by=(ServiceJob.due_date, ServiceJob.id))
+        for status in PENDING_JOB_STATUSES
+    ), key=lambda row: (row.due_date, row.id))
+    rows = list(islice(dated, MAX_JOBS_IN_REPLY))
+    if len(rows) < MAX_JOBS_IN_REPLY:
+        undated = heapq.merge(*(
+            _job_rows(ServiceJob.status == status, ServiceJob.due_date.is_(None), order_by=(ServiceJob.id,))
+            for status in PENDING_JOB_STATUSES
+        ), key=lambda row: row.id)
+        rows += islice(undated, MAX_JOBS_IN_REPLY - len(rows))
+    return rows
+
+def pending_jobs_text():
+    """งานที่ยังไม่เสร็จ เรียงตามกำหนดเสร็จ (ที่ไม่มีกำหนดอยู่ท้าย)"""
+    rows = _pending_rows()
+    total = job_counts()['pending']
+    if not rows:
+        return "ไม่มีงานค้างครับ"
+    text = f"งานค้างทั้งหมด {total} งาน\n{_format_jobs(rows)}"
+    if total > len(rows):
+        text += f"\n...และอีก {total - len(rows)} งาน"
+    return text
 
 def process_command(text):
     """ประมวลผลคำสั่งจากผู้ใช้และส่งข้อความตอบกลับ"""
     if text == 'งานวันนี้':
-        # ในอนาคตจะเพิ่ม Logic การดึงข้อมูลจากฐานข้อมูล
-        return "ฟังก์ชัน 'งานวันนี้' กำลังอยู่ในระหว่างการพัฒนาครับ"
+        return today_jobs_text()
     elif text == 'งานค้าง':
-        # ในอนาคตจะเพิ่ม Logic การดึงข้อมูลจากฐานข้อมูล
-        return "ฟังก์ชัน 'งานค้าง' กำลังอยู่ในระหว่างการพัฒนาครับ"
+        return pending_jobs_text()
+    elif text == 'สรุป':
+        # อ่านจาก stat_counter โดยตรง ไม่ต้องนับตาราง service_job / sale ใหม่
+        jobs = job_counts()
+        sales = sale_totals()
+        return (
+            f"สรุปภาพรวม\n"
+            f"งานทั้งหมด: {jobs['total']}\n"
+            f"งานค้าง: {jobs['pending']}\n"
+            f"งานเสร็จแล้ว: {jobs['completed']}\n"
+            f"บิลขายทั้งหมด: {sales['count']} (ยอดรวม {sales['amount']:,.2f} บาท)"
+        )
     return None
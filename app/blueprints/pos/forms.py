@@ -1,17 +1,15 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, HiddenField
 from wtforms.validators import DataRequired
-from wtforms_sqlalchemy.fields import QuerySelectField
 from app.models import Customer
-
-def get_customers():
-    return Customer.query.order_by(Customer.name).all()
+from app.fields import ModelLookupField
 
 class PosForm(FlaskForm):
     """Form for the Point of Sale terminal."""
-    customer = QuerySelectField(
+    customer = ModelLookupField(
         'ลูกค้า',
-        query_factory=get_customers,
+        model=Customer,
+        lookup_endpoint='customer.lookup',
         get_label='name',
         allow_blank=True, # อนุญาตให้เป็นลูกค้าจรได้
         blank_text='-- ลูกค้าทั่วไป --'
@@ -7,17 +7,78 @@ from . import pos_bp
 from .forms import PosForm
 from app import db
 from app.models import Sale, SaleItem, Product, Customer
+from app.numbering import document_numbers
+from sqlalchemy import update, case
 import json
-import random
-import string
 
-def generate_sale_number():
-    prefix = 'SAL'
-    while True:
-        suffix = ''.join(random.choices(string.digits, k=8))
-        sale_num = f"{prefix}{suffix}"
-        if not Sale.query.filter_by(sale_number=sale_num).first():
-            return sale_num
+def _parse_cart(cart_data):
+    """รวมจำนวนสินค้าในตะกร้าตาม product id (ตรวจว่าเป็นจำนวนเต็มบวก) — ราคาจากฝั่ง client จะไม่ถูกใช้"""
+    quantities = {}
+    for item in cart_data:
+        try:
+            product_id = int(item['id'])
+            qty = int(item['qty'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('ข้อมูลสินค้าในตะกร้าไม่ถูกต้อง')
+        if qty <= 0:
+            raise ValueError('จำนวนสินค้าต้องมากกว่า 0')
+        quantities[product_id] = quantities.get(product_id, 0) + qty
+    return quantities
+
+def _reserve_stock(quantities):
+    """
+    ตัดสต็อกของทุกรายการด้วย UPDATE เดียวแบบมีเงื่อนไข (stock_quantity >= จำนวนที่ขาย)
+    คืน True เมื่อตัดได้ครบทุกรายการ — ถ้าแถวใดสต็อกไม่พอ แถวนั้นจะไม่ถูกอัปเดตและ rowcount จะไม่ครบ
+    """
+    qty_for_product = case(quantities, value=Product.id)
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(list(quantities)), Product.stock_quantity >= qty_for_product)
+        .values(stock_quantity=Product.stock_quantity - qty_for_product)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
+def _checkout(cart_data, customer_id):
+    """
+    บันทึกการขายใน transaction สั้นๆ เดียว:
+    โหลดสินค้าทุกรายการใน query เดียว (ล็อกแถวบน Postgres เรียงตาม id เพื่อไม่ให้เกิด deadlock),
+    คำนวณยอดจากราคาในฐานข้อมูล แล้วตัดสต็อกแบบ atomic เพื่อไม่ให้หลายเครื่องขายเกินสต็อกพร้อมกัน
+    """
+    quantities = _parse_cart(cart_data)
+    products = {
+        p.id: p for p in Product.query.filter(Product.id.in_(list(quantities)))
+                                      .order_by(Product.id).with_for_update()
+    }
+
+    for product_id, qty in quantities.items():
+        product = products.get(product_id)
+        if not product:
+            raise ValueError('ไม่พบสินค้าบางรายการในระบบ')
+        if (product.stock_quantity or 0) < qty:
+            raise ValueError(f"สินค้า '{product.name}' ไม่เพียงพอในสต็อก")
+
+    # ออกเลขที่บิลเมื่อตะกร้าผ่านการตรวจแล้วเท่านั้น (การจองเลขใช้ transaction แยกและไม่ rollback ตาม
+    # บิลที่ถูกปฏิเสธจึงไม่ทำให้เลขขาดช่วง) แต่ต้องก่อนเขียนข้อมูลใน session เพราะ SQLite ล็อกทั้งไฟล์ตอนเขียน
+    # บน Postgres แถวสินค้าถูกล็อกไว้แล้ว การตัดสต็อกด้านล่างจึงไม่ล้มเหลวหลังออกเลข
+    sale_number = document_numbers.next('sale')
+
+    if not _reserve_stock(quantities):
+        raise ValueError('สต็อกสินค้ามีการเปลี่ยนแปลงระหว่างบันทึกการขาย กรุณาลองใหม่อีกครั้ง')
+
+    new_sale = Sale(
+        sale_number=sale_number,
+        customer_id=customer_id,
+        salesperson_id=current_user.id,
+        total_amount=sum(products[pid].price * qty for pid, qty in quantities.items())
+    )
+    db.session.add(new_sale)
+    db.session.add_all([
+        SaleItem(sale=new_sale, product_id=pid, quantity=qty, price_per_unit=products[pid].price)
+        for pid, qty in quantities.items()
+    ])
+    db.session.commit()
+    return new_sale
 
 @pos_bp.route('/', methods=['GET', 'POST'])
 @login_required
@@ -31,32 +92,7 @@ def index():
                 flash('กรุณาเพิ่มสินค้าลงในตะกร้าก่อน', 'warning')
                 return redirect(url_for('pos.index'))
 
-            total_amount = sum(item['qty'] * item['price'] for item in cart_data)
-
-            new_sale = Sale(
-                sale_number=generate_sale_number(),
-                customer_id=form.customer.data.id if form.customer.data else None,
-                salesperson_id=current_user.id,
-                total_amount=total_amount
-            )
-            db.session.add(new_sale)
-            
-            for item_data in cart_data:
-                product = db.session.get(Product, item_data['id'])
-                if not product or product.stock_quantity < item_data['qty']:
-                    raise Exception(f"สินค้า '{item_data['name']}' ไม่เพียงพอในสต็อก")
-
-                product.stock_quantity -= item_data['qty']
-                
-                sale_item = SaleItem(
-                    sale=new_sale,
-                    product_id=product.id,
-                    quantity=item_data['qty'],
-                    price_per_unit=item_data['price']
-                )
-                db.session.add(sale_item)
-
-            db.session.commit()
+            new_sale = _checkout(cart_data, form.customer.data.id if form.customer.data else None)
             flash(f'บันทึกการขาย #{new_sale.sale_number} สำเร็จ!', 'success')
             return redirect(url_for('pos.index'))
 
@@ -64,4 +100,4 @@ def index():
             db.session.rollback()
             flash(f'เกิดข้อผิดพลาดในการบันทึกการขาย: {e}', 'danger')
 
-    return render_template('pos/pos_terminal.html', form=form)
\ No newline at end of file
+    return render_template('pos/pos_terminal.html', form=form)
@@ -1,30 +1,24 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SubmitField, SelectField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional
-from wtforms_sqlalchemy.fields import QuerySelectField
 from app.models import Customer, ServiceJobStatus, User, UserRole, Product
-
-def get_customers():
-    return Customer.query.order_by(Customer.name).all()
+from app.fields import ModelLookupField
+from app.user_cache import user_cache
 
 def get_technicians():
-    # ในอนาคตเราสามารถกรอง User ที่เป็นช่างจริงๆ ได้
-    return User.query.order_by(User.first_name).all()
-
-def get_products():
-    return Product.query.order_by(Product.name).all()
+    return user_cache.technicians()
 
 class ServiceJobForm(FlaskForm):
     """
     Form สำหรับสร้างและแก้ไขข้อมูลหลักของใบงานซ่อม
     อ้างอิงจาก form.html เดิม
     """
-    customer = QuerySelectField(
+    customer = ModelLookupField(
         'ลูกค้า',
-        query_factory=get_customers,
+        model=Customer,
+        lookup_endpoint='customer.lookup',
         get_label='name',
-        allow_blank=False,
-        validators=[DataRequired(message="กรุณาเลือกลูกค้า")]
+        required_message="กรุณาเลือกลูกค้า"
     )
     title = StringField('ชื่องาน / อาการเสียเบื้องต้น', validators=[DataRequired(), Length(max=200)])
     problem_description = TextAreaField('รายละเอียดปัญหาที่ลูกค้าแจ้ง', validators=[DataRequired()])
@@ -56,7 +50,7 @@ class AddPartForm(FlaskForm):
     """
     Form สำหรับเพิ่มอะไหล่ที่ใช้
     """
-    product = QuerySelectField('สินค้า/อะไหล่', query_factory=get_products, get_label='name', allow_blank=False)
+    product = ModelLookupField('สินค้า/อะไหล่', model=Product, lookup_endpoint='inventory.lookup', get_label='name')
     quantity = IntegerField('จำนวน', validators=[DataRequired(), NumberRange(min=1)], default=1)
     submit_part = SubmitField('เพิ่มอะไหล่')
 
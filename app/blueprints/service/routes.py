@@ -1,32 +1,132 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, Response
+from flask import render_template, redirect, url_for, flash, request, jsonify, Response, abort, send_file, current_app
 from flask_login import login_required, current_user
 from . import service_bp
 from .forms import ServiceJobForm, JobUpdateForm, TaskForm, AddPartForm, RescheduleForm, CompleteJobForm
 from app import db
 from app.models import ServiceJob, ServiceJobStatus, JobUpdate, Task, ServiceJobPart, Product, User, Customer
-import random
-import string
-import qrcode
-from io import BytesIO
-import base64
-from datetime import datetime
+from app.pagination import keyset_paginate, clamp_page_size
+from app.exports import jobs_export_rows, export_response
+from app.numbering import document_numbers
+from app.user_cache import user_cache
+from app.conditional import conditional_view
+from app.qr_codes import job_qr_data, qr_key, get_qr_png, render_label_sheet
+from app.utils import parse_date_arg, thai_day_start_utc
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 import pytz
 
 THAILAND_TZ = pytz.timezone('Asia/Bangkok')
 
+def _job_list_filters():
+    """รวบรวมตัวกรองของหน้ารายการงานจาก query string"""
+    status_name = request.args.get('status', '', type=str)
+    return {
+        'status': status_name if status_name in ServiceJobStatus.__members__ else '',
+        'customer_id': request.args.get('customer_id', type=int),
+        'due_from': parse_date_arg('due_from'),
+        'due_to': parse_date_arg('due_to'),
+    }
+
+def _job_list_conditions(filters):
+    """เงื่อนไข SQL ของตัวกรองรายการงาน (ใช้ร่วมกันระหว่างหน้ารายการและการส่งออก)"""
+    conditions = []
+    if filters['status']:
+        conditions.append(ServiceJob.status == ServiceJobStatus[filters['status']])
+    if filters['customer_id']:
+        conditions.append(ServiceJob.customer_id == filters['customer_id'])
+    if filters['due_from']:
+        conditions.append(ServiceJob.due_date >= thai_day_start_utc(filters['due_from']))
+    if filters['due_to']:
+        # วันสิ้นสุดนับรวมทั้งวัน จึงใช้ขอบบนเป็นเริ่มต้นของวันถัดไป
+        conditions.append(ServiceJob.due_date < thai_day_start_utc(filters['due_to'] + timedelta(days=1)))
+    return conditions
+
+def _job_list_page(filters):
+    """
+    สร้าง query ของรายการงานตามตัวกรอง (ทำใน SQL ทั้งหมด) แล้วดึงหนึ่งหน้าแบบ keyset
+    พร้อม join ข้อมูลลูกค้ามาใน query เดียวกัน เพื่อไม่ให้เกิด query ต่อแถว
+    """
+    query = ServiceJob.query.options(joinedload(ServiceJob.customer)).filter(*_job_list_conditions(filters))
+
+    return keyset_paginate(
+        query, ServiceJob.created_at, ServiceJob.id,
+        cursor=request.args.get('cursor', type=str),
+        limit=clamp_page_size(request.args.get('per_page', type=int))
+    )
+
+def _filter_args(filters):
+    """แปลงตัวกรองกลับเป็น query args สำหรับสร้าง URL หน้าถัดไป"""
+    args = {
+        'status': filters['status'],
+        'customer_id': filters['customer_id'],
+        'due_from': filters['due_from'].isoformat() if filters['due_from'] else None,
+        'due_to': filters['due_to'].isoformat() if filters['due_to'] else None,
+    }
+    return {k: v for k, v in args.items() if v}
+
+def _row_filter_args(filter_args):
+    """ตัวกรองอื่นที่ลิงก์ชื่อลูกค้าในแต่ละแถวคงไว้ (แทน customer_id ด้วยลูกค้าของแถว)"""
+    return {k: v for k, v in filter_args.items() if k != 'customer_id'}
+
 @service_bp.route('/')
 @login_required
+@conditional_view('service_job', 'customer')
 def list_jobs():
-    jobs = ServiceJob.query.order_by(ServiceJob.created_at.desc()).all()
-    return render_template('service/service_list.html', jobs=jobs)
+    filters = _job_list_filters()
+    page = _job_list_page(filters)
+    filter_args = _filter_args(filters)
+    selected_customer = db.session.get(Customer, filters['customer_id']) if filters['customer_id'] else None
+    row_filter_args = _row_filter_args(filter_args)
+    all_customers_url = url_for('service.list_jobs', **row_filter_args)
+    next_url = None
+    if page.has_more:
+        next_url = url_for('service.list_jobs_api', cursor=page.next_cursor, **filter_args)
+    return render_template('service/service_list.html',
+                           jobs=page.items,
+                           filters=filters,
+                           selected_customer=selected_customer,
+                           all_customers_url=all_customers_url,
+                           row_filter_args=row_filter_args,
+                           statuses=list(ServiceJobStatus),
+                           next_url=next_url)
 
-def generate_job_number():
-    prefix = 'SRV'
-    while True:
-        suffix = ''.join(random.choices(string.digits, k=6))
-        job_num = f"{prefix}{suffix}"
-        if not ServiceJob.query.filter_by(job_number=job_num).first():
-            return job_num
+@service_bp.route('/api/jobs')
+@login_required
+@conditional_view('service_job', 'customer')
+def list_jobs_api():
+    """JSON สำหรับโหลดรายการงานเพิ่มเติมเมื่อเลื่อนหน้าจอ (ใช้ตัวกรองและ cursor ชุดเดียวกับหน้า list_jobs)"""
+    filters = _job_list_filters()
+    page = _job_list_page(filters)
+    filter_args = _filter_args(filters)
+    row_filter_args = _row_filter_args(filter_args)
+    next_url = None
+    if page.has_more:
+        next_url = url_for('service.list_jobs_api', cursor=page.next_cursor, **filter_args)
+    return jsonify({
+        'items': [
+            {
+                'id': job.id,
+                'job_number': job.job_number,
+                'title': job.title,
+                'customer_id': job.customer_id,
+                'customer_name': job.customer.name,
+                'customer_url': url_for('service.list_jobs', customer_id=job.customer_id, **row_filter_args),
+                'status': job.status.value,
+                'created_at': job.created_at.strftime('%d/%m/%Y'),
+                'detail_url': url_for('service.job_detail', job_id=job.id)
+            }
+            for job in page.items
+        ],
+        'next_cursor': page.next_cursor,
+        'next_url': next_url
+    })
+
+@service_bp.route('/export/jobs.<any(csv, xlsx):fmt>')
+@login_required
+def export_jobs(fmt):
+    """ส่งออกงานซ่อมตามตัวกรองเดียวกับหน้ารายการ (ทุกหน้า) เป็น CSV หรือ Excel"""
+    header, rows = jobs_export_rows(_job_list_conditions(_job_list_filters()))
+    return export_response('service_jobs', fmt, header, rows)
 
 @service_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -34,7 +134,7 @@ def add_job():
     form = ServiceJobForm()
     if form.validate_on_submit():
         new_job = ServiceJob(
-            job_number=generate_job_number(),
+            job_number=document_numbers.next('job'),
             customer_id=form.customer.data.id,
             title=form.title.data,
             problem_description=form.problem_description.data,
@@ -62,7 +162,7 @@ def job_detail(job_id):
     complete_form = CompleteJobForm()
     
     # Pre-populate technician fields for modals
-    technician_list = User.query.all() # In future, filter by role
+    technician_list = user_cache.technicians()
 
     if request.method == 'POST':
         action = request.form.get('action')
@@ -131,21 +231,61 @@ def generate_customer_onboarding_qr(job_id):
     job = db.session.get(ServiceJob, job_id)
     if not job:
         abort(404)
-    
-    # This URL should point to a future LIFF app page
-    onboarding_url = url_for('customer.view', id=job.customer_id, _external=True) 
-    
-    # Generate QR Code
-    qr = qrcode.QRCode(version=1, box_size=10, border=4)
-    qr.add_data(onboarding_url)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white')
-    
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    
-    return render_template('service/generate_qr.html', 
+
+    # ใส่ key ไว้ใน URL รูป เบราว์เซอร์จึงเก็บรูปไว้ได้ตลอด และได้รูปใหม่ทันทีเมื่อข้อมูลใน QR เปลี่ยน
+    key = qr_key(job_qr_data(job))
+    return render_template('service/generate_qr.html',
                            title=f"QR Code สำหรับลูกค้า: {job.customer.name}",
-                           qr_code_base64=img_str,
+                           qr_url=url_for('service.job_qr_png', job_id=job.id, v=key),
                            job=job)
+
+@service_bp.route('/qr/<int:job_id>.png')
+@login_required
+def job_qr_png(job_id):
+    """รูป QR ของงาน — render ครั้งเดียวแล้วอ่านจาก cache บนดิสก์"""
+    job = db.session.get(ServiceJob, job_id)
+    if not job:
+        abort(404)
+    data = job_qr_data(job)
+    key = qr_key(data)
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        key, path, png = get_qr_png(data)
+        if path:
+            response = send_file(path, mimetype='image/png', conditional=False, etag=False)
+        else:
+            response = Response(png, mimetype='image/png')
+    response.set_etag(key)
+    if request.args.get('v') == key:
+        response.headers['Cache-Control'] = f"private, max-age={current_app.config['QR_CACHE_MAX_AGE']}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@service_bp.route('/qr/labels')
+@login_required
+def qr_labels():
+    """
+    แผ่นฉลาก QR (PDF ขนาด A4) ของงานที่ระบุใน ids=1,2,3 หรือของงานตามตัวกรองเดียวกับหน้ารายการ
+    (ใหม่สุดก่อน ไม่เกิน QR_LABEL_MAX_JOBS งาน)
+    """
+    max_jobs = current_app.config['QR_LABEL_MAX_JOBS']
+    query = db.session.query(ServiceJob.id, ServiceJob.job_number, ServiceJob.customer_id, Customer.name) \
+        .join(Customer, Customer.id == ServiceJob.customer_id)
+    ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip().isdigit()]
+    if ids:
+        query = query.filter(ServiceJob.id.in_(ids[:max_jobs])).order_by(ServiceJob.id)
+    else:
+        query = query.filter(*_job_list_conditions(_job_list_filters())) \
+            .order_by(ServiceJob.created_at.desc(), ServiceJob.id.desc())
+    jobs = query.limit(max_jobs).all()
+    if not jobs:
+        flash('ไม่พบงานซ่อมสำหรับพิมพ์ฉลาก', 'warning')
+        return redirect(url_for('service.list_jobs'))
+
+    labels = [(job_qr_data(row), row.job_number, row.name[:60]) for row in jobs]
+    pdf = render_label_sheet(labels, current_app.config['QR_LABEL_WORKERS'])
+    stamp = datetime.now(THAILAND_TZ).strftime('%Y%m%d_%H%M')
+    return Response(pdf, mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline;filename=qr_labels_{stamp}.pdf'})
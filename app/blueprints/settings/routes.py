@@ -3,6 +3,7 @@ from flask_login import login_required
 from . import settings_bp
 from app import db
 from app.models import SystemSettings
+from app.settings_store import settings_store
 from app.decorators import admin_required
 
 @settings_bp.route('/', methods=['GET', 'POST'])
@@ -10,15 +11,8 @@ from app.decorators import admin_required
 @admin_required
 def index():
     if request.method == 'POST':
-        for key, value in request.form.items():
-            setting = SystemSettings.query.filter_by(key=key).first()
-            if setting:
-                setting.value = value
-            else:
-                new_setting = SystemSettings(key=key, value=value)
-                db.session.add(new_setting)
-        
-        db.session.commit()
+        values = {key: value for key, value in request.form.items() if key != 'csrf_token'}
+        settings_store.save(values)
         flash('บันทึกการตั้งค่าเรียบร้อยแล้ว!', 'success')
         return redirect(url_for('settings.index'))
 
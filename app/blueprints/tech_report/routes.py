@@ -1,40 +1,45 @@
 from flask import render_template, request
 from flask_login import login_required
 from . import tech_report_bp
-from app.models import User, JobUpdate
-from sqlalchemy import func
-from app import db
-from datetime import datetime
+from app.rollups import tech_month_report, tech_trend, current_month, add_months
+from datetime import date, datetime
+
+# จำนวนเดือนสูงสุดของมุมมองแนวโน้ม
+MAX_TREND_MONTHS = 24
 
 @tech_report_bp.route('/')
 @login_required
 def report():
-    now = datetime.now()
-    # รับค่าเดือนและปีจาก URL query, ถ้าไม่มีให้ใช้เดือนและปีปัจจุบัน
-    year = request.args.get('year', now.year, type=int)
-    month = request.args.get('month', now.month, type=int)
+    this_month = current_month()
+    # รับค่าเดือนและปีจาก URL query, ถ้าไม่มีให้ใช้เดือนและปีปัจจุบัน (เวลาไทย)
+    year = request.args.get('year', this_month.year, type=int)
+    month = request.args.get('month', this_month.month, type=int)
+    if not 1 <= month <= 12 or not 2000 <= year <= 9999:
+        year, month = this_month.year, this_month.month
+    period = date(year, month, 1)
+    trend_months = min(max(request.args.get('trend', 6, type=int), 1), MAX_TREND_MONTHS)
 
-    # สร้าง Query เพื่อนับจำนวน JobUpdate ที่แต่ละ User สร้างในเดือนและปีที่เลือก
-    report_query = db.session.query(
-        User.id,
-        User.first_name,
-        User.last_name,
-        func.count(JobUpdate.id).label('job_update_count')
-    ).join(JobUpdate, User.id == JobUpdate.author_id).filter(
-        func.extract('year', JobUpdate.created_at) == year,
-        func.extract('month', JobUpdate.created_at) == month
-    ).group_by(User.id).order_by(func.count(JobUpdate.id).desc()).all()
+    # ข้อมูลมาจากตารางสรุปรายเดือนเท่านั้น (ปิด/seed เดือนโดย scheduler หรือ `flask rollups tech`)
+    report_data = [
+        {'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name, 'job_update_count': count}
+        for user, count in tech_month_report(period)
+    ]
+    trend_periods, trend_rows = tech_trend(add_months(period, 1 - trend_months), period)
 
     # เตรียมข้อมูลสำหรับ dropdown filter
-    years = range(now.year - 5, now.year + 1)
+    years = range(this_month.year - 5, this_month.year + 1)
     months = [
-        {'value': i, 'name': datetime(now.year, i, 1).strftime('%B')}
+        {'value': i, 'name': datetime(this_month.year, i, 1).strftime('%B')}
         for i in range(1, 13)
     ]
 
     return render_template('tech_report/report.html',
-                           report_data=report_query,
+                           report_data=report_data,
                            selected_year=year,
                            selected_month=month,
+                           selected_trend=trend_months,
+                           trend_periods=trend_periods,
+                           trend_rows=trend_rows,
+                           trend_options=(3, 6, 12, MAX_TREND_MONTHS),
                            years=years,
                            months=months)
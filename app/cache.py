@@ -0,0 +1,280 @@
+"""
+Shared cache ขนาดเล็กที่เก็บข้อมูลเป็นไฟล์ในไดเรกทอรีเดียวกัน
+ทำให้ gunicorn ทุก worker บนเครื่องเดียวกันเห็นค่าเดียวกันโดยไม่ต้องพึ่ง Redis/Memcached
+
+- ค่าแต่ละ key ถูก pickle ลงไฟล์พร้อมเวลาหมดอายุ เขียนแบบ atomic (เขียนไฟล์ชั่วคราวแล้ว os.replace)
+- get_or_set() ล็อกไฟล์ต่อ key ระหว่างคำนวณค่าใหม่ เพื่อให้คำขอที่เข้ามาพร้อมกันหลายรายการ
+  คำนวณค่าเพียงครั้งเดียว (บน Windows ที่ไม่มี fcntl จะข้ามการล็อก ซึ่งพอสำหรับโหมด dev)
+- จำนวนไฟล์ถูกจำกัดด้วย max_entries โดยลบไฟล์ที่เก่าที่สุดออกก่อน
+- lock() ล็อกชื่อหนึ่งๆ ข้าม process แบบไม่รอ ใช้กันงานเบื้องหลังที่ทุก worker ตั้งเวลาไว้ไม่ให้ทำงานซ้อนกัน
+- version()/bump() เก็บ token สั้นๆ ต่อชื่อ (ไม่ถูก prune) ให้ cache ในหน่วยความจำของแต่ละ worker
+  ตรวจได้ว่าข้อมูลต้นทางเปลี่ยนหรือยังด้วยการอ่านไฟล์เล็กๆ ครั้งเดียว แทนการ query ฐานข้อมูล
+
+ไฟล์ใน cache ถูก unpickle ตอนอ่าน ผู้ที่เขียนไฟล์ลงไดเรกทอรีได้จึงรันโค้ดใน worker ได้
+ไดเรกทอรีจึงต้องเป็นของผู้ใช้ที่รันแอปเท่านั้น (ดู private_cache_dir)
+"""
+
+import hashlib
+import contextlib
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_MISSING = object()
+
+
+def private_cache_dir(app, config_key, default_name):
+    """
+    ไดเรกทอรี cache จาก app.config[config_key] (ค่าว่าง = <instance folder>/<default_name>)
+    สร้างด้วยสิทธิ์ 0700 และปฏิเสธไดเรกทอรีที่เป็น symlink หรือเป็นของผู้ใช้อื่น
+    (กันผู้ใช้อื่นบนเครื่องสร้างไดเรกทอรีดักไว้ก่อนแล้ววางไฟล์ให้แอปอ่าน)
+    """
+    directory = app.config.get(config_key) or os.path.join(app.instance_path, default_name)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f'{config_key} ({directory}) ต้องเป็นไดเรกทอรี ไม่ใช่ symlink')
+    if hasattr(os, 'getuid'):
+        if info.st_uid != os.getuid():
+            raise RuntimeError(f'{config_key} ({directory}) เป็นของผู้ใช้อื่น')
+        if info.st_mode & 0o077:
+            os.chmod(directory, 0o700)
+    app.config[config_key] = directory
+    return directory
+
+
+class SharedCache:
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory=None, max_entries=2000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+
+    def init_app(self, app):
+        self.directory = private_cache_dir(app, 'CACHE_DIR', 'cache')
+        self.max_entries = app.config.get('CACHE_MAX_ENTRIES', self.max_entries)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.cache')
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if expires_at is not None and expires_at < time.time():
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_or_set(self, key, creator, ttl=None):
+        """คืนค่าจาก cache หรือเรียก creator() เพื่อสร้างค่าใหม่ (มีเพียง process เดียวที่สร้างในแต่ละครั้ง)"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        if fcntl is None:
+            value = creator()
+            self.set(key, value, ttl)
+            return value
+
+        with open(self._path(key) + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # อาจมี worker อื่นสร้างค่าเสร็จแล้วระหว่างที่เรารอล็อก
+                value = self.get(key, _MISSING)
+                if value is _MISSING:
+                    value = creator()
+                    self.set(key, value, ttl)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return value
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        """ล็อก name ข้าม process แบบไม่รอ — yield True หากได้ล็อก, False หาก process อื่นถืออยู่"""
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.directory, f'{name}.lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _version_path(self, name):
+        return os.path.join(self.directory, f'{name}.version')
+
+    def version(self, name):
+        """token ปัจจุบันของ name (สร้างให้หากยังไม่มี)"""
+        try:
+            with open(self._version_path(name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return self.bump(name)
+
+    def bump(self, name):
+        """เปลี่ยน token ของ name เพื่อบอกทุก worker ว่าข้อมูลที่ cache ไว้หมดอายุแล้ว คืน token ใหม่"""
+        token = uuid.uuid4().hex
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        os.replace(tmp_path, self._version_path(name))
+        return token
+
+    def prune(self):
+        """ลบไฟล์ที่เก่าที่สุดจนจำนวนไม่เกิน max_entries"""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.cache')]
+        except OSError:
+            return
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.unlink(entry.path)
+                os.unlink(entry.path + '.lock')
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.cache', '.lock')):
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class DiskCache:
+    """
+    Cache ไฟล์บนดิสก์แบบ content-addressed (ชื่อไฟล์คือ key ที่ผู้เรียกคำนวณจากเนื้อหา) ใช้ร่วมกันทุก worker
+    ขนาดรวมถูกจำกัดด้วย <prefix>_MAX_BYTES โดยลบไฟล์ที่ถูกใช้ล่าสุดนานที่สุดออกก่อน (LRU ตาม mtime)
+    ไดเรกทอรีอ่านจาก <prefix>_DIR (ค่าว่าง = <instance folder>/<prefix ตัวเล็ก>)
+    """
+
+    def __init__(self, config_prefix, suffix):
+        self.config_prefix = config_prefix
+        self.suffix = suffix
+        self.directory = None
+        self.max_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def init_app(self, app):
+        self.directory = private_cache_dir(app, f'{self.config_prefix}_DIR', self.config_prefix.lower())
+        self.max_bytes = app.config[f'{self.config_prefix}_MAX_BYTES']
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def lookup(self, key):
+        """คืน path ของไฟล์หากมีใน cache (และแตะ mtime เพื่อให้ LRU รู้ว่าเพิ่งถูกใช้)"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return path
+
+    def store(self, key, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path_for(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """ลบไฟล์ที่ไม่ได้ใช้นานที่สุดจนขนาดรวมไม่เกิน max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                self._count('evictions')
+            except FileNotFoundError:
+                pass
+
+    def get_or_render(self, key, render):
+        """คืน (path, data) — path เมื่อมีไฟล์ใน cache อยู่แล้ว หรือ data ที่เพิ่ง render และบันทึกลง cache"""
+        path = self.lookup(key)
+        if path:
+            return path, None
+        data = render()
+        self.store(key, data)
+        return None, data
+
+    def snapshot(self):
+        """สถิติสำหรับ monitoring (ตัวนับ hit/miss เป็นของ worker นี้, ขนาดดิสก์เป็นของทั้ง cache)"""
+        files = 0
+        size = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                files += 1
+                size += entry.stat().st_size
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({'pid': os.getpid(), 'files': files, 'bytes': size, 'max_bytes': self.max_bytes})
+        return stats
@@ -0,0 +1,192 @@
+"""
+Conditional GET (ETag / Last-Modified) สำหรับหน้ารายการและ JSON API
+
+- ทุกตารางมี version ในตาราง cache_version (ชื่อ 'table:<ชื่อตาราง>')
+  ดักที่ระดับ Connection (after_execute) ทุกคำสั่ง INSERT/UPDATE/DELETE ไม่ว่าจะมาจาก ORM flush,
+  session.execute(update(...)) หรือ connection.execute() แบบ Core — จึงไม่มีทางเขียนข้อมูลที่ลืมเพิ่ม version
+  ยกเว้น SQL ดิบผ่าน text() ซึ่งต้องเรียก bump_table_versions() เอง
+- ระหว่าง transaction แค่จดชื่อตารางไว้ที่ connection (ไม่แตะแถว version) แล้วเพิ่ม version หลัง commit
+  ใน transaction สั้น ๆ แยกต่างหาก เรียงตามชื่อตาราง — ผู้เขียนสองรายที่แก้ตารางเดียวกัน (เช่น checkout
+  สองเครื่องพร้อมกัน) จึงไม่ต้องรอ row lock ของ version กันจนจบ transaction และไม่ deadlock
+  ระหว่าง commit กับการเพิ่ม version ผู้อ่านอาจได้ 304 ของข้อมูลเก่าได้ชั่วครู่ (ไม่กี่มิลลิวินาที)
+- view ประกาศตารางที่ใช้ด้วย @conditional_view('customer', ...) — ETag มาจาก version ของตารางเหล่านั้น
+  (อ่านด้วย primary key ใน query เดียว) รวมกับ URL และผู้ใช้ ถ้าตรงกับ If-None-Match จะตอบ 304
+  ทันทีโดยไม่เรียก view เลย (ไม่ query ORM ไม่ render template)
+
+ตัวอย่าง:
+    @customer_bp.route('/')
+    @login_required
+    @conditional_view('customer')
+    def list_customers(): ...
+"""
+
+import hashlib
+import logging
+import threading
+from functools import wraps
+
+from flask import request, session, make_response, current_app, Response, appcontext_tearing_down
+from flask_login import current_user
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from . import db
+from .models import CacheVersion
+from .settings_store import bump_cache_version
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = 'table:'
+
+# ตารางที่เปลี่ยนบ่อยมากและไม่มีหน้าไหนแสดงผลโดยตรง (เป็นข้อมูลภายในหรือคำนวณจากตารางอื่น)
+# — ไม่ต้องเสีย UPDATE ทุก transaction; หน้าที่อ่านตารางเหล่านี้ให้ประกาศตารางต้นทางแทน
+UNVERSIONED_TABLES = {
+    'cache_version', 'stat_counter', 'line_webhook_event', 'document_sequence', 'search_document',
+    'sync_state', 'rollup_period', 'rollup_watermark',
+}
+
+
+def _version_name(table):
+    return VERSION_PREFIX + table
+
+
+def bump_table_versions(connection, tables):
+    """จดตารางที่ SQL ดิบ (ซึ่ง event ดักไม่ได้) เขียน ให้เพิ่ม version หลัง transaction ของ connection นี้ commit"""
+    connection.info.setdefault('written_tables', set()).update(set(tables) - UNVERSIONED_TABLES)
+
+
+def read_table_versions(tables):
+    """คืน (version ของแต่ละตารางตามลำดับ, เวลาแก้ไขล่าสุด) ด้วย query เดียว"""
+    table = CacheVersion.__table__
+    names = [_version_name(name) for name in tables]
+    rows = {
+        name: (version, updated_at)
+        for name, version, updated_at in db.session.execute(
+            select(table.c.name, table.c.version, table.c.updated_at).where(table.c.name.in_(names))
+        )
+    }
+    versions = [rows.get(name, (0, None))[0] for name in names]
+    stamps = [updated_at for _, updated_at in rows.values() if updated_at is not None]
+    return versions, max(stamps) if stamps else None
+
+
+# --- Bumping on write ---
+
+# ตารางที่ commit แล้วแต่ยังไม่ได้เพิ่ม version แยกตาม engine (ต่อ thread)
+_committed = threading.local()
+
+
+def _written_table(clauseelement):
+    if isinstance(clauseelement, UpdateBase):
+        table = getattr(clauseelement, 'table', None)
+        return getattr(table, 'name', None)
+    return None
+
+
+@event.listens_for(Engine, 'after_execute')
+def _record_written_table(conn, clauseelement, multiparams, params, execution_options, result):
+    table = _written_table(clauseelement)
+    if table is not None and table not in UNVERSIONED_TABLES:
+        conn.info.setdefault('written_tables', set()).add(table)
+
+
+# conn.info อยู่กับ DBAPI connection ตลอดอายุใน pool จึงต้องย้าย/ล้างเมื่อจบ transaction
+# (rollback ไปยัง savepoint ไม่ล้าง — เพิ่ม version เกินไม่เสียหาย แค่ cache หมดอายุเร็วขึ้น)
+@event.listens_for(Engine, 'commit')
+def _queue_committed_tables(conn):
+    tables = conn.info.pop('written_tables', None)
+    if tables:
+        _queue(conn.engine, tables)
+
+
+def _queue(engine, tables):
+    pending = getattr(_committed, 'tables', None)
+    if pending is None:
+        pending = _committed.tables = {}
+    pending.setdefault(engine, set()).update(tables)
+
+
+@event.listens_for(Engine, 'rollback')
+def _forget_written_tables(conn):
+    conn.info.pop('written_tables', None)
+
+
+def flush_table_versions():
+    """เพิ่ม version ของตารางที่ commit ไปแล้ว — transaction สั้นแยกจากผู้เขียน ล็อกแถวตามลำดับชื่อ"""
+    pending = getattr(_committed, 'tables', None)
+    if not pending:
+        return
+    _committed.tables = None
+    for engine, tables in pending.items():
+        try:
+            with engine.begin() as conn:
+                for table in sorted(tables):
+                    bump_cache_version(conn, _version_name(table))
+        except SQLAlchemyError:
+            # ข้อมูล commit ไปแล้ว — ไม่ให้ error นี้ทำให้ผู้เขียนเข้าใจว่าบันทึกไม่สำเร็จ ลองใหม่ครั้งถัดไป
+            logger.exception('Failed to bump table versions %s', sorted(tables))
+            _queue(engine, tables)
+
+
+@event.listens_for(Session, 'after_commit')
+def _flush_after_session_commit(session):
+    flush_table_versions()
+
+
+# connection ที่ commit เองนอก session (engine.begin()) — เพิ่ม version อย่างช้าตอนจบ request/app context
+@appcontext_tearing_down.connect
+def _flush_on_teardown(sender, **extra):
+    flush_table_versions()
+
+
+# --- Views ---
+
+def _not_modified(etag, last_modified, use_last_modified):
+    if request.if_none_match:
+        return etag in request.if_none_match
+    since = request.if_modified_since
+    # Last-Modified ไม่รวม key และผู้ใช้ จึงใช้ตัดสินเฉพาะ view ที่ไม่มี key
+    if not use_last_modified:
+        return False
+    return bool(since and last_modified and last_modified.replace(microsecond=0) <= since.replace(tzinfo=None))
+
+
+def conditional_view(*tables, key=None):
+    """
+    ให้ view ตอบ 304 เมื่อตารางที่ประกาศไว้ไม่มีการเปลี่ยนแปลง
+    key: ฟังก์ชัน (ไม่มีอาร์กิวเมนต์) คืนค่าเพิ่มเติมที่ผลลัพธ์ขึ้นอยู่ด้วย เช่น วันที่ปัจจุบัน
+    ตาราง user ถูกรวมเสมอ เพราะทุกหน้าแสดงชื่อ/สิทธิ์ของผู้ใช้ที่ล็อกอินอยู่
+    """
+    dependencies = tuple(sorted(set(tables) | {'user'}))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # มีข้อความ flash ค้างอยู่ = หน้านี้ต้อง render ใหม่เพื่อแสดงข้อความ
+            if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            versions, last_modified = read_table_versions(dependencies)
+            user_id = current_user.get_id() if current_user.is_authenticated else None
+            raw = repr((current_app.config['APP_VERSION'], request.full_path, user_id,
+                        list(zip(dependencies, versions)), key() if key else None))
+            etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+            if _not_modified(etag, last_modified, key is None):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # เก็บไว้ได้แต่ต้องถามซ้ำทุกครั้ง (ได้ 304 ถ้าข้อมูลไม่เปลี่ยน)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,241 @@
+"""
+ตัวนับสถิติหลัก (จำนวนงานซ่อมแยกตามสถานะ, จำนวน/ยอดขาย) ที่อัปเดตแบบ incremental
+
+ทุกครั้งที่ session flush เราจะดูว่ามี ServiceJob/Sale ถูกสร้าง เปลี่ยนสถานะ หรือถูกลบหรือไม่
+แล้วปรับแถวใน stat_counter ด้วย UPDATE ... SET count = count + :delta ภายใน transaction เดียวกัน
+ผลคือ counter จะ commit/rollback ไปพร้อมกับข้อมูลจริงเสมอ และการอ่านสถิติเป็น O(1)
+
+การแก้ข้อมูลที่ไม่ผ่าน ORM (เช่น query.delete() หรือ SQL ตรง) จะไม่ถูกนับ
+ให้ใช้คำสั่ง `flask counters reconcile` เพื่อสร้างค่าใหม่จากตารางต้นทางและดูค่าที่คลาดเคลื่อน
+"""
+
+from collections import defaultdict
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, func, update, insert
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import StatCounter, ServiceJob, ServiceJobStatus, Sale, PaymentStatus
+
+JOB_TOTAL = 'service_job'
+SALE_TOTAL = 'sale'
+
+PENDING_JOB_STATUSES = (ServiceJobStatus.RECEIVED, ServiceJobStatus.IN_PROGRESS)
+
+
+def job_status_key(status):
+    return f'service_job:status:{status.value}'
+
+
+def sale_status_key(status):
+    return f'sale:status:{status.value}'
+
+
+def all_counter_keys():
+    keys = [JOB_TOTAL, SALE_TOTAL]
+    keys += [job_status_key(s) for s in ServiceJobStatus]
+    keys += [sale_status_key(s) for s in PaymentStatus]
+    return keys
+
+
+# --- Reading ---
+
+def get_counters(keys=None):
+    """คืน dict ของ key -> (count, amount) ด้วย SELECT เดียว"""
+    query = db.session.query(StatCounter.key, StatCounter.count, StatCounter.amount)
+    if keys is not None:
+        query = query.filter(StatCounter.key.in_(list(keys)))
+    counters = {key: (0, 0.0) for key in (keys or [])}
+    for key, count, amount in query:
+        counters[key] = (int(count or 0), float(amount or 0))
+    return counters
+
+
+def job_counts():
+    """จำนวนงานทั้งหมด / เสร็จแล้ว / ค้างอยู่ อ่านจาก counter โดยตรง"""
+    counters = get_counters([JOB_TOTAL] + [job_status_key(s) for s in ServiceJobStatus])
+    return {
+        'total': counters[JOB_TOTAL][0],
+        'completed': counters[job_status_key(ServiceJobStatus.COMPLETED)][0],
+        'pending': sum(counters[job_status_key(s)][0] for s in PENDING_JOB_STATUSES),
+    }
+
+
+def sale_totals():
+    """จำนวนบิลและยอดขายรวมทั้งหมด"""
+    count, amount = get_counters([SALE_TOTAL])[SALE_TOTAL]
+    return {'count': count, 'amount': amount}
+
+
+# --- Maintaining ---
+
+def old_value(state, attr_name, default):
+    """
+    ค่าเดิมของ attribute ก่อนการแก้ไขใน flush นี้ (หรือค่าปัจจุบันหากไม่มีการแก้ไข)
+    คอลัมน์ที่ใช้ต้องประกาศ active_history=True — ไม่เช่นนั้น object ที่ถูก expire (เช่นหลัง commit)
+    จะไม่มีค่าเดิมใน history และได้ค่าใหม่แทน
+    """
+    history = state.attrs[attr_name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.object, attr_name, default)
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(lambda: [0, 0.0])
+
+    def add(key, count=0, amount=0.0):
+        deltas[key][0] += count
+        deltas[key][1] += amount
+
+    for obj in session.new:
+        if isinstance(obj, ServiceJob):
+            add(JOB_TOTAL, 1)
+            add(job_status_key(obj.status or ServiceJobStatus.RECEIVED), 1)
+        elif isinstance(obj, Sale):
+            amount = obj.total_amount or 0.0
+            add(SALE_TOTAL, 1, amount)
+            add(sale_status_key(obj.payment_status or PaymentStatus.PAID), 1, amount)
+
+    for obj in session.deleted:
+        state = inspect(obj)
+        if isinstance(obj, ServiceJob):
+            add(JOB_TOTAL, -1)
+            add(job_status_key(old_value(state, 'status', None) or ServiceJobStatus.RECEIVED), -1)
+        elif isinstance(obj, Sale):
+            amount = old_value(state, 'total_amount', 0.0) or 0.0
+            add(SALE_TOTAL, -1, -amount)
+            add(sale_status_key(old_value(state, 'payment_status', None) or PaymentStatus.PAID), -1, -amount)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        if isinstance(obj, ServiceJob):
+            history = state.attrs.status.history
+            if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                add(job_status_key(history.deleted[0]), -1)
+                add(job_status_key(history.added[0]), 1)
+        elif isinstance(obj, Sale):
+            amount_history = state.attrs.total_amount.history
+            status_history = state.attrs.payment_status.history
+            if not (amount_history.has_changes() or status_history.has_changes()):
+                continue
+            old_amount = old_value(state, 'total_amount', 0.0) or 0.0
+            old_status = old_value(state, 'payment_status', None) or PaymentStatus.PAID
+            new_amount = obj.total_amount or 0.0
+            new_status = obj.payment_status or PaymentStatus.PAID
+            add(SALE_TOTAL, 0, new_amount - old_amount)
+            add(sale_status_key(old_status), -1, -old_amount)
+            add(sale_status_key(new_status), 1, new_amount)
+
+    return {key: d for key, d in deltas.items() if d[0] or d[1]}
+
+
+def apply_deltas(connection, deltas):
+    """บวก delta เข้า counter แบบ atomic (สร้างแถวใหม่หากยังไม่มี)"""
+    table = StatCounter.__table__
+    for key, (count, amount) in deltas.items():
+        result = connection.execute(
+            update(table)
+            .where(table.c.key == key)
+            .values(count=table.c.count + count, amount=table.c.amount + amount, updated_at=func.now())
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(key=key, count=count, amount=amount, updated_at=func.now()))
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_counters_before_flush(session, flush_context, instances):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def ensure_counter_rows():
+    """สร้างแถว counter ที่ยังไม่มี (ค่าเริ่มต้นคำนวณจากตารางต้นทาง) เพื่อไม่ให้ worker แย่งกัน INSERT"""
+    existing = {key for (key,) in db.session.query(StatCounter.key)}
+    if set(all_counter_keys()) - existing:
+        reconcile_counters()
+
+
+def compute_actual_counters():
+    """นับค่าจริงจากตารางต้นทางด้วย GROUP BY"""
+    actual = {key: (0, 0.0) for key in all_counter_keys()}
+
+    total = 0
+    for status, count in db.session.query(ServiceJob.status, func.count(ServiceJob.id)).group_by(ServiceJob.status):
+        status = status or ServiceJobStatus.RECEIVED
+        actual[job_status_key(status)] = (actual[job_status_key(status)][0] + count, 0.0)
+        total += count
+    actual[JOB_TOTAL] = (total, 0.0)
+
+    total_count, total_amount = 0, 0.0
+    rows = db.session.query(
+        Sale.payment_status, func.count(Sale.id), func.coalesce(func.sum(Sale.total_amount), 0)
+    ).group_by(Sale.payment_status)
+    for status, count, amount in rows:
+        key = sale_status_key(status or PaymentStatus.PAID)
+        prev_count, prev_amount = actual[key]
+        actual[key] = (prev_count + count, prev_amount + float(amount))
+        total_count += count
+        total_amount += float(amount)
+    actual[SALE_TOTAL] = (total_count, total_amount)
+    return actual
+
+
+def reconcile_counters(dry_run=False):
+    """
+    สร้าง counter ใหม่จากตารางต้นทางและคืนรายการที่คลาดเคลื่อน
+    [(key, (count, amount) ที่บันทึกไว้, (count, amount) จริง), ...]
+    """
+    # ล็อกแถว counter ก่อนนับ (บน Postgres) เพื่อให้ transaction ที่กำลังเขียนพร้อมกันรอจนเรา commit
+    stored = {
+        c.key: (int(c.count or 0), float(c.amount or 0))
+        for c in StatCounter.query.with_for_update().all()
+    }
+    actual = compute_actual_counters()
+
+    drift = []
+    for key, values in actual.items():
+        current = stored.get(key)
+        if current is None or current[0] != values[0] or abs(current[1] - values[1]) > 0.005:
+            drift.append((key, current, values))
+
+    if dry_run:
+        db.session.rollback()
+        return drift
+
+    for key, current, (count, amount) in drift:
+        if current is None:
+            db.session.add(StatCounter(key=key, count=count, amount=amount))
+        else:
+            db.session.execute(
+                update(StatCounter.__table__)
+                .where(StatCounter.__table__.c.key == key)
+                .values(count=count, amount=amount, updated_at=func.now())
+            )
+    db.session.commit()
+    return drift
+
+
+# --- CLI ---
+
+counters_cli = AppGroup('counters', help='จัดการตัวนับสถิติ (stat_counter)')
+
+
+@counters_cli.command('reconcile')
+@click.option('--dry-run', is_flag=True, help='แสดงค่าที่คลาดเคลื่อนโดยไม่บันทึก')
+def reconcile_command(dry_run):
+    """สร้าง counter ใหม่จาก service_job และ sale แล้วรายงานค่าที่คลาดเคลื่อน"""
+    drift = reconcile_counters(dry_run=dry_run)
+    if not drift:
+        click.echo('Counters are in sync.')
+        return
+    for key, current, (count, amount) in drift:
+        stored = 'missing' if current is None else f'count={current[0]} amount={current[1]:.2f}'
+        click.echo(f'{key}: stored {stored} -> actual count={count} amount={amount:.2f}')
+    click.echo(f'{len(drift)} counter(s) drifted' + (' (dry run, nothing written).' if dry_run else ' and were rebuilt.'))
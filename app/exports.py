@@ -0,0 +1,168 @@
+"""
+ส่งออกข้อมูลเป็น CSV / Excel แบบ streaming
+
+- อ่านฐานข้อมูลเป็นชุดด้วย yield_per (เลือกเฉพาะคอลัมน์ ไม่สร้าง ORM object) — บน PostgreSQL ใช้ server-side cursor
+- CSV: เขียนทีละแถวลง buffer เล็กๆ แล้วส่งออกเป็นก้อนละประมาณ EXPORT_CHUNK_BYTES
+- Excel: ใช้ openpyxl แบบ write-only ซึ่งเขียนแถวลงไฟล์ชั่วคราวบนดิสก์ทันที
+  แล้วค่อยส่งไฟล์ .xlsx ที่ได้ออกไปเป็นก้อน (รูปแบบ ZIP ของ xlsx ต้องเขียนให้จบก่อนจึงเริ่มส่งได้)
+หน่วยความจำที่ใช้จึงคงที่ ไม่ขึ้นกับจำนวนแถวหรือช่วงวันที่
+
+ตัวอย่าง:
+    header, rows = sales_export_rows(period_filter)
+    return export_response('sales', 'csv', header, rows)
+"""
+
+import csv
+import enum
+import io
+import tempfile
+from datetime import datetime, timezone
+
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+
+from . import db
+from .models import Sale, SaleItem, Product, Customer, User, ServiceJob
+from .utils import THAILAND_TZ
+
+EXPORT_YIELD_PER = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _cell_value(value):
+    """แปลงค่าให้เขียนลง CSV/Excel ได้: เวลาเป็นเวลาไทย (ไม่มี tzinfo), enum เป็นค่า"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(THAILAND_TZ).replace(tzinfo=None)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _stream(statement):
+    """ไล่อ่านผลลัพธ์ของ statement เป็นชุดละ EXPORT_YIELD_PER แถว"""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_YIELD_PER))
+    for row in result:
+        yield tuple(_cell_value(value) for value in row)
+
+
+# --- Row sources ---
+
+def sales_export_rows(period_filter):
+    """หนึ่งแถวต่อรายการสินค้าในบิล (บิลที่ไม่มีรายการจะไม่ปรากฏ) เรียงตามเวลาขาย"""
+    salesperson = aliased(User)
+    header = ('เลขที่บิล', 'วันที่', 'ลูกค้า', 'พนักงานขาย', 'สถานะการชำระ', 'ยอดรวมบิล',
+              'รหัสสินค้า', 'สินค้า', 'จำนวน', 'ราคาต่อหน่วย', 'รวม')
+    statement = select(
+        Sale.sale_number, Sale.created_at, Customer.name,
+        func.coalesce(salesperson.first_name, '') + ' ' + func.coalesce(salesperson.last_name, ''),
+        Sale.payment_status, Sale.total_amount,
+        Product.sku, Product.name, SaleItem.quantity, SaleItem.price_per_unit,
+        SaleItem.quantity * SaleItem.price_per_unit,
+    ).select_from(SaleItem) \
+        .join(Sale, Sale.id == SaleItem.sale_id) \
+        .join(Product, Product.id == SaleItem.product_id) \
+        .join(salesperson, salesperson.id == Sale.salesperson_id) \
+        .outerjoin(Customer, Customer.id == Sale.customer_id) \
+        .where(*period_filter) \
+        .order_by(Sale.created_at, Sale.id, SaleItem.id)
+    return header, _stream(statement)
+
+
+def jobs_export_rows(filters):
+    header = ('เลขที่ใบงาน', 'หัวข้อ', 'ลูกค้า', 'เบอร์โทร', 'สถานะ', 'วันที่รับงาน', 'กำหนดเสร็จ', 'วันที่ปิดงาน', 'อาการเสีย')
+    statement = select(
+        ServiceJob.job_number, ServiceJob.title, Customer.name, Customer.phone, ServiceJob.status,
+        ServiceJob.created_at, ServiceJob.due_date, ServiceJob.completed_at, ServiceJob.problem_description,
+    ).join(Customer, Customer.id == ServiceJob.customer_id) \
+        .where(*filters) \
+        .order_by(ServiceJob.created_at, ServiceJob.id)
+    return header, _stream(statement)
+
+
+def stock_export_rows():
+    header = ('รหัสสินค้า', 'ชื่อสินค้า', 'ราคา', 'คงเหลือ', 'มูลค่าคงเหลือ')
+    statement = select(
+        Product.sku, Product.name, Product.price, Product.stock_quantity,
+        Product.price * Product.stock_quantity,
+    ).order_by(Product.name, Product.id)
+    return header, _stream(statement)
+
+
+# --- Writers ---
+
+class _Buffer:
+    """ที่พักข้อมูลให้ csv.writer เขียนลงและดึงออกเป็นก้อน"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+
+    def write(self, text):
+        self._buffer.write(text)
+
+    def size(self):
+        return self._buffer.tell()
+
+    def drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data.encode('utf-8')
+
+
+def iter_csv(header, rows):
+    buffer = _Buffer()
+    # BOM ให้ Excel เปิดไฟล์ภาษาไทยถูกต้อง
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.size() >= EXPORT_CHUNK_BYTES:
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def iter_xlsx(header, rows, title):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])  # Excel จำกัดชื่อ sheet ไว้ 31 ตัวอักษร
+    bold = Font(bold=True)
+    header_cells = []
+    for name in header:
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = bold
+        header_cells.append(cell)
+    sheet.append(header_cells)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_response(name, fmt, header, rows):
+    """Response แบบ streaming ของไฟล์ <name>_<วันที่>.<fmt>"""
+    stamp = datetime.now(THAILAND_TZ).strftime('%Y%m%d_%H%M')
+    if fmt == 'xlsx':
+        stream = iter_xlsx(header, rows, title=name)
+    else:
+        stream = iter_csv(header, rows)
+    return Response(stream_with_context(stream),
+                    mimetype=_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment;filename={name}_{stamp}.{fmt}'})
@@ -0,0 +1,100 @@
+"""
+Form field สำหรับเลือก record จากตารางขนาดใหญ่ (ลูกค้า, สินค้า) แบบ typeahead
+
+ต่างจาก QuerySelectField ที่โหลดทุกแถวมาสร้าง <option> และโหลดซ้ำอีกรอบตอน POST เพื่อตรวจค่า:
+- ตอน render มีเพียง option ของค่าที่เลือกอยู่ (ถ้ามี) รายการอื่นดึงจาก lookup endpoint ผ่าน static/js/lookup-select.js
+- ตอน POST ตรวจเฉพาะ id ที่ส่งมาด้วย primary-key lookup ครั้งเดียว
+ต้นทุนของหน้าฟอร์มจึงคงที่ไม่ว่าตารางจะมีกี่แถว
+"""
+
+from flask import url_for
+from markupsafe import Markup
+from wtforms.fields import Field
+from wtforms.validators import StopValidation
+from wtforms.widgets import html_params
+
+from . import db
+from .models import SearchDocument
+from .search import search
+
+LOOKUP_PAGE_SIZE = 20
+
+
+class LookupSelect:
+    """<select> ที่มีเฉพาะค่าว่าง (ถ้าอนุญาต) และค่าที่เลือกอยู่ พร้อม data-lookup-url ให้ JavaScript เติมรายการ"""
+
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        kwargs['data-lookup-url'] = url_for(field.lookup_endpoint)
+        kwargs['data-placeholder'] = field.search_placeholder
+        options = []
+        if field.allow_blank:
+            options.append(Markup('<option value="">%s</option>') % field.blank_text)
+        if field.data is not None:
+            options.append(Markup('<option value="%s" selected>%s</option>') % (field.data.id, field.get_label(field.data)))
+        return Markup('<select %s>%s</select>') % (html_params(name=field.name, **kwargs), Markup('').join(options))
+
+
+class ModelLookupField(Field):
+    """
+    เลือก model instance หนึ่งรายการด้วย id
+
+    model             คลาส model ที่จะ db.session.get()
+    lookup_endpoint   endpoint ที่คืนรายการแบบแบ่งหน้า (ดู lookup_response)
+    get_label         ชื่อ attribute หรือฟังก์ชันสำหรับข้อความที่แสดง
+    allow_blank       อนุญาตให้ไม่เลือก (ถ้าไม่อนุญาต จะแจ้ง required_message)
+    """
+    widget = LookupSelect()
+
+    def __init__(self, label=None, validators=None, model=None, lookup_endpoint=None, get_label='name',
+                 allow_blank=False, blank_text='', required_message='กรุณาเลือกรายการ',
+                 search_placeholder='พิมพ์เพื่อค้นหา...', **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.model = model
+        self.lookup_endpoint = lookup_endpoint
+        self.allow_blank = allow_blank
+        self.blank_text = blank_text
+        self.required_message = required_message
+        self.search_placeholder = search_placeholder
+        if isinstance(get_label, str):
+            self.get_label = lambda obj, attr=get_label: getattr(obj, attr)
+        else:
+            self.get_label = get_label
+        self._submitted_id = None
+
+    def _value(self):
+        return str(self.data.id) if self.data is not None else ''
+
+    def process_formdata(self, valuelist):
+        self.data = None
+        self._submitted_id = valuelist[0].strip() if valuelist and valuelist[0] else ''
+        if self._submitted_id.isdigit():
+            self.data = db.session.get(self.model, int(self._submitted_id))
+
+    def pre_validate(self, form):
+        if self.data is not None:
+            return
+        if self._submitted_id:
+            raise StopValidation('ไม่พบรายการที่เลือก กรุณาเลือกใหม่')
+        if not self.allow_blank:
+            raise StopValidation(self.required_message)
+
+
+def lookup_response(entity_type, query, page, per_page=LOOKUP_PAGE_SIZE):
+    """
+    ผลลัพธ์สำหรับ lookup endpoint: {'items': [{'id', 'text', 'subtitle'}], 'page', 'has_more'}
+    มีคำค้นจะค้นจากดัชนีค้นหา (เรียงตามความเกี่ยวข้อง) ไม่มีคำค้นจะเรียงตามชื่อ
+    """
+    if query.strip():
+        results = search(query, entity_type, page=page, per_page=per_page)
+        rows, has_more = results.items, results.has_more
+    else:
+        rows = SearchDocument.query.filter_by(entity_type=entity_type) \
+            .order_by(SearchDocument.title, SearchDocument.id) \
+            .offset((page - 1) * per_page).limit(per_page + 1).all()
+        rows, has_more = rows[:per_page], len(rows) > per_page
+    return {
+        'items': [{'id': row.entity_id, 'text': row.title, 'subtitle': row.subtitle} for row in rows],
+        'page': page,
+        'has_more': has_more,
+    }
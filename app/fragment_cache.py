@@ -0,0 +1,109 @@
+"""
+Fragment cache สำหรับแม่แบบ Jinja: แท็ก {% cache %} เก็บ HTML ที่ render แล้วของแต่ละส่วน (เช่น หนึ่งแถวในตาราง)
+
+    {% cache 'job_row', job, job.customer %}
+        <td>{{ job.job_number }}</td> ...
+    {% endcache %}
+
+key ของ fragment คือตำแหน่งในแม่แบบ รวมกับ id และค่าคอลัมน์ทุกคอลัมน์ของ object ที่ส่งเข้ามา (ค่าอื่นใช้ตามที่เป็น)
+เป็น key แบบ content-addressed เหมือน cache ใบเสร็จ — ข้อมูลเปลี่ยนเมื่อไหร่ key ก็เปลี่ยนเอง จึงไม่ต้อง invalidate
+ข้อควรระวัง: ทุกค่าที่ fragment แสดงต้องมาจาก argument ของแท็ก (เช่น ต้องส่ง job.customer ถ้าแสดงชื่อลูกค้า)
+
+เก็บในหน่วยความจำของแต่ละ worker แบบ LRU จำกัดไม่เกิน FRAGMENT_CACHE_MAX_ENTRIES รายการ
+(ใช้ร่วมกันทุก thread ใน process — key ไม่มีวันล้าสมัยจึงไม่ต้องประสานกับ worker อื่น
+และอ่านจาก dict เร็วกว่า render แถวใหม่ ต่างจากการอ่านไฟล์ทีละแถว)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy.orm.base import instance_state
+from sqlalchemy.orm.exc import UnmappedInstanceError
+
+
+def _fingerprint(value):
+    """id และค่าคอลัมน์ของ ORM object (ค่าอื่นคืนตามเดิม)"""
+    try:
+        state = instance_state(value)
+    except (AttributeError, UnmappedInstanceError):
+        return value
+    mapper = state.mapper
+    # อ่านจาก state.dict ตรง ๆ (เร็วกว่า getattr ผ่าน descriptor) — คอลัมน์ที่ยังไม่โหลดได้ None
+    values = state.dict
+    return (mapper.class_.__name__, state.identity,
+            tuple([values.get(attr.key) for attr in mapper.column_attrs]))
+
+
+def fragment_key(site, args):
+    raw = repr((current_app.config['APP_VERSION'], site, [_fingerprint(arg) for arg in args]))
+    return hashlib.sha1(raw.encode('utf-8')).digest()
+
+
+class FragmentCache:
+    def __init__(self):
+        self.max_entries = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def init_app(self, app):
+        self.max_entries = app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+        app.jinja_env.add_extension(FragmentCacheExtension)
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        # ตำแหน่งของแท็กในแม่แบบ — fragment ต่างที่กันจึงไม่ชนกันแม้ส่ง object เดียวกัน
+        site = nodes.Const(f'{parser.name}:{lineno}')
+        return nodes.CallBlock(self.call_method('_render', [site, nodes.List(args)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render(self, site, args, caller):
+        if not fragment_cache.max_entries:
+            return caller()
+        key = fragment_key(site, args)
+        html = fragment_cache.get(key)
+        if html is None:
+            html = Markup(caller())
+            fragment_cache.set(key, html)
+        return html
@@ -0,0 +1,402 @@
+"""
+นำเข้าสินค้าและลูกค้าจากไฟล์ CSV / Excel ทีละมากๆ
+
+- อ่านไฟล์แบบ stream (csv.reader หรือ openpyxl แบบ read-only) แล้วตรวจทีละชุดละ IMPORT_BATCH_SIZE แถว
+- ตรวจว่าซ้ำกับข้อมูลเดิมด้วย query เดียวต่อชุด (sku IN (...)) ไม่ query ทีละแถว
+  ลูกค้าเทียบด้วยเบอร์โทรแบบตัวเลขล้วน (อ่านเบอร์ทั้งหมดครั้งเดียวตอนเริ่ม เพราะเบอร์ที่เก็บไว้อาจมีขีดคั่น)
+- เขียนด้วย bulk insert / executemany update (สินค้าใหม่ใช้ upsert บน sku กันกรณีมีการเพิ่มพร้อมกัน)
+  และ commit ทีละชุด แถวที่ผิดจะถูกข้ามพร้อมบันทึกข้อผิดพลาดตามเลขแถว
+- การเขียนแบบ Core ไม่ผ่าน ORM event จึงอัปเดต search_document ในชุดเดียวกันเอง และสั่งสร้างดัชนีสินค้าใหม่เมื่อจบ
+
+หัวคอลัมน์รองรับทั้งชื่อภาษาอังกฤษและภาษาไทย (รวมถึงหัวคอลัมน์ของไฟล์ที่ส่งออกจากระบบ)
+"""
+
+import csv
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+import click
+from flask.cli import AppGroup
+from openpyxl import load_workbook
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .models import Product, Customer
+from .product_index import product_index
+from .search import build_document, write_documents
+
+IMPORT_BATCH_SIZE = 1000
+# จำนวนข้อผิดพลาดสูงสุดที่เก็บรายละเอียดไว้แสดง (นับจำนวนทั้งหมดเสมอ)
+IMPORT_MAX_ERRORS = 500
+
+PRODUCT_COLUMNS = {
+    'sku': ('sku', 'รหัสสินค้า', 'sku (รหัสสินค้า)'),
+    'name': ('name', 'ชื่อสินค้า', 'สินค้า', 'ชื่อสินค้า/อะไหล่'),
+    'price': ('price', 'ราคา', 'ราคาขาย'),
+    'stock_quantity': ('stock_quantity', 'stock', 'คงเหลือ', 'จำนวนในสต็อก'),
+}
+PRODUCT_REQUIRED = ('sku', 'name', 'price')
+
+CUSTOMER_COLUMNS = {
+    'name': ('name', 'ชื่อ', 'ชื่อ-นามสกุล', 'ลูกค้า'),
+    'phone': ('phone', 'เบอร์โทร', 'เบอร์โทรศัพท์'),
+    'address': ('address', 'ที่อยู่'),
+}
+CUSTOMER_REQUIRED = ('name',)
+
+
+class ImportFileError(ValueError):
+    """ไฟล์อ่านไม่ได้หรือไม่มีคอลัมน์ที่จำเป็น (นำเข้าไม่ได้ทั้งไฟล์)"""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append((row_number, message))
+
+
+# --- Reading ---
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFileError(f'อ่านไฟล์ CSV ไม่ได้: {e}')
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(stream):
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f'อ่านไฟล์ Excel ไม่ได้: {e}')
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+def iter_file_rows(stream, filename):
+    """แถวของไฟล์ (แถวแรกคือหัวคอลัมน์) ตามนามสกุลไฟล์"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension == 'csv':
+        return _iter_csv(stream)
+    if extension == 'xlsx':
+        return _iter_xlsx(stream)
+    raise ImportFileError('รองรับเฉพาะไฟล์ .csv และ .xlsx')
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_records(rows, columns, required):
+    """แปลงแถวเป็น (เลขแถว, {ชื่อฟิลด์: ข้อความ}) ตามหัวคอลัมน์ คืน (ฟิลด์ที่มีในไฟล์, generator)"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError('ไฟล์ว่างเปล่า')
+
+    aliases = {alias.casefold(): name for name, names in columns.items() for alias in names}
+    positions = {}
+    for index, title in enumerate(header):
+        name = aliases.get(_cell_text(title).casefold())
+        if name and name not in positions:
+            positions[name] = index
+    missing = [columns[name][0] for name in required if name not in positions]
+    if missing:
+        raise ImportFileError('ไม่พบคอลัมน์ที่จำเป็น: ' + ', '.join(missing))
+
+    def records():
+        for row_number, row in enumerate(rows, start=2):
+            values = {name: _cell_text(row[index]) if index < len(row) else '' for name, index in positions.items()}
+            if any(values.values()):
+                yield row_number, values
+
+    return set(positions), records()
+
+
+def _batches(records, size=IMPORT_BATCH_SIZE):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def _parse_number(text, cast):
+    return cast(text.replace(',', ''))
+
+
+# --- Products ---
+
+def _validate_product(values, fields):
+    sku, name = values['sku'], values['name']
+    if not sku:
+        return None, 'ไม่มีรหัสสินค้า (SKU)'
+    if len(sku) > 50:
+        return None, 'รหัสสินค้ายาวเกิน 50 ตัวอักษร'
+    if not name:
+        return None, 'ไม่มีชื่อสินค้า'
+    if len(name) > 100:
+        return None, 'ชื่อสินค้ายาวเกิน 100 ตัวอักษร'
+    try:
+        price = _parse_number(values['price'], float)
+    except ValueError:
+        return None, f"ราคาไม่ถูกต้อง: {values['price']!r}"
+    if price < 0:
+        return None, 'ราคาต้องไม่ติดลบ'
+    record = {'sku': sku, 'name': name, 'price': price}
+    if 'stock_quantity' in fields:
+        try:
+            stock = _parse_number(values['stock_quantity'], lambda v: int(float(v))) if values['stock_quantity'] else 0
+        except ValueError:
+            return None, f"จำนวนคงเหลือไม่ถูกต้อง: {values['stock_quantity']!r}"
+        if stock < 0:
+            return None, 'จำนวนคงเหลือต้องไม่ติดลบ'
+        record['stock_quantity'] = stock
+    return record, None
+
+
+def _insert_products(connection, rows, update_columns):
+    """เพิ่มสินค้าใหม่ด้วย bulk insert (upsert บน sku สำหรับ SQLite/PostgreSQL) คืนแถว (id, sku, name)"""
+    table = Product.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.sku],
+            set_={column: stmt.excluded[column] for column in update_columns},
+        )
+    else:
+        stmt = insert(table)
+    return connection.execute(stmt.returning(table.c.id, table.c.sku, table.c.name), rows).all()
+
+
+def _update_products(connection, rows, update_columns):
+    table = Product.__table__
+    stmt = update(table).where(table.c.id == bindparam('_id')) \
+        .values({column: bindparam(column) for column in update_columns})
+    connection.execute(stmt, rows)
+
+
+def import_products(rows, update_existing=True):
+    """นำเข้าสินค้าจากแถวของไฟล์ (แถวแรกเป็นหัวคอลัมน์) ใช้ sku เป็นคีย์ คืน ImportResult"""
+    result = ImportResult()
+    fields, records = iter_records(rows, PRODUCT_COLUMNS, PRODUCT_REQUIRED)
+    update_columns = [column for column in ('name', 'price', 'stock_quantity') if column in fields]
+    table = Product.__table__
+    seen = {}
+
+    for batch in _batches(records):
+        valid = {}
+        for row_number, values in batch:
+            record, error = _validate_product(values, fields)
+            if error:
+                result.add_error(row_number, error)
+            elif record['sku'] in seen:
+                result.add_error(row_number, f"รหัสสินค้า {record['sku']} ซ้ำกับแถวที่ {seen[record['sku']]}")
+            else:
+                seen[record['sku']] = row_number
+                valid[record['sku']] = record
+        if not valid:
+            continue
+
+        connection = db.session.connection()
+        existing = dict(connection.execute(select(table.c.sku, table.c.id).where(table.c.sku.in_(list(valid)))).all())
+        new_rows = [{'stock_quantity': 0, **record} for sku, record in valid.items() if sku not in existing]
+        old_rows = [{**record, '_id': existing[sku]} for sku, record in valid.items() if sku in existing]
+
+        documents = []
+        if new_rows:
+            for product_id, sku, name in _insert_products(connection, new_rows, update_columns):
+                documents.append(build_document('product', SimpleNamespace(id=product_id, sku=sku, name=name)))
+            result.created += len(new_rows)
+        if old_rows and update_existing:
+            _update_products(connection, old_rows, update_columns)
+            if 'name' in update_columns:
+                documents.extend(build_document('product', SimpleNamespace(id=r['_id'], sku=r['sku'], name=r['name']))
+                                 for r in old_rows)
+            result.updated += len(old_rows)
+        elif old_rows:
+            result.skipped += len(old_rows)
+
+        if documents:
+            write_documents(connection, documents, [])
+        db.session.commit()
+
+    if result.created or result.updated:
+        product_index.invalidate()
+    return result
+
+
+# --- Customers ---
+
+def _validate_customer(values, fields):
+    name = values['name']
+    if not name:
+        return None, 'ไม่มีชื่อลูกค้า'
+    if len(name) > 100:
+        return None, 'ชื่อลูกค้ายาวเกิน 100 ตัวอักษร'
+    record = {'name': name}
+    if 'phone' in fields:
+        if len(values['phone']) > 20:
+            return None, 'เบอร์โทรยาวเกิน 20 ตัวอักษร'
+        record['phone'] = values['phone'] or None
+    if 'address' in fields:
+        record['address'] = values['address'] or None
+    return record, None
+
+
+def _existing_customer_phones():
+    """{เบอร์โทรแบบตัวเลขล้วน: id} ของลูกค้าทั้งหมด (อ่านเฉพาะสองคอลัมน์เป็นชุดๆ)"""
+    table = Customer.__table__
+    phones = {}
+    result = db.session.execute(
+        select(table.c.id, table.c.phone).where(table.c.phone.isnot(None)).execution_options(yield_per=IMPORT_BATCH_SIZE)
+    )
+    for customer_id, phone in result:
+        digits = _digits(phone)
+        if digits:
+            phones.setdefault(digits, customer_id)
+    return phones
+
+
+def _customer_search_document(customer_id, record, existing=None):
+    values = {'name': None, 'phone': None, 'address': None, **(existing or {}), **record}
+    return build_document('customer', SimpleNamespace(id=customer_id, **values))
+
+
+def import_customers(rows, update_existing=True):
+    """นำเข้าลูกค้าจากแถวของไฟล์ ใช้เบอร์โทร (ตัวเลขล้วน) เป็นคีย์ ลูกค้าที่ไม่มีเบอร์จะถูกเพิ่มใหม่เสมอ"""
+    result = ImportResult()
+    fields, records = iter_records(rows, CUSTOMER_COLUMNS, CUSTOMER_REQUIRED)
+    update_columns = [column for column in ('name', 'phone', 'address') if column in fields]
+    table = Customer.__table__
+    phones = _existing_customer_phones()
+    seen = {}
+
+    for batch in _batches(records):
+        new_rows, old_rows = [], []
+        for row_number, values in batch:
+            record, error = _validate_customer(values, fields)
+            if error:
+                result.add_error(row_number, error)
+                continue
+            digits = _digits(record.get('phone'))
+            if digits and digits in seen:
+                result.add_error(row_number, f"เบอร์โทร {record['phone']} ซ้ำกับแถวที่ {seen[digits]}")
+                continue
+            if digits:
+                seen[digits] = row_number
+            if digits and digits in phones:
+                old_rows.append({**record, '_id': phones[digits]})
+            else:
+                new_rows.append({'phone': None, 'address': None, **record})
+        if not (new_rows or old_rows):
+            continue
+
+        connection = db.session.connection()
+        documents = []
+        if new_rows:
+            inserted = connection.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True), new_rows
+            ).scalars().all()
+            for customer_id, record in zip(inserted, new_rows):
+                documents.append(_customer_search_document(customer_id, record))
+                digits = _digits(record['phone'])
+                if digits:
+                    phones[digits] = customer_id
+            result.created += len(new_rows)
+        if old_rows and update_existing:
+            stmt = update(table).where(table.c.id == bindparam('_id')) \
+                .values({column: bindparam(column) for column in update_columns})
+            connection.execute(stmt, old_rows)
+            # เอกสารค้นหาต้องมีทุกฟิลด์ จึงอ่านค่าเดิมของคอลัมน์ที่ไม่ได้นำเข้ามาในชุดเดียว
+            current = {row.id: row._asdict() for row in connection.execute(
+                select(table.c.id, table.c.name, table.c.phone, table.c.address)
+                .where(table.c.id.in_([r['_id'] for r in old_rows]))
+            )}
+            for record in old_rows:
+                existing = current.get(record['_id'], {})
+                existing.pop('id', None)
+                documents.append(_customer_search_document(record['_id'], {c: record[c] for c in update_columns}, existing))
+            result.updated += len(old_rows)
+        elif old_rows:
+            result.skipped += len(old_rows)
+
+        if documents:
+            write_documents(connection, documents, [])
+        db.session.commit()
+
+    return result
+
+
+IMPORTERS = {
+    'products': import_products,
+    'customers': import_customers,
+}
+
+
+def import_file(kind, stream, filename, update_existing=True):
+    """อ่านไฟล์ที่อัปโหลด/เปิดไว้แล้วนำเข้าตามชนิด ('products' หรือ 'customers')"""
+    return IMPORTERS[kind](iter_file_rows(stream, filename), update_existing=update_existing)
+
+
+# --- CLI ---
+
+import_cli = AppGroup('import', help='นำเข้าสินค้า/ลูกค้าจากไฟล์ CSV หรือ Excel')
+
+
+def _run_import_command(kind, path, skip_existing):
+    with open(path, 'rb') as f:
+        try:
+            result = import_file(kind, f, path, update_existing=not skip_existing)
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+    click.echo(f'Created {result.created}, updated {result.updated}, skipped {result.skipped}, '
+               f'errors {result.error_count}.')
+    for row_number, message in result.errors:
+        click.echo(f'  row {row_number}: {message}')
+
+
+@import_cli.command('products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--skip-existing', is_flag=True, help='ไม่แก้ไขสินค้าที่มี SKU อยู่แล้ว')
+def import_products_command(path, skip_existing):
+    """นำเข้าสินค้า (คอลัมน์: sku, name, price และ stock_quantity ถ้ามี)"""
+    _run_import_command('products', path, skip_existing)
+
+
+@import_cli.command('customers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--skip-existing', is_flag=True, help='ไม่แก้ไขลูกค้าที่มีเบอร์โทรอยู่แล้ว')
+def import_customers_command(path, skip_existing):
+    """นำเข้าลูกค้า (คอลัมน์: name และ phone, address ถ้ามี)"""
+    _run_import_command('customers', path, skip_existing)
@@ -0,0 +1,255 @@
+"""
+LINE Messaging API: รับ webhook แบบไม่รอประมวลผล และส่งข้อความผ่าน client ตัวเดียวที่ใช้ซ้ำ
+
+- webhook ตรวจลายเซ็น ตัด event ที่ LINE ส่งซ้ำ (ตาม webhookEventId ในตาราง line_webhook_event)
+  บันทึก event ลงตารางเดียวกัน ใส่คิวแล้วตอบ 200 ทันที เวลาตอบจึงไม่ขึ้นกับ query หรือการเรียก API ของ LINE
+- worker thread (LINE_WORKER_THREADS ตัว เริ่มเมื่อมี event แรก) ดึง event จากคิวไปเรียก handler ใน app context ของตัวเอง
+  แล้วจึงบันทึก processed_at — event ที่คิวเต็มหรือค้างอยู่ในคิวตอน worker ถูก restart จึงไม่หาย
+  งานตั้งเวลา requeue_pending() นำ event ที่ยังไม่เสร็จกลับเข้าคิว (ประมวลผลอย่างน้อยหนึ่งครั้ง)
+- ApiClient หนึ่งตัวต่อ process — urllib3 connection pool ขนาดเท่าจำนวน worker จึงใช้ connection เดิมซ้ำ
+
+ตัวอย่าง:
+    @line_bot.on(MessageEvent)
+    def handle_message(event):
+        line_bot.reply(event.reply_token, 'สวัสดีครับ')
+"""
+
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from linebot.v3 import WebhookParser
+from linebot.v3.webhooks import Event
+from linebot.v3.messaging import (
+    Configuration, ApiClient, MessagingApi,
+    ReplyMessageRequest, TextMessage
+)
+
+from . import db
+from .models import LineWebhookEvent
+from .utils import THAILAND_TZ
+
+# ข้อความหนึ่งข้อความของ LINE ยาวได้ไม่เกิน 5000 ตัวอักษร
+MAX_TEXT_LENGTH = 5000
+
+
+def _claim_event(connection, event):
+    """บันทึก event (ยังไม่ประมวลผล) คืน True ถ้ายังไม่เคยรับมาก่อน"""
+    table = LineWebhookEvent.__table__
+    now = datetime.now(timezone.utc)
+    row = {'event_id': event.webhook_event_id, 'received_at': now, 'queued_at': now, 'payload': event.to_json()}
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table).values(**row)
+        return connection.execute(stmt.on_conflict_do_nothing()).rowcount == 1
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(table).values(**row))
+        return True
+    except IntegrityError:
+        return False
+
+
+def format_thai_datetime(value):
+    """เวลาในฐานข้อมูล (UTC) เป็นข้อความเวลาไทยสำหรับข้อความ LINE"""
+    if value is None:
+        return '-'
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(THAILAND_TZ).strftime('%d/%m/%Y %H:%M')
+
+
+def text_message(text):
+    if len(text) > MAX_TEXT_LENGTH:
+        text = text[:MAX_TEXT_LENGTH - 1] + '…'
+    return TextMessage(text=text)
+
+
+class LineBot:
+    def __init__(self):
+        self.app = None
+        self.parser = None
+        self._handlers = {}
+        self._queue = None
+        self._workers = []
+        self._api = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.parser = WebhookParser(app.config['LINE_CHANNEL_SECRET'] or '')
+        self._queue = queue.Queue(maxsize=app.config['LINE_QUEUE_SIZE'])
+
+    def on(self, event_type):
+        """ลงทะเบียน handler ของ event ประเภทหนึ่ง (เรียกใน worker thread)"""
+        def decorator(func):
+            self._handlers[event_type] = func
+            return func
+        return decorator
+
+    # --- Receiving ---
+
+    def parse(self, body, signature):
+        """ตรวจลายเซ็นและแปลง body เป็นรายการ event (InvalidSignatureError ถ้าลายเซ็นไม่ถูกต้อง)"""
+        return self.parser.parse(body, signature)
+
+    def new_events(self, events):
+        """
+        ตัด event ที่เคยรับแล้วออก (LINE ส่งซ้ำเมื่อตอบช้าหรือผิดพลาด) และบันทึก event ที่เหลือ
+        commit ก่อนตอบ 200 ให้ LINE เพื่อให้ event ไม่หายแม้ยังไม่ได้ประมวลผล
+        """
+        fresh = []
+        connection = db.session.connection()
+        for event in events:
+            if _claim_event(connection, event):
+                fresh.append(event)
+        db.session.commit()
+        return fresh
+
+    def enqueue(self, events):
+        """
+        ใส่ event ลงคิวโดยไม่รอ คืนจำนวนที่ใส่ได้
+        (คิวเต็ม = event นั้นรออยู่ในฐานข้อมูล และจะถูกใส่คิวใหม่โดย requeue_pending())
+        """
+        self._start_workers()
+        queued = 0
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+                queued += 1
+            except queue.Full:
+                self.app.logger.warning('LINE event queue is full, deferring event %s', event.webhook_event_id)
+        return queued
+
+    def requeue_pending(self):
+        """
+        ใส่ event ที่ยังไม่ประมวลผลและอยู่ในคิวนานกว่า LINE_EVENT_REQUEUE_SECONDS กลับเข้าคิว (ไม่เกินที่ว่างในคิว)
+        แต่ละ event ถูกจองด้วยการเลื่อน queued_at แบบมีเงื่อนไข ทุก process จึงไม่ใส่ event เดียวกันซ้ำในรอบเดียวกัน
+        คืนจำนวนที่ใส่คิว
+        """
+        table = LineWebhookEvent.__table__
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.app.config['LINE_EVENT_REQUEUE_SECONDS'])
+        room = self._queue.maxsize - self._queue.qsize() if self._queue.maxsize else None
+        if room is not None and room <= 0:
+            return 0
+        stale = (table.c.processed_at.is_(None), table.c.queued_at < cutoff)
+        rows = db.session.execute(
+            select(table.c.event_id, table.c.payload).where(*stale, table.c.payload.is_not(None))
+            .order_by(table.c.received_at).limit(room)
+        ).all()
+        events = []
+        for event_id, payload in rows:
+            claimed = db.session.execute(
+                update(table).where(table.c.event_id == event_id, *stale).values(queued_at=now)
+            ).rowcount == 1
+            if claimed:
+                events.append(Event.from_json(payload))
+        db.session.commit()
+        return self.enqueue(events) if events else 0
+
+    # --- Processing ---
+
+    def _start_workers(self):
+        with self._lock:
+            if self._workers:
+                return
+            for n in range(max(1, self.app.config['LINE_WORKER_THREADS'])):
+                worker = threading.Thread(target=self._work, name=f'line-worker-{n}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            event = self._queue.get()
+            try:
+                self.process(event)
+            except Exception:
+                self.app.logger.exception('Error handling LINE event %s', getattr(event, 'webhook_event_id', None))
+            finally:
+                self._queue.task_done()
+
+    def process(self, event):
+        """เรียก handler ของ event แล้วบันทึกว่าประมวลผลแล้ว (event ที่ประมวลผลไปแล้วจะถูกข้าม)"""
+        table = LineWebhookEvent.__table__
+        with self.app.app_context():
+            processed = db.session.execute(
+                select(table.c.processed_at).where(table.c.event_id == event.webhook_event_id)
+            ).scalar()
+            if processed is not None:
+                return
+            try:
+                handler = self._handlers.get(type(event))
+                if handler is not None:
+                    handler(event)
+            finally:
+                # handler ที่ error ถือว่าจบแล้ว (บันทึก log ไว้) — ไม่วนลองซ้ำ event ที่ทำให้ error ทุกครั้ง
+                db.session.rollback()
+                db.session.execute(
+                    update(table).where(table.c.event_id == event.webhook_event_id)
+                    .values(processed_at=datetime.now(timezone.utc))
+                )
+                db.session.commit()
+
+    def join(self):
+        """รอจนทุก event ในคิวถูกประมวลผล (ใช้ตอนทดสอบ/ปิดระบบ)"""
+        self._queue.join()
+
+    # --- Sending ---
+
+    @property
+    def api(self):
+        """MessagingApi ที่ใช้ร่วมกันทุก thread ของ process"""
+        with self._lock:
+            if self._api is None:
+                configuration = Configuration(host=self.app.config['LINE_API_ENDPOINT'],
+                                              access_token=self.app.config['LINE_CHANNEL_ACCESS_TOKEN'] or '')
+                # worker ของ webhook + ผู้ส่งแจ้งเตือน (app/notifications.py)
+                configuration.connection_pool_maxsize = \
+                    max(1, self.app.config['LINE_WORKER_THREADS']) + max(1, self.app.config['LINE_PUSH_WORKERS'])
+                self._api = MessagingApi(ApiClient(configuration))
+            return self._api
+
+    def reply(self, reply_token, text):
+        self.api.reply_message(ReplyMessageRequest(reply_token=reply_token, messages=[text_message(text)]))
+
+    # --- Maintenance ---
+
+    def prune_events(self):
+        """ลบ event id ที่เก่ากว่า LINE_EVENT_RETENTION_HOURS (LINE ไม่ส่ง event เก่าขนาดนั้นซ้ำแล้ว)"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.app.config['LINE_EVENT_RETENTION_HOURS'])
+        result = db.session.execute(delete(LineWebhookEvent).where(LineWebhookEvent.received_at < cutoff))
+        db.session.commit()
+        return result.rowcount
+
+
+line_bot = LineBot()
+
+
+def run_requeue_job(app):
+    with app.app_context():
+        try:
+            line_bot.requeue_pending()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Failed to requeue pending LINE webhook events')
+
+
+def run_prune_job(app):
+    with app.app_context():
+        try:
+            line_bot.prune_events()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Failed to prune LINE webhook events')
+
+
+def schedule_line_jobs(app, scheduler):
+    scheduler.add_job(run_requeue_job, 'interval', seconds=max(5, app.config['LINE_EVENT_REQUEUE_SECONDS'] // 2),
+                      args=[app], id='line_event_requeue', replace_existing=True, coalesce=True, max_instances=1)
+    scheduler.add_job(run_prune_job, 'interval', hours=1, args=[app],
+                      id='line_event_prune', replace_existing=True, coalesce=True, max_instances=1)
@@ -72,14 +72,23 @@ class Customer(db.Model):
 
 class ServiceJob(db.Model):
     __tablename__ = 'service_job'
+    __table_args__ = (
+        # Keyset pagination ของหน้ารายการงาน (เรียงจากใหม่ไปเก่า) และการกรองตามลูกค้า
+        db.Index('ix_service_job_created_at_id', 'created_at', 'id'),
+        db.Index('ix_service_job_customer_created', 'customer_id', 'created_at'),
+        # คำสั่ง 'งานค้าง' ของ LINE bot: งานของสถานะหนึ่ง เรียงตามกำหนดเสร็จ (id ตัดสินเมื่อกำหนดเท่ากัน)
+        db.Index('ix_service_job_status_due', 'status', 'due_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     job_number = db.Column(db.String(20), unique=True, nullable=False, index=True)
     title = db.Column(db.String(200), nullable=False)
     problem_description = db.Column(db.Text)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
-    status = db.Column(db.Enum(ServiceJobStatus), default=ServiceJobStatus.RECEIVED, index=True)
+    # active_history: โหลดค่าเดิมก่อนเขียนทับเสมอ (แม้ object ถูก expire หลัง commit) ให้ counter รู้สถานะเดิม
+    status = db.column_property(
+        db.Column(db.Enum(ServiceJobStatus), default=ServiceJobStatus.RECEIVED, index=True), active_history=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    due_date = db.Column(db.DateTime)
+    due_date = db.Column(db.DateTime, index=True)
     completed_at = db.Column(db.DateTime)
     
     customer = db.relationship('Customer', backref='service_jobs')
@@ -89,6 +98,12 @@ class ServiceJob(db.Model):
 
 class JobUpdate(db.Model):
     __tablename__ = 'job_update'
+    __table_args__ = (
+        # รายงานช่าง: นับตามผู้บันทึกในช่วงเวลาแบบ half-open
+        db.Index('ix_job_update_author_created', 'author_id', 'created_at'),
+        # ประวัติงาน (ai_tools): ไล่ตาม id ภายในงานเดียว และหา update ล่าสุดสำหรับ ETag
+        db.Index('ix_job_update_job_id', 'service_job_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     service_job_id = db.Column(db.Integer, db.ForeignKey('service_job.id'), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -128,13 +143,20 @@ class ServiceJobPart(db.Model):
 
 class Sale(db.Model):
     __tablename__ = 'sale'
+    __table_args__ = (
+        # ใช้กับการแบ่งหน้าแบบ keyset และการกรองช่วงวันที่ในหน้าประวัติการขาย
+        db.Index('ix_sale_created_at_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sale_number = db.Column(db.String(20), unique=True, nullable=False, index=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
     salesperson_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    total_amount = db.Column(db.Float, nullable=False)
-    payment_status = db.Column(db.Enum(PaymentStatus), default=PaymentStatus.PAID)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # active_history: counter และ rollup ต้องรู้ค่าเดิมของคอลัมน์เหล่านี้ แม้ object ถูก expire หลัง commit
+    total_amount = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
+    payment_status = db.column_property(
+        db.Column(db.Enum(PaymentStatus), default=PaymentStatus.PAID), active_history=True)
+    created_at = db.column_property(
+        db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc)), active_history=True)
 
     customer = db.relationship('Customer', backref='sales')
     salesperson = db.relationship('User', backref='sales')
@@ -143,7 +165,8 @@ class Sale(db.Model):
 class SaleItem(db.Model):
     __tablename__ = 'sale_item'
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False, index=True)
+    sale_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=False, index=True), active_history=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price_per_unit = db.Column(db.Float, nullable=False)
@@ -159,3 +182,149 @@ class SystemSettings(db.Model):
     value = db.Column(db.Text)
     description = db.Column(db.String(255))
     category = db.Column(db.String(50), default='general', index=True)
+
+class StatCounter(db.Model):
+    """
+    Pre-aggregated headline counters (jobs per status, sales count/amount),
+    kept current by the session events in app/counters.py.
+    """
+    __tablename__ = 'stat_counter'
+
+    key = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class DocumentSequence(db.Model):
+    """
+    Running sequence per document type (and period, e.g. 'sale:2025'),
+    handed out in blocks by app/numbering.py.
+    """
+    __tablename__ = 'document_sequence'
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class SearchDocument(db.Model):
+    """
+    One searchable row per customer / service job / product, kept in sync
+    by the session events in app/search.py and indexed with FTS5 (SQLite)
+    or pg_trgm (Postgres).
+    """
+    __tablename__ = 'search_document'
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='uq_search_document_entity'),
+        # เรียกดูตามตัวอักษรเมื่อยังไม่พิมพ์คำค้น (ตัวเลือกแบบ typeahead)
+        db.Index('ix_search_document_type_title', 'entity_type', 'title', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    subtitle = db.Column(db.String(200))
+    content = db.Column(db.Text, nullable=False)
+
+class CacheVersion(db.Model):
+    """
+    Monotonic version per cached data set (e.g. 'system_settings'),
+    bumped in the same transaction as the change so every worker can
+    detect stale in-process caches with a primary-key read.
+    """
+    __tablename__ = 'cache_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class TechMonthlyStat(db.Model):
+    """
+    Job updates per technician per Bangkok calendar month, maintained by
+    app/rollups.py (incremented on insert, recounted once when the month closes).
+    """
+    __tablename__ = 'tech_monthly_stat'
+
+    period = db.Column(db.Date, primary_key=True)  # first day of the month
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    update_count = db.Column(db.Integer, nullable=False, default=0)
+
+class RollupPeriod(db.Model):
+    """Bookkeeping for rollup tables: which periods are seeded and which are closed (final)."""
+    __tablename__ = 'rollup_period'
+
+    name = db.Column(db.String(50), primary_key=True)
+    period = db.Column(db.Date, primary_key=True)
+    closed = db.Column(db.Boolean, nullable=False, default=False)
+    refreshed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class RollupWatermark(db.Model):
+    """High-water mark ของงานสรุปข้อมูลแบบ incremental (เช่น sale.id ล่าสุดที่ประมวลผลแล้ว)"""
+    __tablename__ = 'rollup_watermark'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class SalesDailyProduct(db.Model):
+    """ยอดขายรายวัน (ตามเวลาไทย) ต่อสินค้า — ดูแลโดย app/rollups.py"""
+    __tablename__ = 'sales_daily_product'
+
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class SalesDailySalesperson(db.Model):
+    """ยอดขายรายวัน (ตามเวลาไทย) ต่อพนักงานขาย — ดูแลโดย app/rollups.py"""
+    __tablename__ = 'sales_daily_salesperson'
+
+    day = db.Column(db.Date, primary_key=True)
+    salesperson_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class SalesDailyPayment(db.Model):
+    """ยอดขายรายวัน (ตามเวลาไทย) ต่อสถานะการชำระเงิน — ดูแลโดย app/rollups.py"""
+    __tablename__ = 'sales_daily_payment'
+
+    day = db.Column(db.Date, primary_key=True)
+    payment_status = db.Column(db.Enum(PaymentStatus), primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class SyncState(db.Model):
+    """สถานะ (JSON) ของงานนำเข้า/ซิงก์ข้อมูลจากระบบภายนอกที่ต้องทำต่อได้ เช่น cursor ของการย้ายข้อมูลจาก Google Tasks"""
+    __tablename__ = 'sync_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    state = db.Column(db.Text, nullable=False, default='{}')
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class LineWebhookEvent(db.Model):
+    """
+    event ของ LINE ที่รับแล้ว: ใช้ตัด event ที่ LINE ส่งซ้ำ และเก็บ event ไว้จนกว่าจะประมวลผลเสร็จ
+    (ถ้าคิวเต็มหรือ worker ถูก restart ก่อน จะถูกใส่คิวใหม่) — ดูแลโดย app/line_messaging.py
+    """
+    __tablename__ = 'line_webhook_event'
+
+    event_id = db.Column(db.String(64), primary_key=True)
+    received_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    payload = db.Column(db.Text)
+    # เวลาที่ใส่คิวล่าสุด — event ที่ยังไม่เสร็จและใส่คิวนานกว่า LINE_EVENT_REQUEUE_SECONDS จะถูกใส่คิวใหม่
+    queued_at = db.Column(db.DateTime)
+    processed_at = db.Column(db.DateTime)
+
+class LineContact(db.Model):
+    """LINE userId ของลูกค้าหรือพนักงาน ใช้เป็นผู้รับการแจ้งเตือนสถานะงานซ่อม"""
+    __tablename__ = 'line_contact'
+    __table_args__ = (
+        db.UniqueConstraint('line_user_id', 'customer_id', 'user_id', name='uq_line_contact'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    line_user_id = db.Column(db.String(64), nullable=False, index=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
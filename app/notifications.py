@@ -0,0 +1,337 @@
+"""
+แจ้งเตือนลูกค้า/ช่างทาง LINE เมื่องานซ่อมถูกเลื่อนนัดหรือปิดงาน
+
+- listener ของ ServiceJob จดการเปลี่ยนแปลงไว้ใน session.info และส่งเข้าคิวหลัง commit เท่านั้น
+  (rollback = ไม่แจ้ง) หน้าเว็บจึงไม่ต้องรอการเรียก LINE API เลย
+- thread ส่งแจ้งเตือนรวม event ที่เกิดภายใน LINE_PUSH_BATCH_SECONDS วินาที (งานเดียวกันหลายครั้งเหลือสถานะล่าสุด)
+  หาผู้รับทั้งหมดด้วย query แบบ IN แล้วจัดกลุ่มผู้รับที่ได้ข้อความเดียวกันเป็น multicast ครั้งละไม่เกิน 500 คน
+- ทุกคำขอผ่าน token bucket (LINE_PUSH_RATE ครั้ง/วินาที) ลองใหม่แบบ exponential backoff เมื่อได้ 429/5xx
+  หรือ network ผิดพลาด โดยใช้ X-Line-Retry-Key เดิม LINE จึงไม่ส่งข้อความซ้ำแม้คำขอแรกจะสำเร็จไปแล้ว
+
+ทดสอบ throughput แบบ offline:
+    python scripts/line_api_stub.py --rate 200 &
+    LINE_API_ENDPOINT=http://127.0.0.1:8765 flask line benchmark --messages 2000 --recipients 50
+"""
+
+import queue
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from linebot.v3.messaging import MulticastRequest
+from linebot.v3.messaging.exceptions import ApiException
+
+from . import db
+from .line_messaging import line_bot, text_message, format_thai_datetime
+from .models import ServiceJob, ServiceJobStatus, Customer, User, Task, JobUpdate, LineContact, task_assignees
+
+MULTICAST_MAX_RECIPIENTS = 500
+
+JOB_RESCHEDULED = 'rescheduled'
+JOB_COMPLETED = 'completed'
+
+
+class TokenBucket:
+    """อนุญาตเฉลี่ย rate ครั้งต่อวินาที และส่งติดกันได้ไม่เกิน capacity ครั้ง (ใช้ร่วมกันได้หลาย thread)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """หยุดทุกผู้ส่งประมาณ seconds วินาที (เมื่อ LINE ตอบ 429)"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+@dataclass
+class PushStats:
+    requests: int = 0
+    recipients: int = 0
+    retries: int = 0
+    failures: int = 0
+
+
+def _retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Building messages ---
+
+def _merge_kind(current, kind):
+    # ปิดงานสำคัญกว่าการเลื่อนนัดที่เกิดก่อนหน้าในชุดเดียวกัน
+    return JOB_COMPLETED if JOB_COMPLETED in (current, kind) else kind
+
+
+def _customer_text(job, kind):
+    if kind == JOB_COMPLETED:
+        return f"งานซ่อม {job.job_number} ({job.title}) ซ่อมเสร็จแล้ว สามารถรับเครื่องได้ครับ"
+    return f"งานซ่อม {job.job_number} ({job.title}) เลื่อนนัดเป็น {format_thai_datetime(job.due_date)} ครับ"
+
+
+def _technician_text(job, customer_name, kind):
+    if kind == JOB_COMPLETED:
+        return f"[{job.job_number}] {job.title} ({customer_name}) ปิดงานแล้ว"
+    return f"[{job.job_number}] {job.title} ({customer_name}) เลื่อนกำหนดเป็น {format_thai_datetime(job.due_date)}"
+
+
+def _line_ids(column, ids):
+    """LINE userId ของลูกค้าหรือพนักงานตาม id: {id: [line_user_id, ...]}"""
+    result = {}
+    if ids:
+        for owner_id, line_user_id in db.session.execute(
+                select(column, LineContact.line_user_id).where(column.in_(ids))):
+            result.setdefault(owner_id, []).append(line_user_id)
+    return result
+
+
+def build_job_messages(changes):
+    """
+    changes: {job_id: kind} → [(ข้อความ, [line_user_id, ...]), ...]
+    ผู้รับที่ได้ข้อความเหมือนกันถูกรวมเป็นรายการเดียว ใช้ query จำนวนคงที่ไม่ขึ้นกับจำนวนงาน
+    """
+    job_ids = list(changes)
+    jobs = db.session.execute(
+        select(ServiceJob, Customer.name).join(Customer, Customer.id == ServiceJob.customer_id)
+        .where(ServiceJob.id.in_(job_ids))
+    ).all()
+
+    # ช่างของงาน = ผู้ได้รับมอบหมายงานย่อย และผู้บันทึกความคืบหน้า
+    technicians = {}
+    for job_id, user_id in db.session.execute(
+            select(Task.service_job_id, task_assignees.c.user_id)
+            .join(task_assignees, task_assignees.c.task_id == Task.id)
+            .where(Task.service_job_id.in_(job_ids))
+            .union(select(JobUpdate.service_job_id, JobUpdate.author_id)
+                   .where(JobUpdate.service_job_id.in_(job_ids)))):
+        technicians.setdefault(job_id, set()).add(user_id)
+
+    customer_lines = _line_ids(LineContact.customer_id, {job.customer_id for job, _ in jobs})
+    staff_lines = _line_ids(LineContact.user_id, set().union(*technicians.values()) if technicians else set())
+
+    messages = {}
+    for job, customer_name in jobs:
+        kind = changes[job.id]
+        if kind == JOB_RESCHEDULED and job.status in (ServiceJobStatus.COMPLETED, ServiceJobStatus.CANCELLED):
+            continue
+        for line_user_id in customer_lines.get(job.customer_id, ()):
+            messages.setdefault(_customer_text(job, kind), set()).add(line_user_id)
+        text = _technician_text(job, customer_name, kind)
+        for user_id in technicians.get(job.id, ()):
+            for line_user_id in staff_lines.get(user_id, ()):
+                messages.setdefault(text, set()).add(line_user_id)
+    return [(text, sorted(recipients)) for text, recipients in messages.items()]
+
+
+# --- Sending ---
+
+class JobNotifier:
+    def __init__(self):
+        self.app = None
+        self.bucket = None
+        self.stats = PushStats()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.bucket = TokenBucket(app.config['LINE_PUSH_RATE'])
+
+    @property
+    def enabled(self):
+        return self.app.config['LINE_PUSH_ENABLED'] and bool(self.app.config['LINE_CHANNEL_ACCESS_TOKEN'])
+
+    def notify(self, changes):
+        """รับ {job_id: kind} ที่ commit แล้วเข้าคิว (ไม่บล็อก)"""
+        if not changes or not self.enabled:
+            return
+        self._start()
+        for job_id, kind in changes.items():
+            self._queue.put((job_id, kind))
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='line-job-notifier', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """รอ event แรก แล้วรวบ event ที่ตามมาภายใน LINE_PUSH_BATCH_SECONDS วินาที"""
+        job_id, kind = self._queue.get()
+        changes = {job_id: kind}
+        deadline = time.monotonic() + self.app.config['LINE_PUSH_BATCH_SECONDS']
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job_id, kind = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            changes[job_id] = _merge_kind(changes.get(job_id), kind)
+        return changes
+
+    def _run(self):
+        while True:
+            changes = self._collect()
+            try:
+                with self.app.app_context():
+                    messages = build_job_messages(changes)
+                self.send_all(messages)
+            except Exception:
+                self.app.logger.exception('Failed to send job notifications for %s', sorted(changes))
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + amount)
+
+    def send_all(self, messages, workers=None):
+        """ส่ง [(ข้อความ, ผู้รับ)] ทั้งหมดเป็น multicast ชุดละไม่เกิน 500 คน พร้อมกันไม่เกิน LINE_PUSH_WORKERS คำขอ"""
+        workers = workers or self.app.config['LINE_PUSH_WORKERS']
+        batches = [(text, recipients[i:i + MULTICAST_MAX_RECIPIENTS])
+                   for text, recipients in messages
+                   for i in range(0, len(recipients), MULTICAST_MAX_RECIPIENTS)]
+        if len(batches) <= 1 or workers <= 1:
+            return sum(self.send(text, to) for text, to in batches)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(lambda batch: self.send(*batch), batches))
+
+    def send(self, text, to):
+        """multicast หนึ่งครั้ง (ลองใหม่ด้วย retry key เดิม) คืน True ถ้า LINE รับแล้ว"""
+        request = MulticastRequest(to=to, messages=[text_message(text)])
+        retry_key = str(uuid.uuid4())
+        max_retries = self.app.config['LINE_PUSH_MAX_RETRIES']
+        for attempt in range(max_retries + 1):
+            self.bucket.acquire()
+            try:
+                line_bot.api.multicast(request, x_line_retry_key=retry_key)
+            except ApiException as e:
+                # 409 = คำขอที่ใช้ retry key นี้สำเร็จไปแล้ว
+                if e.status == 409:
+                    break
+                if e.status != 429 and (e.status or 0) < 500:
+                    self.app.logger.error('LINE multicast rejected (%s): %s', e.status, e.body)
+                    self._count(failures=1)
+                    return False
+                delay = _retry_after(e)
+                if e.status == 429:
+                    delay = delay or 1.0
+                    self.bucket.pause(delay)
+            except (Urllib3HTTPError, OSError):
+                delay = None
+            else:
+                break
+            if attempt == max_retries:
+                self.app.logger.error('LINE multicast failed after %d attempts', attempt + 1)
+                self._count(failures=1)
+                return False
+            self._count(retries=1)
+            time.sleep(delay or min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+        self._count(requests=1, recipients=len(to))
+        return True
+
+
+job_notifier = JobNotifier()
+
+
+# --- Collecting changes ---
+
+@event.listens_for(ServiceJob, 'after_update')
+def _job_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.status.history.has_changes() and target.status == ServiceJobStatus.COMPLETED:
+        kind = JOB_COMPLETED
+    elif state.attrs.due_date.history.has_changes() and target.due_date is not None:
+        kind = JOB_RESCHEDULED
+    else:
+        return
+    changes = state.session.info.setdefault('job_notifications', {})
+    changes[target.id] = _merge_kind(changes.get(target.id), kind)
+
+
+@event.listens_for(Session, 'after_commit')
+def _send_job_notifications(session):
+    job_notifier.notify(session.info.pop('job_notifications', None))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_job_notifications(session):
+    session.info.pop('job_notifications', None)
+
+
+# --- CLI ---
+
+line_cli = AppGroup('line', help='จัดการผู้รับและทดสอบการแจ้งเตือนทาง LINE')
+
+
+@line_cli.command('link')
+@click.argument('line_user_id')
+@click.option('--customer-id', type=int, help='ลูกค้าที่เป็นเจ้าของ LINE userId นี้')
+@click.option('--username', help='พนักงานที่เป็นเจ้าของ LINE userId นี้')
+def link_command(line_user_id, customer_id, username):
+    """ผูก LINE userId กับลูกค้าหรือพนักงาน เพื่อรับแจ้งเตือนสถานะงานซ่อม"""
+    if bool(customer_id) == bool(username):
+        raise click.UsageError('Specify exactly one of --customer-id or --username.')
+    if customer_id:
+        if db.session.get(Customer, customer_id) is None:
+            raise click.ClickException(f'Customer {customer_id} not found.')
+        contact = dict(line_user_id=line_user_id, customer_id=customer_id)
+    else:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'User {username} not found.')
+        contact = dict(line_user_id=line_user_id, user_id=user.id)
+    if LineContact.query.filter_by(**contact).first() is None:
+        db.session.add(LineContact(**contact))
+        db.session.commit()
+    click.echo('Linked.')
+
+
+@line_cli.command('benchmark')
+@click.option('--messages', default=1000, show_default=True, help='จำนวนข้อความที่ต่างกัน')
+@click.option('--recipients', default=10, show_default=True, help='จำนวนผู้รับต่อข้อความ')
+@click.option('--workers', type=int, help='จำนวนคำขอที่ส่งพร้อมกัน (ค่าเริ่มต้น LINE_PUSH_WORKERS)')
+def benchmark_command(messages, recipients, workers):
+    """ส่ง multicast จำลองไปยัง LINE_API_ENDPOINT (ใช้กับ scripts/line_api_stub.py เท่านั้น)"""
+    batch = [(f'benchmark message {n}', [f'U{n:08x}{r:024x}' for r in range(recipients)]) for n in range(messages)]
+    started = time.monotonic()
+    sent = job_notifier.send_all(batch, workers=workers)
+    elapsed = time.monotonic() - started
+    stats = job_notifier.stats
+    click.echo(f'Sent {stats.requests} multicast request(s) ({sent} succeeded) for {messages} message(s) to '
+               f'{stats.recipients} recipient(s) in {elapsed:.2f}s ({stats.requests / elapsed:.1f} req/s), '
+               f'{stats.retries} retries, {stats.failures} failures.')
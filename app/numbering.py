@@ -0,0 +1,118 @@
+"""
+ตัวออกเลขที่เอกสาร (เลขที่บิลขาย, เลขที่ใบงานซ่อม) จากตาราง document_sequence
+
+แต่ละเลขจองจากฐานข้อมูลด้วย UPDATE ... SET next_value = next_value + 1 RETURNING next_value
+ใน transaction แยกสั้นๆ — การออกเลขจึงเป็น O(1) ไม่ต้องสุ่มหรือ query หาเลขที่ว่าง
+สอง worker ไม่มีทางได้เลขซ้ำกัน และเลขเรียงตามลำดับที่ออกจริงทั้งระบบ
+
+ถ้าตั้ง DOCUMENT_NUMBER_BLOCK_SIZE มากกว่า 1 (opt-in) แต่ละ worker จะจองเป็นช่วง (block) แล้วแจกจากหน่วยความจำ
+ลด round trip แต่เลขระหว่าง worker จะสลับกันภายในขนาด block และเลขที่จองไว้แต่ไม่ได้ใช้จะหายไปเมื่อ process หยุด
+
+ข้อควรรู้:
+- เลขที่ออกแล้วแต่ transaction ของเอกสารถูก rollback จะข้ามไป (การจองไม่ rollback ตาม)
+- การจอง block ทำใน connection แยก จึงควรเรียก next() ก่อนเขียนข้อมูลอื่นใน transaction
+  (SQLite ล็อกทั้งไฟล์ตอนเขียน connection ที่สองจะต้องรอ)
+"""
+
+import os
+import string
+import threading
+from datetime import datetime
+
+import pytz
+from sqlalchemy import update, insert, func
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import DocumentSequence, Sale, ServiceJob
+
+THAILAND_TZ = pytz.timezone('Asia/Bangkok')
+
+# ชนิดเอกสาร -> ชื่อค่า config ของรูปแบบเลขที่
+DOCUMENT_FORMAT_SETTINGS = {
+    'sale': 'SALE_NUMBER_FORMAT',
+    'job': 'JOB_NUMBER_FORMAT',
+}
+
+# ตัวแปรช่วงเวลาที่ใช้ในรูปแบบได้ — ถ้ารูปแบบมีตัวแปรใด ลำดับจะเริ่มใหม่ทุกครั้งที่ค่านั้นเปลี่ยน
+PERIOD_FIELDS = ('year', 'month')
+
+# คอลัมน์ที่เก็บเลขที่ของเอกสารแต่ละชนิด — เลขที่ที่จัดรูปแบบแล้วต้องไม่ยาวเกินคอลัมน์
+DOCUMENT_NUMBER_COLUMNS = {
+    'sale': Sale.__table__.c.sale_number,
+    'job': ServiceJob.__table__.c.job_number,
+}
+
+# ลำดับสูงสุดที่ใช้ตรวจความยาวของรูปแบบ (ร้อยล้านเอกสารต่อช่วงเวลา)
+MAX_CHECKED_SEQ = 10 ** 8 - 1
+
+
+class DocumentNumberAllocator:
+    def __init__(self):
+        self.formats = {}
+        self.block_size = 1
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pid = None
+
+    def init_app(self, app):
+        self.formats = {doc: app.config[setting] for doc, setting in DOCUMENT_FORMAT_SETTINGS.items()}
+        self.block_size = max(1, app.config['DOCUMENT_NUMBER_BLOCK_SIZE'])
+        for doc, fmt in self.formats.items():
+            fields = {name for _, name, _, _ in string.Formatter().parse(fmt) if name}
+            if 'seq' not in fields or fields - {'seq', *PERIOD_FIELDS}:
+                raise ValueError(f"Invalid number format for '{doc}': {fmt!r} (allowed fields: seq, year, month)")
+            max_length = DOCUMENT_NUMBER_COLUMNS[doc].type.length
+            longest = fmt.format(seq=MAX_CHECKED_SEQ, year=9999, month=12)
+            if max_length and len(longest) > max_length:
+                raise ValueError(f"Number format for '{doc}' is too long: {fmt!r} gives {longest!r} "
+                                 f"({len(longest)} characters, column allows {max_length})")
+
+    def _period_values(self, fmt, now):
+        fields = {name for _, name, _, _ in string.Formatter().parse(fmt) if name}
+        values = {'year': now.year, 'month': now.month}
+        return {name: values[name] for name in PERIOD_FIELDS if name in fields}
+
+    def _reserve_block(self, scope):
+        """จองช่วงเลข [start, end) ให้ process นี้ ใน transaction ของตัวเอง (ไม่ rollback ตาม transaction ของผู้เรียก)"""
+        table = DocumentSequence.__table__
+        reserve = (
+            update(table)
+            .where(table.c.name == scope)
+            .values(next_value=table.c.next_value + self.block_size, updated_at=func.now())
+            .returning(table.c.next_value)
+        )
+        with db.engine.begin() as conn:
+            end = conn.execute(reserve).scalar()
+            if end is None:
+                # ช่วงเวลาใหม่: สร้างแถวพร้อมจอง block แรก (ถ้า worker อื่นสร้างไปก่อน ให้จองต่อจากแถวนั้น)
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(table).values(name=scope, next_value=1 + self.block_size,
+                                                          updated_at=func.now()))
+                    end = 1 + self.block_size
+                except IntegrityError:
+                    end = conn.execute(reserve).scalar()
+        return [end - self.block_size, end]
+
+    def next(self, doc_type):
+        """ออกเลขที่เอกสารถัดไปตามรูปแบบของชนิดเอกสาร เช่น next('sale') -> 'SAL2025000042'"""
+        fmt = self.formats[doc_type]
+        period = self._period_values(fmt, datetime.now(THAILAND_TZ))
+        scope = ':'.join([doc_type] + [str(period[name]) for name in PERIOD_FIELDS if name in period])
+
+        with self._lock:
+            # block ที่จองไว้เป็นของ process ที่จอง — ถ้าถูก fork มา (เช่น gunicorn --preload) ต้องจองใหม่
+            if self._pid != os.getpid():
+                self._blocks.clear()
+                self._pid = os.getpid()
+            block = self._blocks.get(scope)
+            if block is None or block[0] >= block[1]:
+                block = self._blocks[scope] = self._reserve_block(scope)
+            seq = block[0]
+            block[0] += 1
+
+        return fmt.format(seq=seq, **period)
+
+
+document_numbers = DocumentNumberAllocator()
@@ -0,0 +1,68 @@
+"""
+Keyset (seek) pagination helpers สำหรับหน้ารายการที่เรียงตาม (created_at, id) จากใหม่ไปเก่า
+
+แทนที่จะใช้ OFFSET ซึ่งต้องสแกนแถวที่ข้ามไปทั้งหมด เราจำตำแหน่งแถวสุดท้ายของหน้าก่อนไว้ใน cursor
+แล้วให้ฐานข้อมูลกระโดดไปที่ตำแหน่งนั้นผ่าน index (created_at, id) ได้ทันที
+ต้นทุนของแต่ละหน้าจึงคงที่ ไม่ขึ้นกับจำนวนแถวทั้งหมดในตาราง
+"""
+
+import base64
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'has_more'])
+
+
+def encode_cursor(created_at, row_id):
+    """แปลง (created_at, id) ของแถวสุดท้ายให้เป็น token ที่ส่งผ่าน URL ได้"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """แปลง token กลับเป็น (created_at, id) หรือคืน None หาก token ว่างหรือไม่ถูกต้อง"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+        created_str, id_str = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_str), int(id_str)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def clamp_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """จำกัดขนาดหน้าให้อยู่ในช่วง 1..MAX_PAGE_SIZE"""
+    if not value or value < 1:
+        return default
+    return min(value, MAX_PAGE_SIZE)
+
+
+def keyset_paginate(query, created_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    ดึงหนึ่งหน้าจาก query โดยเรียงตาม (created_col DESC, id_col DESC)
+
+    cursor คือ token จาก encode_cursor() ของหน้าก่อนหน้า (หรือ None สำหรับหน้าแรก)
+    ดึงเกินมา 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่ โดยไม่ต้องใช้ count()
+    """
+    position = decode_cursor(cursor)
+    if position:
+        last_created, last_id = position
+        query = query.filter(or_(
+            created_col < last_created,
+            and_(created_col == last_created, id_col < last_id)
+        ))
+
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return KeysetPage(rows, next_cursor, has_more)
@@ -0,0 +1,270 @@
+"""
+ดัชนีค้นหาสินค้าในหน่วยความจำ (ต่อ process) สำหรับช่องค้นหาแบบ typeahead ของหน้า POS
+
+ลำดับผลลัพธ์:
+  0. SKU ตรงทุกตัวอักษร (ใช้เป็นบาร์โค้ดด้วย เพราะเครื่องสแกนพิมพ์ SKU เข้ามา)
+  1. SKU ขึ้นต้นด้วยคำค้น
+  2. ชื่อสินค้าขึ้นต้นด้วยคำค้น
+  3. คำค้นอยู่ส่วนใดก็ได้ของชื่อ/SKU
+
+ดัชนีเก็บเฉพาะ id, ชื่อ และ SKU — ราคาและสต็อกอ่านจากฐานข้อมูลด้วย primary key ทุกครั้ง จึงไม่มีวันเก่า
+
+การอัปเดต:
+- สินค้าที่เพิ่ม/แก้ไข/ลบผ่าน ORM ใน process นี้ถูกบันทึกเป็น overlay ทันทีหลัง commit (ไม่ต้องสร้างดัชนีใหม่)
+  แล้วเปลี่ยน version token 'product_index' ใน shared cache เพื่อแจ้ง worker อื่น
+- worker ที่เห็น token เปลี่ยน (หรือ overlay ใหญ่เกิน OVERLAY_LIMIT) จะสร้างดัชนีใหม่ใน background thread
+  ระหว่างนั้นยังตอบจากดัชนีเดิมได้ตามปกติ
+- การแก้ข้อมูลที่ไม่ผ่าน ORM (เช่น bulk import) ให้เรียก product_index.invalidate()
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import db, cache
+from .models import Product
+
+OVERLAY_LIMIT = 500
+VERSION_NAME = 'product_index'
+
+# ตัวคั่นระหว่างชื่อกับ SKU และระหว่างสินค้าใน haystack (normalize() ตัดออกจากข้อความเสมอ คำค้นจึงไม่ข้ามสินค้า)
+_FIELD_SEP = '\x1f'
+_DOC_SEP = '\x1e'
+
+
+def normalize(text):
+    text = ' '.join((text or '').casefold().split())
+    return text.replace(_FIELD_SEP, '').replace(_DOC_SEP, '')
+
+
+def _tier(q, name, sku):
+    """ระดับการจับคู่ของสินค้าหนึ่งรายการ (None หากไม่ตรง) — ใช้กับ overlay ที่ไม่ได้อยู่ในดัชนีหลัก"""
+    if sku == q:
+        return 0
+    if sku.startswith(q):
+        return 1
+    if name.startswith(q):
+        return 2
+    if q in name or q in sku:
+        return 3
+    return None
+
+
+class _Snapshot:
+    """
+    ดัชนีที่สร้างเสร็จแล้ว (อ่านอย่างเดียว) — เอกสารเรียงตามชื่อ
+
+    การค้นหาส่วนใดก็ได้ของข้อความใช้ str.find บน haystack ก้อนเดียว (ชื่อ + SKU ของทุกสินค้าต่อกันตามลำดับชื่อ)
+    แทน n-gram posting list: ค้นในโค้ด C ทั้งก้อน (100k สินค้า ≈ 4M ตัวอักษร ใช้ไม่กี่ ms แม้ไม่เจอเลย)
+    หยุดทันทีเมื่อได้ครบ limit และสร้างได้ในเสี้ยววินาที ส่วนการสร้าง trigram ของ 100k สินค้าใช้หลายวินาทีและหน่วยความจำมากกว่ามาก
+    """
+
+    def __init__(self, rows):
+        rows = sorted(((normalize(name), pid, normalize(sku)) for pid, name, sku in rows))
+        self.names = [r[0] for r in rows]
+        self.ids = array('q', (r[1] for r in rows))
+        self.skus = [r[2] for r in rows]
+
+        self.sku_exact = {}
+        for doc, sku in enumerate(self.skus):
+            if sku:
+                self.sku_exact.setdefault(sku, doc)
+        sku_keys = sorted((sku, doc) for doc, sku in enumerate(self.skus) if sku)
+        self.sku_key_strs = [k for k, _ in sku_keys]
+        self.sku_key_docs = array('q', (d for _, d in sku_keys))
+
+        docs = [name + _FIELD_SEP + sku for name, _, sku in rows]
+        self.offsets = array('q')
+        position = 0
+        for text in docs:
+            self.offsets.append(position)
+            position += len(text) + 1
+        self.haystack = _DOC_SEP.join(docs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefix(self, strs, docs, q, limit, accept):
+        found = []
+        i = bisect_left(strs, q)
+        while i < len(strs) and strs[i].startswith(q) and len(found) < limit:
+            doc = docs[i] if docs is not None else i
+            if accept(doc):
+                found.append(doc)
+            i += 1
+        return found
+
+    def _substring(self, q, limit, accept):
+        found = []
+        position = self.haystack.find(q)
+        while position != -1 and len(found) < limit:
+            doc = bisect_right(self.offsets, position) - 1
+            if accept(doc):
+                found.append(doc)
+            if doc + 1 >= len(self.offsets):
+                break
+            position = self.haystack.find(q, self.offsets[doc + 1])
+        return found
+
+    def search(self, q, limit, skip_ids):
+        """คืนรายการ doc แยกตามระดับการจับคู่ [tier0, tier1, tier2, tier3]"""
+        seen = set()
+
+        def accept(doc):
+            if doc in seen or self.ids[doc] in skip_ids:
+                return False
+            seen.add(doc)
+            return True
+
+        tiers = [[], [], [], []]
+        doc = self.sku_exact.get(q)
+        if doc is not None and accept(doc):
+            tiers[0].append(doc)
+        tiers[1] = self._prefix(self.sku_key_strs, self.sku_key_docs, q, limit, accept)
+        tiers[2] = self._prefix(self.names, None, q, limit, accept)
+        # สแกนบาร์โค้ดเจอ SKU ตรงแล้วไม่ต้องค้นส่วนใดก็ได้ของข้อความต่อ
+        if not tiers[0] and sum(map(len, tiers)) < limit:
+            tiers[3] = self._substring(q, limit, accept)
+        return tiers
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self.app = None
+        self._snapshot = None
+        self._version = None
+        # product id -> (ลำดับการเปลี่ยนแปลง, ชื่อ, sku) หรือ (ลำดับ, None, None) เมื่อถูกลบ
+        self._overlay = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def init_app(self, app):
+        self.app = app
+
+    def invalidate(self):
+        """ให้ทุก worker (รวมถึง process นี้) สร้างดัชนีใหม่ในการค้นหาครั้งถัดไป"""
+        cache.bump(VERSION_NAME)
+
+    # --- Building ---
+
+    def _build(self):
+        version = cache.version(VERSION_NAME)
+        with self._lock:
+            start_seq = self._seq
+        rows = db.session.query(Product.id, Product.name, Product.sku).all()
+        snapshot = _Snapshot(rows)
+        with self._lock:
+            self._snapshot = snapshot
+            self._version = version
+            # เก็บเฉพาะการเปลี่ยนแปลงที่เกิดหลังจากเริ่มอ่านข้อมูล (อาจยังไม่อยู่ในดัชนีใหม่)
+            self._overlay = {pid: entry for pid, entry in self._overlay.items() if entry[0] > start_seq}
+            self._rebuilding = False
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                with self.app.app_context():
+                    self._build()
+            except Exception:
+                self.app.logger.exception('Failed to rebuild product search index')
+                with self._lock:
+                    self._rebuilding = False
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=run, name='product-index-rebuild', daemon=True).start()
+
+    def _ensure_fresh(self):
+        if self._snapshot is None:
+            self._build()
+        elif cache.version(VERSION_NAME) != self._version or len(self._overlay) > OVERLAY_LIMIT:
+            self._rebuild_in_background()
+
+    # --- Delta updates ---
+
+    def apply_changes(self, changes):
+        """บันทึกสินค้าที่เปลี่ยนหลัง commit ลง overlay แล้วแจ้ง worker อื่นผ่าน version token"""
+        if not changes:
+            return
+        with self._lock:
+            overlay = dict(self._overlay)
+            for pid, values in changes.items():
+                self._seq += 1
+                name, sku = values if values else (None, None)
+                overlay[pid] = (self._seq, name, sku)
+            self._overlay = overlay
+        if self.app is None:
+            return
+        previous = cache.version(VERSION_NAME)
+        token = cache.bump(VERSION_NAME)
+        with self._lock:
+            # ถ้ามี worker อื่นเปลี่ยนข้อมูลก่อนหน้านี้ ดัชนีของเรายังเก่าอยู่ ให้สร้างใหม่ตามปกติ
+            if previous == self._version:
+                self._version = token
+
+    # --- Searching ---
+
+    def search(self, query, limit=10):
+        """คืนรายการ product id ที่ตรงกับคำค้น เรียงตามความเกี่ยวข้อง"""
+        q = normalize(query)
+        if not q:
+            return []
+        self._ensure_fresh()
+        snapshot, overlay = self._snapshot, self._overlay
+
+        tiers = snapshot.search(q, limit, overlay)
+        results = [[snapshot.ids[doc] for doc in tier] for tier in tiers]
+        for pid, (_, name, sku) in sorted(overlay.items(), key=lambda item: normalize(item[1][1])):
+            if name is None:
+                continue
+            tier = _tier(q, normalize(name), normalize(sku))
+            if tier is not None:
+                results[tier].append(pid)
+
+        ids = []
+        for tier in results:
+            ids.extend(tier)
+        return ids[:limit]
+
+
+product_index = ProductSearchIndex()
+
+
+# --- ติดตามการเปลี่ยนแปลงของสินค้าผ่าน ORM ---
+
+def _record_change(target, values):
+    inspect(target).session.info.setdefault('product_index_changes', {})[target.id] = values
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    _record_change(target, (target.name, target.sku))
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    # การตัดสต็อก/แก้ราคาไม่กระทบดัชนี สนใจเฉพาะชื่อและ SKU
+    state = inspect(target)
+    if state.attrs.name.history.has_changes() or state.attrs.sku.history.has_changes():
+        _record_change(target, (target.name, target.sku))
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    _record_change(target, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_product_changes(session):
+    product_index.apply_changes(session.info.pop('product_index_changes', None))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_product_changes(session):
+    session.info.pop('product_index_changes', None)
@@ -0,0 +1,132 @@
+"""
+QR Code ของงานซ่อม: render ครั้งเดียวแล้วเก็บ PNG ไว้ใน cache บนดิสก์ (ขนาดจำกัดด้วย QR_CACHE_MAX_BYTES)
+
+key ของไฟล์คือ hash ของข้อความใน QR รวมกับขนาด/เวอร์ชันการ render จึงไม่ต้อง invalidate
+และใช้ key เดียวกันเป็น ETag / พารามิเตอร์ v ของ URL รูปได้ (ให้เบราว์เซอร์เก็บรูปไว้ได้นานแบบ immutable)
+
+แผ่นฉลาก (label sheet) render QR ที่ยังไม่มีใน cache ใน process pool (ใช้ร่วมกันทุก request ของ process)
+แล้วจัดวางลง PDF ขนาด A4
+"""
+
+import hashlib
+import json
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import qrcode
+from flask import url_for
+from fpdf import FPDF
+
+from .cache import DiskCache
+from .utils import add_receipt_font, discard_process_pool, shared_process_pool
+
+# เปลี่ยนค่านี้เมื่อแก้ขนาดหรือหน้าตาของ QR เพื่อให้ไฟล์เก่าใน cache ไม่ถูกใช้อีก
+QR_RENDER_VERSION = 1
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+# render ใน process pool เฉพาะเมื่อมี QR ที่ยังไม่อยู่ใน cache อย่างน้อยเท่านี้ (น้อยกว่านี้ทำเองเร็วกว่า)
+POOL_MIN_MISSING = 8
+
+# ฉลากบน A4: 3 คอลัมน์ x 7 แถว (มม.)
+LABEL_COLUMNS = 3
+LABEL_ROWS = 7
+LABEL_WIDTH = 70
+LABEL_HEIGHT = 42.4
+LABEL_QR_SIZE = 34
+
+qr_cache = DiskCache('QR_CACHE', '.png')
+
+
+def job_qr_data(job):
+    """ข้อความใน QR ของงาน — ตอนนี้ชี้ไปหน้าข้อมูลลูกค้า (ภายหลังจะเป็นหน้า LIFF สำหรับผูกบัญชี LINE)"""
+    return url_for('customer.edit_customer', id=job.customer_id, _external=True)
+
+
+def qr_key(data):
+    raw = json.dumps([data, QR_BOX_SIZE, QR_BORDER, QR_RENDER_VERSION], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def render_qr_png(data):
+    """render QR เป็น PNG (ไม่ใช้ app context จึงเรียกใน process pool ได้)"""
+    qr = qrcode.QRCode(box_size=QR_BOX_SIZE, border=QR_BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffered = BytesIO()
+    qr.make_image(fill_color='black', back_color='white').save(buffered, format='PNG')
+    return buffered.getvalue()
+
+
+def get_qr_png(data):
+    """คืน (key, path, png) — path เมื่อมีใน cache แล้ว หรือ png ที่เพิ่ง render และบันทึกลง cache"""
+    key = qr_key(data)
+    path, png = qr_cache.get_or_render(key, lambda: render_qr_png(data))
+    return key, path, png
+
+
+def _ensure_cached(datas, workers):
+    """ทำให้ QR ของทุกข้อความอยู่ใน cache คืน {key: path หรือ png}"""
+    images = {}
+    missing = {}
+    for data in datas:
+        key = qr_key(data)
+        if key in images or key in missing:
+            continue
+        path = qr_cache.lookup(key)
+        if path:
+            images[key] = path
+        else:
+            missing[key] = data
+
+    if len(missing) >= POOL_MIN_MISSING and workers > 1:
+        pool = shared_process_pool('qr_codes', workers)
+        try:
+            for key, png in zip(list(missing), pool.map(render_qr_png, list(missing.values()), chunksize=16)):
+                qr_cache.store(key, png)
+                images[key] = png
+                del missing[key]
+        except BrokenProcessPool:
+            # process ลูกตาย (เช่น OOM) — ทิ้ง pool ให้ครั้งถัดไปสร้างใหม่ แล้ว render ส่วนที่เหลือเอง
+            discard_process_pool('qr_codes', pool)
+
+    for key, data in missing.items():
+        png = render_qr_png(data)
+        qr_cache.store(key, png)
+        images[key] = png
+    return images
+
+
+def render_label_sheet(labels, workers):
+    """
+    labels: [(ข้อความใน QR, บรรทัดที่ 1, บรรทัดที่ 2), ...] → PDF (bytes) ของแผ่นฉลาก A4
+    """
+    images = _ensure_cached([data for data, _, _ in labels], workers)
+
+    pdf = FPDF(format='A4')
+    pdf.set_auto_page_break(False)
+    pdf.set_margins(0, 0)
+    font = add_receipt_font(pdf) or 'helvetica'
+    pdf.set_font(font, '', 10)
+
+    left = (pdf.w - LABEL_COLUMNS * LABEL_WIDTH) / 2
+    top = (pdf.h - LABEL_ROWS * LABEL_HEIGHT) / 2
+    per_page = LABEL_COLUMNS * LABEL_ROWS
+    for index, (data, first_line, second_line) in enumerate(labels):
+        if index % per_page == 0:
+            pdf.add_page()
+        slot = index % per_page
+        x = left + (slot % LABEL_COLUMNS) * LABEL_WIDTH
+        y = top + (slot // LABEL_COLUMNS) * LABEL_HEIGHT
+        image = images[qr_key(data)]
+        pdf.image(image if isinstance(image, str) else BytesIO(image),
+                  x=x + 2, y=y + (LABEL_HEIGHT - LABEL_QR_SIZE) / 2, w=LABEL_QR_SIZE, h=LABEL_QR_SIZE)
+        text_x = x + LABEL_QR_SIZE + 3
+        text_w = LABEL_WIDTH - LABEL_QR_SIZE - 5
+        pdf.set_xy(text_x, y + 12)
+        pdf.set_font(font, '', 11)
+        pdf.multi_cell(text_w, 5, first_line)
+        pdf.set_x(text_x)
+        pdf.set_font(font, '', 9)
+        pdf.multi_cell(text_w, 4.5, second_line or '')
+    return bytes(pdf.output())
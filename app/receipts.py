@@ -0,0 +1,220 @@
+"""
+Cache ไฟล์ PDF ใบเสร็จบนดิสก์ แบบ content-addressed
+
+ชื่อไฟล์คือ hash ของข้อมูลทุกอย่างที่ปรากฏบนใบเสร็จ (เลขที่บิล วันที่ ลูกค้า พนักงาน รายการสินค้า ยอดรวม)
+รวมกับเวอร์ชันของแม่แบบ ดังนั้นไฟล์หนึ่งไฟล์จะไม่มีวันเปลี่ยนเนื้อหา — ถ้าข้อมูลเปลี่ยน key ก็เปลี่ยนตาม
+ไม่ต้องมีขั้นตอน invalidate และใช้ key เดียวกันเป็น ETag ได้เลย
+
+ขนาดรวมของ cache ถูกจำกัดด้วย RECEIPT_CACHE_MAX_BYTES โดยลบไฟล์ที่ถูกใช้ล่าสุดนานที่สุดออกก่อน (LRU ตาม mtime
+ซึ่งเราแตะทุกครั้งที่มีการอ่าน)
+"""
+
+import hashlib
+import json
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+
+from .cache import DiskCache
+from .models import Sale, SaleItem
+from .utils import (generate_receipt_pdf, get_receipt_font_path, init_receipt_font,
+                    shared_process_pool, discard_process_pool)
+
+# เปลี่ยนค่านี้เมื่อแก้หน้าตาใบเสร็จ เพื่อให้ไฟล์เก่าใน cache ไม่ถูกใช้อีก
+RECEIPT_TEMPLATE_VERSION = 2
+
+# ใบเสร็จที่ไม่มีใน cache กี่ใบแรกของการ export ที่ render เองใน thread ของ request
+# (ส่วนใหญ่ cache ครบหรือขาดไม่กี่ใบ จึงไม่ต้องรอ process pool เริ่มทำงาน)
+EXPORT_INLINE_RENDERS = 8
+
+
+def load_sale_items(sale):
+    """ดึงรายการสินค้าของบิลพร้อมข้อมูลสินค้าใน query เดียว"""
+    return SaleItem.query.options(joinedload(SaleItem.product)) \
+        .filter(SaleItem.sale_id == sale.id) \
+        .order_by(SaleItem.id).all()
+
+
+def receipt_snapshot(sale, items):
+    """
+    ข้อมูลทั้งหมดที่ปรากฏบนใบเสร็จ ในรูปแบบ dict ธรรมดา
+    ใช้ทั้งคำนวณ fingerprint และส่งไป render ใน process อื่น (pickle ได้ ไม่ผูกกับ session)
+    """
+    return {
+        'number': sale.sale_number,
+        'created_at': sale.created_at.isoformat() if sale.created_at else None,
+        'customer': sale.customer.name if sale.customer else None,
+        'salesperson': sale.salesperson.full_name,
+        'total': sale.total_amount,
+        'items': [[item.product.name, item.quantity, item.price_per_unit] for item in items],
+    }
+
+
+def snapshot_fingerprint(snapshot):
+    """hash ของเนื้อหาใบเสร็จ ใช้เป็นทั้งชื่อไฟล์ใน cache และ ETag"""
+    payload = dict(snapshot, v=RECEIPT_TEMPLATE_VERSION)
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def receipt_fingerprint(sale, items):
+    return snapshot_fingerprint(receipt_snapshot(sale, items))
+
+
+def render_receipt_snapshot(snapshot):
+    """render PDF จาก snapshot โดยไม่ต้องใช้ฐานข้อมูลหรือ app context (ใช้ใน process pool)"""
+    sale = SimpleNamespace(
+        sale_number=snapshot['number'],
+        created_at=datetime.fromisoformat(snapshot['created_at']),
+        customer=SimpleNamespace(name=snapshot['customer']) if snapshot['customer'] else None,
+        salesperson=SimpleNamespace(full_name=snapshot['salesperson']),
+        total_amount=snapshot['total'],
+    )
+    items = [
+        SimpleNamespace(product=SimpleNamespace(name=name), quantity=quantity, price_per_unit=price)
+        for name, quantity, price in snapshot['items']
+    ]
+    return generate_receipt_pdf(sale, items)
+
+
+receipt_cache = DiskCache('RECEIPT_CACHE', '.pdf')
+
+
+# --- Bulk export (ZIP) ---
+
+EXPORT_BATCH_SIZE = 100
+
+
+class _ZipSink:
+    """ปลายทางของ ZipFile ที่ไม่ seek ได้ เก็บ bytes ที่เขียนไว้ชั่วคราวจนกว่าจะถูก drain ออกไปยัง response"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_sale_snapshots(period_filter):
+    """
+    ไล่อ่านบิลในช่วงเวลาเป็นชุดๆ (keyset ตาม created_at, id) พร้อมดึงรายการสินค้าของทั้งชุดใน query เดียว
+    หน่วยความจำจึงขึ้นกับขนาดชุด ไม่ใช่จำนวนบิลทั้งหมด
+    """
+    last = None
+    while True:
+        query = Sale.query.options(joinedload(Sale.customer), joinedload(Sale.salesperson)).filter(*period_filter)
+        if last:
+            query = query.filter(or_(Sale.created_at > last[0], and_(Sale.created_at == last[0], Sale.id > last[1])))
+        sales = query.order_by(Sale.created_at, Sale.id).limit(EXPORT_BATCH_SIZE).all()
+        if not sales:
+            return
+
+        items_by_sale = {}
+        items = SaleItem.query.options(joinedload(SaleItem.product)) \
+            .filter(SaleItem.sale_id.in_([sale.id for sale in sales])) \
+            .order_by(SaleItem.id)
+        for item in items:
+            items_by_sale.setdefault(item.sale_id, []).append(item)
+
+        for sale in sales:
+            yield receipt_snapshot(sale, items_by_sale.get(sale.id, []))
+
+        last = (sales[-1].created_at, sales[-1].id)
+
+
+def _render_for_export(snapshot):
+    return snapshot['number'], render_receipt_snapshot(snapshot)
+
+
+def iter_receipts_zip(period_filter, workers):
+    """
+    Generator ที่ส่ง ZIP ของใบเสร็จทุกใบในช่วงเวลาออกไปทีละส่วน
+
+    - ใบที่มีใน cache แล้วอ่านจากดิสก์ได้เลย ใบที่ยังไม่มี EXPORT_INLINE_RENDERS ใบแรก render เอง
+      ที่เหลือส่งไป render ใน process pool ที่ใช้ร่วมกันทุก request ของ process (shared_process_pool)
+    - ใส่ไฟล์ลง ZIP ตามลำดับที่ render เสร็จ และจำกัดงานที่ค้างอยู่ไม่เกิน workers * 2
+      เพื่อให้ใช้หน่วยความจำคงที่ไม่ว่าช่วงเวลาจะยาวแค่ไหน
+    """
+    sink = _ZipSink()
+    max_pending = workers * 2
+    pending = {}
+    errors = []
+
+    # PDF ถูกบีบอัดอยู่แล้ว จึงเก็บแบบ ZIP_STORED
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+    inline_renders = 0
+
+    def submit(snapshot):
+        pool = shared_process_pool('receipts', workers, initializer=init_receipt_font,
+                                   initargs=(get_receipt_font_path(),))
+        try:
+            return pool.submit(_render_for_export, snapshot)
+        except BrokenProcessPool:
+            discard_process_pool('receipts', pool)
+            return submit(snapshot)
+
+    def collect(done):
+        for future in done:
+            key = pending.pop(future)
+            try:
+                number, data = future.result()
+            except Exception as e:
+                errors.append(f"{key}: {e}")
+                continue
+            receipt_cache.store(key, data)
+            archive.writestr(f"receipt_{number}.pdf", data)
+
+    try:
+        for snapshot in _iter_sale_snapshots(period_filter):
+            key = snapshot_fingerprint(snapshot)
+            path = receipt_cache.lookup(key)
+            if path:
+                with open(path, 'rb') as f:
+                    archive.writestr(f"receipt_{snapshot['number']}.pdf", f.read())
+            elif inline_renders < EXPORT_INLINE_RENDERS or workers < 1:
+                inline_renders += 1
+                data = render_receipt_snapshot(snapshot)
+                receipt_cache.store(key, data)
+                archive.writestr(f"receipt_{snapshot['number']}.pdf", data)
+            else:
+                pending[submit(snapshot)] = key
+
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+            yield sink.drain()
+
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors))
+        archive.close()
+        yield sink.drain()
+    finally:
+        # pool ใช้ร่วมกับ request อื่น — ยกเลิกเฉพาะงานของ export นี้ที่ยังไม่เริ่ม
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,546 @@
+"""
+ตารางสรุป (rollup) สำหรับรายงาน
+
+tech_monthly_stat — จำนวน JobUpdate ต่อช่างต่อเดือน (ตามเวลาไทย)
+- ทุกครั้งที่ session flush JobUpdate ใหม่ (หรือลบ) จะปรับจำนวนของเดือนนั้นแบบ atomic ใน transaction เดียวกัน
+- ensure_tech_rollup() (งานของ scheduler ทุก TECH_ROLLUP_INTERVAL_MINUTES นาที และ `flask rollups tech`)
+  ดูแลช่วงเวลาผ่านตาราง rollup_period — หน้ารายงานอ่านอย่างเดียว ไม่นับหรือ commit เอง:
+    * เดือนที่จบไปแล้วถูกนับใหม่จาก job_update ครั้งเดียวด้วยช่วงเวลาแบบ half-open แล้วปิด (closed) —
+      เดือนที่ปิดแล้วจะไม่ถูกคำนวณซ้ำอีก
+    * เดือนปัจจุบันถูกนับครั้งแรกครั้งเดียว (seed) จากนั้นอาศัยการบวกเพิ่มจาก event
+- รายงานหลายเดือนจึงอ่านจาก rollup ด้วย query เดียว ต้นทุนเท่ากับการดูเดือนเดียว
+
+sales_daily_product / sales_daily_salesperson / sales_daily_payment — ยอดขายรายวันตามเวลาไทย
+- งานของ scheduler (refresh_sales_rollup) เก็บ high-water mark (sale.id ล่าสุด) ใน rollup_watermark
+  แล้วประมวลผลเฉพาะวันที่มีบิลใหม่กว่ารอบก่อน: ลบแถวของวันนั้นแล้วนับใหม่ทั้งวันด้วยช่วงเวลาแบบ half-open
+- การแก้ไขย้อนหลัง (เปลี่ยนสถานะการชำระ/ยอด/รายการสินค้า หรือลบบิลเก่า) ผ่าน ORM จะเปิดวันนั้นใหม่
+  ใน rollup_period (closed=False) ภายใน transaction เดียวกัน แล้วรอบถัดไปจะนับวันนั้นใหม่
+- รายงานทั้งปีจึงอ่านเพียงแถวสรุปรายวัน ไม่ต้อง aggregate sale_item ทั้งหมด
+"""
+
+import logging
+from datetime import datetime, date, timedelta, timezone
+
+import click
+from flask.cli import AppGroup
+from flask import current_app
+from sqlalchemy import event, func, update, insert, delete, select, or_, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import db, cache
+from .counters import old_value
+from .models import (JobUpdate, TechMonthlyStat, RollupPeriod, RollupWatermark, User, Product,
+                     Sale, SaleItem, SalesDailyProduct, SalesDailySalesperson, SalesDailyPayment)
+from .utils import THAILAND_TZ, thai_day_start_utc
+
+logger = logging.getLogger(__name__)
+
+TECH_MONTHLY = 'tech_monthly'
+SALES_DAILY = 'sales_daily'
+
+# คอลัมน์ที่มีผลต่อยอดสรุป — แก้คอลัมน์อื่น (เช่น customer_id) ไม่ต้องนับวันนั้นใหม่
+_SALE_ROLLUP_ATTRS = ('created_at', 'total_amount', 'payment_status', 'salesperson_id')
+_SALE_ITEM_ROLLUP_ATTRS = ('product_id', 'quantity', 'price_per_unit', 'sale_id')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+
+
+def add_months(day, count):
+    index = day.year * 12 + day.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month():
+    return month_start(datetime.now(THAILAND_TZ).date())
+
+
+def month_of(timestamp):
+    """เดือน (วันที่ 1 ตามเวลาไทย) ของ timestamp ที่เก็บเป็น UTC"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return month_start(day_of(timestamp))
+
+
+def day_of(timestamp):
+    """วันที่ตามเวลาไทยของ timestamp ที่เก็บเป็น UTC"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(THAILAND_TZ).date()
+
+
+def month_range_utc(period):
+    """ช่วง [เริ่ม, สิ้นสุด) ของเดือนตามเวลาไทยในรูป UTC — ใช้กับ index บน created_at ได้"""
+    return thai_day_start_utc(period), thai_day_start_utc(next_month(period))
+
+
+# --- Incremental maintenance ---
+
+def _apply_tech_deltas(connection, deltas):
+    table = TechMonthlyStat.__table__
+    for (period, author_id), delta in deltas.items():
+        result = connection.execute(
+            update(table)
+            .where(table.c.period == period, table.c.author_id == author_id)
+            .values(update_count=table.c.update_count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(period=period, author_id=author_id, update_count=delta))
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_tech_rollup_before_flush(session, flush_context, instances):
+    deltas = {}
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            if isinstance(obj, JobUpdate):
+                author_id = obj.author_id if obj.author_id is not None else getattr(obj.author, 'id', None)
+                if author_id is None:
+                    continue
+                key = (month_of(obj.created_at or datetime.now(timezone.utc)), author_id)
+                deltas[key] = deltas.get(key, 0) + sign
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        _apply_tech_deltas(session.connection(), deltas)
+
+
+# --- Seeding / closing periods ---
+
+def count_updates_by_author(period):
+    """นับ JobUpdate ต่อช่างของเดือนจากตารางต้นทาง (ช่วงเวลาแบบ half-open บน index (author_id, created_at))"""
+    start, end = month_range_utc(period)
+    return db.session.query(JobUpdate.author_id, func.count(JobUpdate.id)) \
+        .filter(JobUpdate.created_at >= start, JobUpdate.created_at < end) \
+        .group_by(JobUpdate.author_id).all()
+
+
+def recount_tech_month(period, closed):
+    """นับเดือนใหม่ทั้งเดือนแล้วแทนที่แถวใน rollup และบันทึกสถานะใน rollup_period (ไม่ commit)"""
+    table = TechMonthlyStat.__table__
+    connection = db.session.connection()
+    connection.execute(delete(table).where(table.c.period == period))
+    rows = [{'period': period, 'author_id': author_id, 'update_count': count}
+            for author_id, count in count_updates_by_author(period)]
+    if rows:
+        connection.execute(insert(table), rows)
+
+    marker = db.session.get(RollupPeriod, (TECH_MONTHLY, period))
+    if marker is None:
+        db.session.add(RollupPeriod(name=TECH_MONTHLY, period=period, closed=closed))
+    else:
+        marker.closed = closed
+        marker.refreshed_at = datetime.now(timezone.utc)
+
+
+def ensure_tech_rollup():
+    """
+    ปิดเดือนที่จบแล้วแต่ยังไม่ปิด และ seed เดือนปัจจุบันหากยังไม่เคย — ปกติเป็นแค่ SELECT เล็กๆ หนึ่งครั้ง
+    คืนจำนวนเดือนที่ถูกนับใหม่ หรือ None หาก process อื่นกำลังทำงานนี้อยู่
+    """
+    with cache.lock('tech_rollup') as acquired:
+        if not acquired:
+            return None
+
+        today_month = current_month()
+        markers = {p.period: p.closed for p in RollupPeriod.query.filter_by(name=TECH_MONTHLY)}
+        if markers.get(today_month) is False and all(closed for period, closed in markers.items() if period < today_month):
+            return 0
+
+        if markers:
+            start = min(markers)
+        else:
+            first = db.session.query(func.min(JobUpdate.created_at)).scalar()
+            start = min(month_of(first), today_month) if first else today_month
+
+        recounted = 0
+        period = start
+        try:
+            while period <= today_month:
+                closed = period < today_month
+                if period not in markers or (closed and not markers[period]):
+                    recount_tech_month(period, closed)
+                    recounted += 1
+                period = next_month(period)
+            db.session.commit()
+        except IntegrityError:
+            # เครื่องอื่น (ที่ไม่ได้ใช้ CACHE_DIR ร่วมกัน) นับช่วงเดียวกันเสร็จก่อน — ใช้ผลของเครื่องนั้น
+            db.session.rollback()
+            return 0
+        return recounted
+
+
+# --- Reading ---
+
+def tech_month_report(period):
+    """[(User, จำนวน)] ของเดือน เรียงจากมากไปน้อย"""
+    return db.session.query(User, TechMonthlyStat.update_count) \
+        .join(TechMonthlyStat, TechMonthlyStat.author_id == User.id) \
+        .filter(TechMonthlyStat.period == period, TechMonthlyStat.update_count > 0) \
+        .order_by(TechMonthlyStat.update_count.desc(), User.first_name).all()
+
+
+def tech_trend(first_period, last_period):
+    """
+    จำนวนต่อช่างต่อเดือนในช่วง [first_period, last_period] ด้วย query เดียวบน rollup
+    คืน (รายการเดือน, [(User, [จำนวนของแต่ละเดือน], รวม)])
+    """
+    periods = []
+    period = first_period
+    while period <= last_period:
+        periods.append(period)
+        period = next_month(period)
+
+    rows = db.session.query(User, TechMonthlyStat.period, TechMonthlyStat.update_count) \
+        .join(TechMonthlyStat, TechMonthlyStat.author_id == User.id) \
+        .filter(TechMonthlyStat.period >= first_period, TechMonthlyStat.period <= last_period) \
+        .all()
+
+    by_user = {}
+    for user, period, count in rows:
+        counts = by_user.setdefault(user.id, (user, dict()))[1]
+        counts[period] = count
+    trend = [
+        (user, [counts.get(p, 0) for p in periods], sum(counts.values()))
+        for user, counts in by_user.values()
+    ]
+    trend.sort(key=lambda row: (-row[2], row[0].first_name))
+    return periods, trend
+
+
+# --- Sales daily rollup: late corrections ---
+
+def _insert_ignore(connection, table, rows):
+    """INSERT แถวที่ยังไม่มี (ข้ามแถวที่ชน primary key)"""
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table).values(rows)
+        connection.execute(stmt.on_conflict_do_nothing())
+        return
+    for row in rows:
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(**row))
+        except IntegrityError:
+            pass
+
+
+def reopen_periods(connection, name, periods):
+    """ทำเครื่องหมายให้ช่วงเวลาถูกนับใหม่ในรอบถัดไป (ใน transaction ของผู้เรียก)"""
+    table = RollupPeriod.__table__
+    now = datetime.now(timezone.utc)
+    missing = []
+    for period in sorted(periods):
+        result = connection.execute(
+            update(table)
+            .where(table.c.name == name, table.c.period == period)
+            .values(closed=False, refreshed_at=now)
+        )
+        if result.rowcount == 0:
+            missing.append({'name': name, 'period': period, 'closed': False, 'refreshed_at': now})
+    if missing:
+        _insert_ignore(connection, table, missing)
+
+
+def _sale_days(sale, state=None):
+    days = set()
+    if sale.created_at is not None:
+        days.add(day_of(sale.created_at))
+    if state is not None:
+        old = old_value(state, 'created_at', None)
+        if old is not None:
+            days.add(day_of(old))
+    return days
+
+
+def _corrected_sale_days(session):
+    """วันที่ของบิลเก่าที่ถูกแก้ไขหรือลบใน flush นี้ (บิลใหม่ใช้ high-water mark แทน)"""
+    days = set()
+    for obj in session.deleted:
+        if isinstance(obj, Sale):
+            days |= _sale_days(obj, inspect(obj))
+        elif isinstance(obj, SaleItem) and obj.sale_id is not None:
+            sale = session.get(Sale, obj.sale_id)
+            if sale is not None:
+                days |= _sale_days(sale)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        if isinstance(obj, Sale):
+            if any(state.attrs[attr].history.has_changes() for attr in _SALE_ROLLUP_ATTRS):
+                days |= _sale_days(obj, state)
+        elif isinstance(obj, SaleItem):
+            if any(state.attrs[attr].history.has_changes() for attr in _SALE_ITEM_ROLLUP_ATTRS):
+                for sale_id in {obj.sale_id, old_value(state, 'sale_id', None)} - {None}:
+                    sale = session.get(Sale, sale_id)
+                    if sale is not None:
+                        days |= _sale_days(sale)
+
+    for obj in session.new:
+        # รายการที่เพิ่มเข้าบิลเดิม (บิลที่เปิดพร้อมกันใน flush นี้จะถูกนับผ่าน high-water mark อยู่แล้ว)
+        if isinstance(obj, SaleItem):
+            sale = obj.sale if obj.sale is not None else (session.get(Sale, obj.sale_id) if obj.sale_id else None)
+            if sale is not None and sale not in session.new and sale.id not in session.info.get('new_sale_ids', ()):
+                days |= _sale_days(sale)
+    return days
+
+
+@event.listens_for(Session, 'before_flush')
+def _reopen_sales_days_before_flush(session, flush_context, instances):
+    with session.no_autoflush:
+        days = _corrected_sale_days(session)
+    if days:
+        reopen_periods(session.connection(), SALES_DAILY, days)
+
+
+@event.listens_for(Session, 'after_flush')
+def _remember_new_sales(session, flush_context):
+    # บิลที่เพิ่งสร้างใน transaction นี้ยังไม่ผ่าน high-water mark — เพิ่มรายการภายหลังไม่ต้องเปิดวันใหม่
+    new_ids = [obj.id for obj in session.new if isinstance(obj, Sale)]
+    if new_ids:
+        session.info.setdefault('new_sale_ids', set()).update(new_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_new_sales(session):
+    session.info.pop('new_sale_ids', None)
+
+
+# --- Sales daily rollup: refreshing ---
+
+def _sales_day_rows(day):
+    """ยอดของวันจาก sale/sale_item ด้วยช่วงเวลาแบบ half-open (ใช้ index (created_at, id) ของ sale)"""
+    start, end = thai_day_start_utc(day), thai_day_start_utc(day + timedelta(days=1))
+    in_day = (Sale.created_at >= start, Sale.created_at < end)
+
+    products = db.session.query(
+        SaleItem.product_id,
+        func.count(func.distinct(SaleItem.sale_id)),
+        func.sum(SaleItem.quantity),
+        func.sum(SaleItem.quantity * SaleItem.price_per_unit),
+    ).join(Sale, Sale.id == SaleItem.sale_id).filter(*in_day).group_by(SaleItem.product_id).all()
+
+    salespeople = db.session.query(
+        Sale.salesperson_id, func.count(Sale.id), func.sum(Sale.total_amount)
+    ).filter(*in_day).group_by(Sale.salesperson_id).all()
+
+    payments = db.session.query(
+        Sale.payment_status, func.count(Sale.id), func.sum(Sale.total_amount)
+    ).filter(*in_day).group_by(Sale.payment_status).all()
+
+    return (
+        [{'day': day, 'product_id': product_id, 'sale_count': count, 'quantity': quantity or 0, 'amount': amount or 0.0}
+         for product_id, count, quantity, amount in products],
+        [{'day': day, 'salesperson_id': salesperson_id, 'sale_count': count, 'amount': amount or 0.0}
+         for salesperson_id, count, amount in salespeople],
+        [{'day': day, 'payment_status': status, 'sale_count': count, 'amount': amount or 0.0}
+         for status, count, amount in payments if status is not None],
+    )
+
+
+def recount_sales_day(day, seen_refreshed_at=None):
+    """
+    แทนที่ยอดสรุปของวันด้วยการนับใหม่ แล้วปิดวันนั้น (ไม่ commit)
+    หากวันถูกเปิดใหม่ระหว่างนับ (refreshed_at ไม่ตรงกับที่อ่านไว้) จะคงสถานะเปิดไว้ให้รอบถัดไป
+    """
+    connection = db.session.connection()
+    for model, rows in zip((SalesDailyProduct, SalesDailySalesperson, SalesDailyPayment), _sales_day_rows(day)):
+        table = model.__table__
+        connection.execute(delete(table).where(table.c.day == day))
+        if rows:
+            connection.execute(insert(table), rows)
+
+    table = RollupPeriod.__table__
+    if seen_refreshed_at is None:
+        _insert_ignore(connection, table, [{'name': SALES_DAILY, 'period': day, 'closed': True,
+                                            'refreshed_at': datetime.now(timezone.utc)}])
+    else:
+        connection.execute(
+            update(table)
+            .where(table.c.name == SALES_DAILY, table.c.period == day, table.c.refreshed_at == seen_refreshed_at)
+            .values(closed=True, refreshed_at=datetime.now(timezone.utc))
+        )
+
+
+def _read_watermark(name):
+    table = RollupWatermark.__table__
+    return db.session.execute(select(table.c.value).where(table.c.name == name)).scalar()
+
+
+def _write_watermark(name, value):
+    table = RollupWatermark.__table__
+    connection = db.session.connection()
+    result = connection.execute(update(table).where(table.c.name == name)
+                                .values(value=value, updated_at=datetime.now(timezone.utc)))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(name=name, value=value, updated_at=datetime.now(timezone.utc)))
+
+
+def refresh_sales_rollup():
+    """
+    ประมวลผลบิลที่ใหม่กว่า high-water mark และวันที่ถูกเปิดใหม่จากการแก้ไขย้อนหลัง
+    คืนจำนวนวันที่ถูกนับใหม่ หรือ None หาก process อื่นกำลังทำงานนี้อยู่
+    """
+    with cache.lock('sales_rollup') as acquired:
+        if not acquired:
+            return None
+
+        watermark = _read_watermark(SALES_DAILY) or 0
+        high = db.session.query(func.max(Sale.id)).scalar() or 0
+        overlap_since = datetime.now(timezone.utc) - timedelta(minutes=current_app.config['SALES_ROLLUP_OVERLAP_MINUTES'])
+
+        days = {}
+        new_sales = db.session.query(Sale.created_at).filter(
+            Sale.id <= high,
+            or_(Sale.id > watermark, Sale.created_at >= overlap_since),
+        ).execution_options(yield_per=5000)
+        for (created_at,) in new_sales:
+            if created_at is not None:
+                days[day_of(created_at)] = None
+
+        reopened = db.session.query(RollupPeriod.period, RollupPeriod.refreshed_at) \
+            .filter(RollupPeriod.name == SALES_DAILY, RollupPeriod.closed.is_(False)).all()
+        for period, refreshed_at in reopened:
+            days[period] = refreshed_at
+        # วันที่มีบิลใหม่และมีแถว rollup_period อยู่แล้ว (ปิดไปแล้ว) ต้องปิดซ้ำด้วย refreshed_at ปัจจุบัน
+        known = dict(db.session.query(RollupPeriod.period, RollupPeriod.refreshed_at).filter(
+            RollupPeriod.name == SALES_DAILY,
+            RollupPeriod.period.in_([day for day, seen in days.items() if seen is None]),
+        ).all()) if days else {}
+
+        for day in sorted(days):
+            recount_sales_day(day, days[day] or known.get(day))
+            db.session.commit()
+
+        if high != watermark:
+            _write_watermark(SALES_DAILY, high)
+            db.session.commit()
+        return len(days)
+
+
+def run_sales_rollup_job(app):
+    """งานของ scheduler (ทำงานนอก request จึงต้องเปิด app context เอง)"""
+    with app.app_context():
+        try:
+            refreshed = refresh_sales_rollup()
+            if refreshed:
+                logger.info('Sales rollup refreshed %s day(s)', refreshed)
+        except Exception:
+            db.session.rollback()
+            logger.exception('Sales rollup refresh failed')
+
+
+def run_tech_rollup_job(app):
+    with app.app_context():
+        try:
+            recounted = ensure_tech_rollup()
+            if recounted:
+                logger.info('Tech rollup recounted %s month(s)', recounted)
+        except Exception:
+            db.session.rollback()
+            logger.exception('Tech rollup refresh failed')
+
+
+def schedule_rollup_jobs(app, scheduler):
+    tech_minutes = app.config['TECH_ROLLUP_INTERVAL_MINUTES']
+    if tech_minutes > 0:
+        scheduler.add_job(run_tech_rollup_job, 'interval', minutes=tech_minutes, args=[app],
+                          id='tech_rollup', replace_existing=True, coalesce=True, max_instances=1,
+                          next_run_time=datetime.now(timezone.utc))
+    minutes = app.config['SALES_ROLLUP_INTERVAL_MINUTES']
+    if minutes > 0:
+        scheduler.add_job(run_sales_rollup_job, 'interval', minutes=minutes, args=[app],
+                          id='sales_rollup', replace_existing=True, coalesce=True, max_instances=1,
+                          next_run_time=datetime.now(timezone.utc))
+
+
+# --- Sales daily rollup: reading ---
+
+def sales_summary(date_from, date_to):
+    """
+    สรุปยอดขายช่วง [date_from, date_to] (รวมทั้งสองวัน) จากตาราง rollup เท่านั้น
+    คืน dict: by_payment, by_month, products (มากไปน้อย), salespeople, refreshed_at
+    """
+    in_range = lambda model: (model.day >= date_from, model.day <= date_to)
+
+    by_payment = {
+        status: {'count': count, 'amount': float(amount or 0.0)}
+        for status, count, amount in db.session.query(
+            SalesDailyPayment.payment_status, func.sum(SalesDailyPayment.sale_count), func.sum(SalesDailyPayment.amount)
+        ).filter(*in_range(SalesDailyPayment)).group_by(SalesDailyPayment.payment_status)
+    }
+
+    by_month = {}
+    for day, count, amount in db.session.query(
+        SalesDailyPayment.day, func.sum(SalesDailyPayment.sale_count), func.sum(SalesDailyPayment.amount)
+    ).filter(*in_range(SalesDailyPayment)).group_by(SalesDailyPayment.day):
+        entry = by_month.setdefault(month_start(day), {'count': 0, 'amount': 0.0})
+        entry['count'] += count
+        entry['amount'] += float(amount or 0.0)
+
+    products = db.session.query(
+        Product, func.sum(SalesDailyProduct.quantity).label('quantity'), func.sum(SalesDailyProduct.amount).label('amount')
+    ).join(SalesDailyProduct, SalesDailyProduct.product_id == Product.id) \
+        .filter(*in_range(SalesDailyProduct)).group_by(Product.id) \
+        .order_by(func.sum(SalesDailyProduct.amount).desc()).all()
+
+    salespeople = db.session.query(
+        User, func.sum(SalesDailySalesperson.sale_count).label('count'), func.sum(SalesDailySalesperson.amount).label('amount')
+    ).join(SalesDailySalesperson, SalesDailySalesperson.salesperson_id == User.id) \
+        .filter(*in_range(SalesDailySalesperson)).group_by(User.id) \
+        .order_by(func.sum(SalesDailySalesperson.amount).desc()).all()
+
+    watermark = db.session.get(RollupWatermark, SALES_DAILY)
+    return {
+        'by_payment': by_payment,
+        'by_month': sorted(by_month.items()),
+        'products': products,
+        'salespeople': salespeople,
+        'refreshed_at': watermark.updated_at if watermark else None,
+    }
+
+
+# --- CLI ---
+
+rollups_cli = AppGroup('rollups', help='จัดการตารางสรุปสำหรับรายงาน')
+
+
+@rollups_cli.command('tech')
+@click.option('--rebuild', is_flag=True, help='ล้างและนับทุกเดือนใหม่ (รวมเดือนที่ปิดแล้ว)')
+def tech_rollup_command(rebuild):
+    """ปิดเดือนที่จบแล้วและ seed เดือนปัจจุบันของ tech_monthly_stat"""
+    if rebuild:
+        db.session.execute(delete(RollupPeriod.__table__).where(RollupPeriod.__table__.c.name == TECH_MONTHLY))
+        db.session.execute(delete(TechMonthlyStat.__table__))
+        db.session.commit()
+    recounted = ensure_tech_rollup()
+    if recounted is None:
+        click.echo('Another process is refreshing the tech rollup; try again later.')
+    else:
+        click.echo(f'Recounted {recounted} month(s).')
+
+
+@rollups_cli.command('sales')
+@click.option('--rebuild', is_flag=True, help='ล้างและนับยอดขายรายวันใหม่ทั้งหมด')
+def sales_rollup_command(rebuild):
+    """ประมวลผลบิลใหม่และวันที่ถูกแก้ไขเข้าตารางยอดขายรายวัน (งานเดียวกับที่ scheduler เรียก)"""
+    if rebuild:
+        for model in (SalesDailyProduct, SalesDailySalesperson, SalesDailyPayment):
+            db.session.execute(delete(model.__table__))
+        db.session.execute(delete(RollupPeriod.__table__).where(RollupPeriod.__table__.c.name == SALES_DAILY))
+        db.session.execute(delete(RollupWatermark.__table__).where(RollupWatermark.__table__.c.name == SALES_DAILY))
+        db.session.commit()
+    refreshed = refresh_sales_rollup()
+    if refreshed is None:
+        click.echo('Another process is refreshing the sales rollup; try again later.')
+    else:
+        click.echo(f'Recounted {refreshed} day(s).')
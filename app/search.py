@@ -0,0 +1,269 @@
+"""
+ค้นหารวม (ลูกค้า / งานซ่อม / สินค้า) ด้วยความสามารถ full-text ของฐานข้อมูล
+
+ทุก entity ที่ค้นหาได้มีแถวใน search_document หนึ่งแถว (ข้อความที่ normalize แล้วรวมไว้ในคอลัมน์ content)
+แถวเหล่านี้ถูกเขียนใน after_flush ของ session เดียวกับข้อมูลจริง จึง commit/rollback ไปพร้อมกันเสมอ
+
+ดัชนี:
+- SQLite: ตาราง FTS5 แบบ external content (tokenizer 'trigram') ที่ trigger คอยซิงก์กับ search_document
+- Postgres: GIN index แบบ gin_trgm_ops (pg_trgm) บน content จัดอันดับด้วย word_similarity()
+- ฐานข้อมูลอื่น: LIKE ธรรมดา (ไม่มีดัชนี)
+
+ภาษาไทยไม่มีการเว้นวรรคระหว่างคำ การตัดคำด้วย whitespace จึงใช้ไม่ได้ — ทั้งสองแบบจึงใช้ trigram
+ซึ่งจับคู่ส่วนใดก็ได้ของข้อความโดยไม่ต้องตัดคำ คำค้นที่สั้นกว่า 3 ตัวอักษรจะถูกกรองด้วย LIKE แทน
+
+การแก้ข้อมูลที่ไม่ผ่าน ORM ให้ใช้คำสั่ง `flask search reindex` เพื่อสร้าง search_document ใหม่
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, delete, insert, text, func, and_, literal_column, table, column
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import SearchDocument, Customer, ServiceJob, Product
+
+TRIGRAM = 3
+REINDEX_BATCH_SIZE = 500
+
+SearchResult = namedtuple('SearchResult', ['entity_type', 'entity_id', 'title', 'subtitle', 'url'])
+SearchPage = namedtuple('SearchPage', ['items', 'page', 'has_more'])
+
+
+def normalize_search_text(value):
+    """NFC + casefold + ยุบ whitespace ให้ข้อความที่เก็บและคำค้นอยู่ในรูปเดียวกัน"""
+    value = unicodedata.normalize('NFC', value or '').casefold()
+    return ' '.join(value.split())
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+# --- ข้อมูลที่ค้นหาได้ของแต่ละ entity ---
+
+def _customer_document(customer):
+    # เก็บเบอร์โทรแบบตัวเลขล้วนไว้ด้วย เพื่อให้ค้น "0812345678" เจอ "081-234-5678"
+    return customer.name, customer.phone, [customer.name, customer.phone, _digits(customer.phone), customer.address]
+
+
+def _job_document(job):
+    return job.title, job.job_number, [job.job_number, job.title, job.problem_description]
+
+
+def _product_document(product):
+    return product.name, product.sku, [product.name, product.sku]
+
+
+# entity_type -> (model, คอลัมน์ที่ค้นหาได้, ฟังก์ชันสร้างเอกสาร, endpoint ของหน้ารายละเอียด, ชื่อ argument)
+SEARCH_SOURCES = {
+    'customer': (Customer, ('name', 'phone', 'address'), _customer_document, 'customer.edit_customer', 'id'),
+    'job': (ServiceJob, ('job_number', 'title', 'problem_description'), _job_document, 'service.job_detail', 'job_id'),
+    'product': (Product, ('name', 'sku'), _product_document, 'inventory.edit_product', 'id'),
+}
+
+_ENTITY_TYPES = {model: entity_type for entity_type, (model, *_) in SEARCH_SOURCES.items()}
+
+
+def build_document(entity_type, obj):
+    title, subtitle, parts = SEARCH_SOURCES[entity_type][2](obj)
+    return {
+        'entity_type': entity_type,
+        'entity_id': obj.id,
+        'title': (title or '')[:200],
+        'subtitle': (subtitle or '')[:200] or None,
+        'content': normalize_search_text(' '.join(p for p in parts if p)),
+    }
+
+
+# --- Incremental maintenance ---
+
+def _searchable_fields_changed(entity_type, obj):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in SEARCH_SOURCES[entity_type][1])
+
+
+def write_documents(connection, upserts, deletes):
+    """แทนที่เอกสารของ entity ที่เปลี่ยน (ลบแล้วเขียนใหม่) และลบเอกสารของ entity ที่ถูกลบ"""
+    documents = SearchDocument.__table__
+    stale = {}
+    for entity_type, entity_id in list(deletes) + [(d['entity_type'], d['entity_id']) for d in upserts]:
+        stale.setdefault(entity_type, []).append(entity_id)
+    for entity_type, ids in stale.items():
+        connection.execute(delete(documents).where(documents.c.entity_type == entity_type, documents.c.entity_id.in_(ids)))
+    if upserts:
+        connection.execute(insert(documents), upserts)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_search_documents(session, flush_context):
+    # ใน after_flush รายการ new/dirty/deleted ยังเป็นสถานะก่อน flush และ object ใหม่ได้ id แล้ว
+    upserts = []
+    deletes = []
+    for obj in session.new:
+        entity_type = _ENTITY_TYPES.get(type(obj))
+        if entity_type:
+            upserts.append(build_document(entity_type, obj))
+    for obj in session.dirty:
+        entity_type = _ENTITY_TYPES.get(type(obj))
+        if entity_type and _searchable_fields_changed(entity_type, obj):
+            upserts.append(build_document(entity_type, obj))
+    for obj in session.deleted:
+        entity_type = _ENTITY_TYPES.get(type(obj))
+        if entity_type:
+            deletes.append((entity_type, obj.id))
+    if upserts or deletes:
+        write_documents(session.connection(), upserts, deletes)
+
+
+# --- Index setup ---
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_document_fts USING fts5("
+    "content, content='search_document', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN "
+    "INSERT INTO search_document_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO search_document_fts(rowid, content) VALUES (new.id, new.content); END",
+)
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_content_trgm "
+    "ON search_document USING gin (content gin_trgm_ops)",
+)
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+# ชนิดดัชนีที่ใช้ได้จริงใน process นี้ ('sqlite', 'postgresql' หรือ None = LIKE ธรรมดา)
+_index_kind = None
+
+
+def create_search_index():
+    """
+    สร้างดัชนี full-text ตามชนิดฐานข้อมูล — หากสร้างไม่ได้ (SQLite เก่ากว่า 3.34 ไม่มี trigram tokenizer,
+    ไม่มีสิทธิ์ CREATE EXTENSION) จะยังค้นหาได้ด้วย LIKE แต่ไม่มีดัชนี
+    """
+    global _index_kind
+    dialect = _dialect()
+    statements = {'sqlite': _SQLITE_DDL, 'postgresql': _POSTGRES_DDL}.get(dialect)
+    if not statements:
+        _index_kind = None
+        return
+    try:
+        with db.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+    except Exception as e:
+        current_app.logger.warning(f"Full-text search index unavailable, falling back to LIKE: {e}")
+        _index_kind = None
+        return
+    _index_kind = dialect
+
+
+def ensure_search_index():
+    """สร้างดัชนีและเติม search_document ครั้งแรกหากยังว่าง"""
+    create_search_index()
+    if db.session.query(SearchDocument.id).first() is None:
+        reindex()
+
+
+def reindex():
+    """สร้าง search_document ใหม่ทั้งหมดจากตารางต้นทาง (อ่านเป็นชุดๆ) คืนจำนวนเอกสาร"""
+    connection = db.session.connection()
+    connection.execute(delete(SearchDocument.__table__))
+    total = 0
+    for entity_type, (model, *_) in SEARCH_SOURCES.items():
+        last_id = 0
+        while True:
+            batch = model.query.filter(model.id > last_id).order_by(model.id).limit(REINDEX_BATCH_SIZE).all()
+            if not batch:
+                break
+            connection.execute(insert(SearchDocument.__table__), [build_document(entity_type, obj) for obj in batch])
+            total += len(batch)
+            last_id = batch[-1].id
+    if _index_kind == 'sqlite':
+        connection.execute(text("INSERT INTO search_document_fts(search_document_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    return total
+
+
+# --- Querying ---
+
+_fts_table = table('search_document_fts', column('rowid'))
+
+
+def _fts5_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search(query, entity_type=None, page=1, per_page=20):
+    """ค้นหาเอกสารที่มีทุกคำในคำค้น เรียงตามความเกี่ยวข้อง คืน SearchPage"""
+    terms = normalize_search_text(query).split()
+    if not terms:
+        return SearchPage([], page, False)
+
+    doc = SearchDocument
+    columns = [doc.entity_type, doc.entity_id, doc.title, doc.subtitle]
+    like_filters = [doc.content.like(f'%{_escape_like(t)}%', escape='\\') for t in terms]
+    long_terms = [t for t in terms if len(t) >= TRIGRAM]
+
+    if _index_kind == 'sqlite' and long_terms:
+        # คำที่ยาวพอใช้ดัชนี FTS5 ส่วนคำสั้นกรองต่อด้วย LIKE บนแถวที่ผ่านแล้ว
+        match = ' AND '.join(_fts5_phrase(t) for t in long_terms)
+        fts_rank = literal_column('bm25(search_document_fts)')
+        query = db.session.query(*columns) \
+            .join(_fts_table, _fts_table.c.rowid == doc.id) \
+            .filter(text('search_document_fts MATCH :match').bindparams(match=match)) \
+            .filter(*[f for t, f in zip(terms, like_filters) if len(t) < TRIGRAM]) \
+            .order_by(fts_rank, doc.id)
+    elif _index_kind == 'postgresql':
+        # ILIKE '%term%' ใช้ GIN trigram index ได้ จัดอันดับด้วยความคล้ายกับคำค้นทั้งประโยค
+        query = db.session.query(*columns) \
+            .filter(and_(*[doc.content.ilike(f'%{_escape_like(t)}%', escape='\\') for t in terms])) \
+            .order_by(func.word_similarity(' '.join(terms), doc.content).desc(), doc.id)
+    else:
+        query = db.session.query(*columns).filter(*like_filters).order_by(doc.title, doc.id)
+
+    if entity_type:
+        query = query.filter(doc.entity_type == entity_type)
+
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    items = [
+        SearchResult(row.entity_type, row.entity_id, row.title, row.subtitle, _result_url(row.entity_type, row.entity_id))
+        for row in rows[:per_page]
+    ]
+    return SearchPage(items, page, len(rows) > per_page)
+
+
+def _result_url(entity_type, entity_id):
+    _, _, _, endpoint, arg = SEARCH_SOURCES[entity_type]
+    return url_for(endpoint, **{arg: entity_id})
+
+
+# --- CLI ---
+
+search_cli = AppGroup('search', help='จัดการดัชนีค้นหา (search_document)')
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    """สร้างดัชนีค้นหาใหม่จาก customer, service_job และ product"""
+    create_search_index()
+    total = reindex()
+    click.echo(f'Indexed {total} document(s).')
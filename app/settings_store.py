@@ -0,0 +1,148 @@
+"""
+การตั้งค่าระบบ (system_settings) แบบอ่านจากหน่วยความจำ
+
+แต่ละ worker โหลดการตั้งค่าทั้งหมดด้วย SELECT เดียวแล้วเก็บเป็น dict การอ่านจึงเป็นแค่ dict lookup
+ความสดของข้อมูลตรวจจากแถว 'system_settings' ในตาราง cache_version:
+- save() เขียนการตั้งค่าด้วย bulk upsert และเพิ่ม version ใน transaction เดียวกัน
+- แต่ละ worker อ่าน version (primary key) อย่างมากทุก SETTINGS_VERSION_CHECK_SECONDS วินาที
+  หาก version เปลี่ยนจึงโหลดการตั้งค่าใหม่ทั้งชุด
+
+ตัวอย่าง:
+    settings_store.get_str('shop_name', 'Comphone')
+    settings_store.get_int('receipt_copies', 1)
+"""
+
+import json
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import update, insert, select, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .models import SystemSettings, CacheVersion
+
+VERSION_NAME = 'system_settings'
+
+_TRUE_VALUES = {'1', 'true', 'yes', 'on', 'y'}
+
+
+def bump_cache_version(connection, name):
+    """เพิ่ม version ของชุดข้อมูลแบบ atomic (สร้างแถวหากยังไม่มี) ใน transaction ของผู้เรียก"""
+    table = CacheVersion.__table__
+    result = connection.execute(
+        update(table).where(table.c.name == name).values(version=table.c.version + 1, updated_at=func.now())
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(name=name, version=1, updated_at=func.now()))
+
+
+def read_cache_version(name):
+    table = CacheVersion.__table__
+    return db.session.execute(select(table.c.version).where(table.c.name == name)).scalar() or 0
+
+
+class SettingsStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _ensure_fresh(self):
+        interval = current_app.config['SETTINGS_VERSION_CHECK_SECONDS']
+        now = time.monotonic()
+        if self._values is not None and now - self._checked_at < interval:
+            return self._values
+
+        version = read_cache_version(VERSION_NAME)
+        with self._lock:
+            if self._values is None or version != self._version:
+                rows = db.session.query(SystemSettings.key, SystemSettings.value).all()
+                self._values = {key: value for key, value in rows}
+                self._version = version
+            self._checked_at = now
+            return self._values
+
+    def all(self):
+        return dict(self._ensure_fresh())
+
+    # --- Typed getters ---
+
+    def get(self, key, default=None):
+        value = self._ensure_fresh().get(key)
+        return default if value is None else value
+
+    def get_str(self, key, default=''):
+        value = self.get(key)
+        return default if value in (None, '') else value
+
+    def get_int(self, key, default=0):
+        try:
+            return int(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        try:
+            return float(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if value in (None, ''):
+            return default
+        return str(value).strip().lower() in _TRUE_VALUES
+
+    def get_json(self, key, default=None):
+        try:
+            return json.loads(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    # --- Writing ---
+
+    def save(self, values):
+        """
+        บันทึก {key: value} ด้วย upsert คำสั่งเดียว (เฉพาะค่าที่เปลี่ยนจริง) แล้วเพิ่ม version และ commit
+        คืนจำนวนค่าที่เปลี่ยน
+        เทียบกับค่าที่อ่านจากฐานข้อมูลใน transaction นี้ ไม่ใช่ cache ของ worker ซึ่งอาจเก่าได้
+        ถึง SETTINGS_VERSION_CHECK_SECONDS (worker อื่นอาจเพิ่งเปลี่ยนค่าไป)
+        """
+        table = SystemSettings.__table__
+        connection = db.session.connection()
+        current = dict(connection.execute(
+            select(table.c.key, table.c.value).where(table.c.key.in_(list(values)))
+        ).all())
+        changed = [{'key': key, 'value': value} for key, value in values.items() if current.get(key) != value]
+        if not changed:
+            return 0
+
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            upsert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table).values(changed)
+            connection.execute(upsert.on_conflict_do_update(
+                index_elements=[table.c.key], set_={'value': upsert.excluded.value}
+            ))
+        else:
+            new_rows = [row for row in changed if row['key'] not in current]
+            if new_rows:
+                connection.execute(insert(table), new_rows)
+            for row in changed:
+                if row['key'] in current:
+                    connection.execute(update(table).where(table.c.key == row['key']).values(value=row['value']))
+
+        bump_cache_version(connection, VERSION_NAME)
+        db.session.commit()
+        self.invalidate_local()
+        return len(changed)
+
+    def invalidate_local(self):
+        """ให้ worker นี้โหลดการตั้งค่าใหม่ในการอ่านครั้งถัดไป"""
+        with self._lock:
+            self._values = None
+
+
+settings_store = SettingsStore()
@@ -0,0 +1,70 @@
+// ช่องเลือกแบบ typeahead สำหรับ <select data-lookup-url="..."> ที่สร้างจาก ModelLookupField
+// เพิ่มช่องค้นหาไว้เหนือ select แล้วดึงรายการทีละหน้าจาก lookup endpoint ({items, page, has_more})
+(function () {
+    const MORE = '__more__';
+
+    function option(value, text, selected) {
+        const opt = document.createElement('option');
+        opt.value = value;
+        opt.textContent = text;
+        opt.selected = !!selected;
+        return opt;
+    }
+
+    function setup(select) {
+        const url = select.dataset.lookupUrl;
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control form-control-sm mb-1';
+        search.placeholder = select.dataset.placeholder || '';
+        select.parentNode.insertBefore(search, select);
+
+        const blank = select.querySelector('option[value=""]');
+        let query = '';
+        let page = 0;
+        let timer = null;
+        let loaded = false;
+
+        async function load(nextPage) {
+            const params = new URLSearchParams({ q: query, page: nextPage });
+            const response = await fetch(`${url}?${params}`);
+            if (!response.ok) return;
+            const data = await response.json();
+
+            const current = select.selectedOptions[0];
+            const keep = current && current.value && current.value !== MORE ? current : null;
+            if (nextPage === 1) {
+                select.innerHTML = '';
+                if (blank) select.appendChild(blank);
+                if (keep) select.appendChild(keep);
+            } else {
+                const more = select.querySelector(`option[value="${MORE}"]`);
+                if (more) more.remove();
+            }
+            data.items.forEach(item => {
+                if (keep && String(item.id) === keep.value) return;
+                const label = item.subtitle ? `${item.text} (${item.subtitle})` : item.text;
+                select.appendChild(option(item.id, label, false));
+            });
+            if (data.has_more) select.appendChild(option(MORE, 'แสดงเพิ่มเติม...', false));
+            page = data.page;
+            loaded = true;
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(() => { query = search.value.trim(); load(1); }, 250);
+        });
+        select.addEventListener('focus', function () { if (!loaded) load(1); });
+        select.addEventListener('change', function () {
+            if (select.value === MORE) {
+                select.selectedIndex = 0;
+                load(page + 1);
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-lookup-url]').forEach(setup);
+    });
+})();
@@ -0,0 +1,107 @@
+"""
+Cache ข้อมูลผู้ใช้ในหน่วยความจำของแต่ละ worker สำหรับ login_manager.user_loader และรายชื่อช่าง
+
+ทุกคำขอที่ login แล้วต้องโหลด current_user — ข้อมูลพนักงานเปลี่ยนน้อยมาก จึงเก็บสำเนาแบบ detached ไว้ต่อ process
+แล้วนำเข้า session ของคำขอด้วย session.merge(load=False) ซึ่งไม่ query ฐานข้อมูล (ใช้กับ relationship ได้ตามปกติ
+เช่น JobUpdate(author=current_user))
+
+ความสดของข้อมูล:
+- แต่ละรายการหมดอายุตาม USER_CACHE_SECONDS
+- เมื่อ commit การเพิ่ม/แก้ไข/ลบ User ผ่าน ORM จะ bump version token 'users' ใน shared cache
+  ทุก worker เห็น token ใหม่ในคำขอถัดไปและทิ้ง cache ทั้งหมด
+"""
+
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import db, cache
+from .models import User, UserRole
+
+VERSION_NAME = 'users'
+
+# บทบาทที่แสดงในรายชื่อช่างผู้รับผิดชอบงาน
+TECHNICIAN_ROLES = (UserRole.TECHNICIAN,)
+
+
+def _detached_copy(user):
+    """สำเนาของ User ที่ไม่ผูกกับ session ใด (มีเฉพาะค่าคอลัมน์) ใช้ร่วมกันได้ทุกคำขอ"""
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._users = {}
+        self._technicians = None
+
+    def _check_version(self):
+        version = cache.version(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                self._users = {}
+                self._technicians = None
+                self._version = version
+        return version
+
+    def _ttl(self):
+        return current_app.config['USER_CACHE_SECONDS']
+
+    def get(self, user_id):
+        """User ของคำขอปัจจุบัน — จาก cache (ไม่ query) หรือโหลดด้วย primary key แล้วเก็บสำเนาไว้"""
+        version = self._check_version()
+        entry = self._users.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            return db.session.merge(entry[1], load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            with self._lock:
+                if version == self._version:
+                    self._users[user_id] = (time.monotonic() + self._ttl(), _detached_copy(user))
+        return user
+
+    def technicians(self):
+        """รายชื่อช่าง (กรองตามบทบาทใน SQL) เป็นสำเนา detached แบบอ่านอย่างเดียว ใช้สำหรับแสดงผล"""
+        version = self._check_version()
+        entry = self._technicians
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+        users = User.query.filter(User.role.in_(TECHNICIAN_ROLES)) \
+            .order_by(User.first_name, User.last_name).all()
+        technicians = [_detached_copy(user) for user in users]
+        with self._lock:
+            if version == self._version:
+                self._technicians = (time.monotonic() + self._ttl(), technicians)
+        return technicians
+
+    def invalidate(self):
+        """ให้ทุก worker ทิ้ง cache ผู้ใช้ (เรียกเองหลังแก้ตาราง user โดยไม่ผ่าน ORM)"""
+        cache.bump(VERSION_NAME)
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_users_changed(session, flush_context):
+    if any(isinstance(obj, User) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['users_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_user_version(session):
+    if session.info.pop('users_changed', False):
+        user_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop('users_changed', None)
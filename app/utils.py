@@ -1,67 +1,236 @@
 import os
-from fpdf import FPDF
-from flask import current_app
+import copy
+import hashlib
+import multiprocessing
+import tempfile
+import threading
+import pytz
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, time
+from io import BytesIO
+from fpdf import FPDF, XPos, YPos
+from fpdf.fonts import SubsetMap
+from fontTools.ttLib import TTFont
+from flask import current_app, request
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
+# --- Date/Time Utility ---
+
+THAILAND_TZ = pytz.timezone('Asia/Bangkok')
+
+def parse_date_arg(name):
+    """อ่านวันที่รูปแบบ YYYY-MM-DD จาก query string (คืน None หากว่างหรือไม่ถูกต้อง)"""
+    value = request.args.get(name, '', type=str)
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def thai_day_start_utc(day):
+    """เวลาเริ่มต้นของวัน (ตามเวลาไทย) ในรูปแบบ UTC สำหรับใช้เป็นขอบเขตแบบ half-open"""
+    return THAILAND_TZ.localize(datetime.combine(day, time.min)).astimezone(pytz.utc)
+
+# --- Process Pool Utility ---
+
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+def shared_process_pool(name, workers, initializer=None, initargs=()):
+    """
+    ProcessPoolExecutor หนึ่งชุดต่อชื่อต่อ process — สร้างเมื่อใช้ครั้งแรกแล้วใช้ซ้ำทุก request
+    ใช้ start method แบบ spawn: การ fork worker ของ gunicorn ที่มีหลาย thread อาจ deadlock
+    (process ลูกได้ lock ที่ thread อื่นถืออยู่ตอน fork ติดไปด้วย)
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get(name)
+        if pool is None:
+            pool = _process_pools[name] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=initializer, initargs=initargs)
+        return pool
+
+def discard_process_pool(name, pool):
+    """ทิ้ง pool ที่เสีย (process ลูกตาย) ให้ shared_process_pool() สร้างใหม่ในครั้งถัดไป"""
+    with _process_pools_lock:
+        if _process_pools.get(name) is pool:
+            del _process_pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+
 # --- PDF Generation Utility ---
 
+RECEIPT_FONT_FAMILY = 'Sarabun'
+
+# เปลี่ยนค่านี้เมื่อแก้วิธี subset เพื่อให้ไฟล์ฟอนต์เดิมใน CACHE_DIR ไม่ถูกใช้อีก
+RECEIPT_FONT_SUBSET_VERSION = 3
+
+# ตารางที่ fpdf2 ตัดทิ้งตอนฝังฟอนต์ลง PDF อยู่แล้ว — ตัดตั้งแต่ตอน subset จะได้ไม่ต้องอ่านทุกเอกสาร
+RECEIPT_FONT_DROP_TABLES = ['GDEF', 'GPOS', 'GSUB', 'FFTM', 'MATH', 'hdmx', 'meta']
+
+# ตารางรายการสินค้า: (ความกว้าง, หัวคอลัมน์)
+RECEIPT_COLUMNS = ((100, 'รายการ'), (30, 'จำนวน'), (30, 'ราคา/หน่วย'), (30, 'ราคารวม'))
+RECEIPT_TOTAL_LABEL_WIDTH = sum(width for width, _ in RECEIPT_COLUMNS[:-1])
+
+_receipt_font_lock = threading.Lock()
+_receipt_font_path = None
+_receipt_font_template = None
+
+def _build_receipt_font():
+    """
+    subset ฟอนต์ Sarabun แล้วเก็บไว้ใน CACHE_DIR (คืน None หากไม่มีไฟล์ฟอนต์)
+    เก็บทุกตัวอักษรที่ฟอนต์รองรับ (ทั้ง cmap) ใบเสร็จจึงแสดงชื่อสินค้า/ลูกค้าได้ครบเท่าฟอนต์เต็ม
+    ตัดออกเฉพาะส่วนที่ fpdf2 ไม่ใช้ (hinting, ตาราง layout, glyph ที่ไม่มีตัวอักษรอ้างถึง)
+    """
+    source = os.path.join(current_app.static_folder, 'fonts', 'Sarabun-Regular.ttf')
+    if not os.path.exists(source):
+        return None
+
+    stat = os.stat(source)
+    fingerprint = hashlib.sha1(repr((stat.st_size, stat.st_mtime_ns, RECEIPT_FONT_SUBSET_VERSION)).encode()).hexdigest()[:12]
+    target = os.path.join(current_app.config['CACHE_DIR'], f'receipt-font-{fingerprint}.ttf')
+    if os.path.exists(target):
+        return target
+
+    from fontTools import subset as ftsubset
+
+    font = TTFont(source)
+    options = ftsubset.Options(notdef_outline=True, recommended_glyphs=True, layout_features=[], hinting=False)
+    options.drop_tables += RECEIPT_FONT_DROP_TABLES
+    subsetter = ftsubset.Subsetter(options)
+    subsetter.populate(unicodes=font.getBestCmap().keys())
+    subsetter.subset(font)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        font.save(f)
+    os.replace(tmp_path, target)
+    return target
+
+def get_receipt_font_path():
+    """
+    path ของฟอนต์ใบเสร็จที่ subset ไว้แล้ว — parse และ subset เพียงครั้งเดียวต่อ process
+    (worker อื่นที่เริ่มทีหลังจะใช้ไฟล์เดิมใน CACHE_DIR ได้ทันที)
+    """
+    global _receipt_font_path
+    if _receipt_font_path is None:
+        with _receipt_font_lock:
+            if _receipt_font_path is None:
+                _receipt_font_path = _build_receipt_font() or ''
+    return _receipt_font_path or None
+
+def init_receipt_font(path):
+    """กำหนด path ฟอนต์ใบเสร็จที่เตรียมไว้แล้ว สำหรับ process ลูก (เช่น process pool) ที่ไม่มี app context"""
+    global _receipt_font_path, _receipt_font_template
+    _receipt_font_path = path or ''
+    _receipt_font_template = None
+
+def _get_receipt_font_template():
+    """
+    ฟอนต์ใบเสร็จที่ fpdf2 parse แล้ว (cmap, ความกว้างตัวอักษร, font descriptor) พร้อมไบต์ของไฟล์
+    สร้างครั้งเดียวต่อ process แทนการ add_font() ทุกเอกสาร (คืน None หากไม่มีไฟล์ฟอนต์)
+    """
+    global _receipt_font_template
+    if _receipt_font_template is None:
+        font_path = get_receipt_font_path()
+        with _receipt_font_lock:
+            if _receipt_font_template is None:
+                template = ()
+                if font_path:
+                    with open(font_path, 'rb') as f:
+                        data = f.read()
+                    loader = FPDF()
+                    loader.add_font(RECEIPT_FONT_FAMILY, '', font_path)
+                    shared = loader.fonts[RECEIPT_FONT_FAMILY.lower()]
+                    shared.close()  # แต่ละเอกสารเปิด TTFont ของตัวเองจาก data
+                    template = (shared, data)
+                _receipt_font_template = template
+    return _receipt_font_template or None
+
+def add_receipt_font(pdf):
+    """
+    เพิ่มฟอนต์ใบเสร็จให้เอกสาร โดยใช้ข้อมูลที่ parse ไว้แล้วร่วมกัน คืนชื่อ family (หรือ None หากไม่มีฟอนต์)
+    ส่วนที่เปลี่ยนตามเอกสาร (glyph ที่ใช้, font descriptor, ตัว TTFont ที่ fpdf2 จะ subset ตอน output)
+    แยกเป็นของแต่ละเอกสาร จึงใช้พร้อมกันหลาย thread ได้
+    """
+    template = _get_receipt_font_template()
+    if template is None:
+        return None
+    shared, data = template
+    font = copy.copy(shared)
+    font.i = len(pdf.fonts) + 1
+    font.ttfont = TTFont(BytesIO(data), recalcTimestamp=False, lazy=True)
+    # ฟอนต์ที่ subset ไว้มี bounding box ถูกต้องอยู่แล้ว จึงไม่ต้องให้ fontTools
+    # แตกและคอมไพล์ glyph ทุกตัวใหม่ตอน output
+    font.ttfont.recalcBBoxes = False
+    font.desc = copy.copy(shared.desc)
+    font.missing_glyphs = []
+    font.biggest_size_pt = 0
+    font.subset = SubsetMap(font)
+    pdf.fonts[font.fontkey] = font
+    return RECEIPT_FONT_FAMILY
+
 class PDF(FPDF):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        font_path = os.path.join(current_app.static_folder, 'fonts', 'Sarabun-Regular.ttf')
-        if os.path.exists(font_path):
-            self.add_font('Sarabun', '', font_path)
-            self.set_font('Sarabun', '', 12)
-        else:
-            self.set_font('helvetica', '', 12)
+        self.receipt_font = add_receipt_font(self) or 'helvetica'
+        self.set_font(self.receipt_font, '', 12)
 
     def header(self):
-        self.set_font('Sarabun', '', 20)
-        self.cell(0, 10, 'ใบเสร็จรับเงิน / Receipt', 0, 1, 'C')
+        self.set_font(self.receipt_font, '', 20)
+        self.cell(0, 10, 'ใบเสร็จรับเงิน / Receipt', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         self.ln(10)
 
     def footer(self):
         self.set_y(-15)
-        self.set_font('Sarabun', '', 8)
-        self.cell(0, 10, f'หน้า {self.page_no()}', 0, 0, 'C')
+        self.set_font(self.receipt_font, '', 8)
+        self.cell(0, 10, f'หน้า {self.page_no()}', align='C')
 
     def customer_details(self, sale):
-        self.set_font('Sarabun', '', 12)
+        self.set_font(self.receipt_font, '', 12)
         customer_name = sale.customer.name if sale.customer else "ลูกค้าทั่วไป"
-        self.cell(0, 7, f"เลขที่ใบเสร็จ: {sale.sale_number}", ln=True)
-        self.cell(0, 7, f"วันที่: {sale.created_at.strftime('%d/%m/%Y %H:%M')}", ln=True)
-        self.cell(0, 7, f"ลูกค้า: {customer_name}", ln=True)
-        self.cell(0, 7, f"พนักงานขาย: {sale.salesperson.full_name}", ln=True)
+        self.cell(0, 7, f"เลขที่ใบเสร็จ: {sale.sale_number}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.cell(0, 7, f"วันที่: {sale.created_at.strftime('%d/%m/%Y %H:%M')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.cell(0, 7, f"ลูกค้า: {customer_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.cell(0, 7, f"พนักงานขาย: {sale.salesperson.full_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         self.ln(10)
 
-    def items_table(self, sale):
-        self.set_font('Sarabun', '', 12)
+    def items_table(self, sale, items):
+        self.set_font(self.receipt_font, '', 12)
         # Header
-        self.cell(100, 10, 'รายการ', 1, 0, 'C')
-        self.cell(30, 10, 'จำนวน', 1, 0, 'C')
-        self.cell(30, 10, 'ราคา/หน่วย', 1, 0, 'C')
-        self.cell(30, 10, 'ราคารวม', 1, 1, 'C')
+        for width, title in RECEIPT_COLUMNS[:-1]:
+            self.cell(width, 10, title, 1, align='C')
+        width, title = RECEIPT_COLUMNS[-1]
+        self.cell(width, 10, title, 1, align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         # Items
-        for item in sale.items:
-            self.cell(100, 10, item.product.name, 1)
-            self.cell(30, 10, str(item.quantity), 1, 0, 'C')
-            self.cell(30, 10, f"{item.price_per_unit:,.2f}", 1, 0, 'R')
-            self.cell(30, 10, f"{(item.quantity * item.price_per_unit):,.2f}", 1, 1, 'R')
+        name_w, qty_w, price_w, total_w = (width for width, _ in RECEIPT_COLUMNS)
+        for item in items:
+            self.cell(name_w, 10, item.product.name, 1)
+            self.cell(qty_w, 10, str(item.quantity), 1, align='C')
+            self.cell(price_w, 10, f"{item.price_per_unit:,.2f}", 1, align='R')
+            self.cell(total_w, 10, f"{(item.quantity * item.price_per_unit):,.2f}", 1, align='R',
+                      new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         # Total
-        self.set_font('Sarabun', '', 14)
-        self.cell(160, 10, 'ยอดรวมทั้งสิ้น (บาท)', 1, 0, 'R')
-        self.cell(30, 10, f"{sale.total_amount:,.2f}", 1, 1, 'R')
+        self.set_font(self.receipt_font, '', 14)
+        self.cell(RECEIPT_TOTAL_LABEL_WIDTH, 10, 'ยอดรวมทั้งสิ้น (บาท)', 1, align='R')
+        self.cell(total_w, 10, f"{sale.total_amount:,.2f}", 1, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
 
-def generate_receipt_pdf(sale):
+def generate_receipt_pdf(sale, items=None):
+    """
+    สร้าง PDF ใบเสร็จของบิล
+    items คือรายการ SaleItem ที่โหลด product มาแล้ว หากไม่ส่งมาจะดึงให้ใน query เดียว
+    """
+    if items is None:
+        from .receipts import load_sale_items
+        items = load_sale_items(sale)
     pdf = PDF()
     pdf.add_page()
     pdf.customer_details(sale)
-    pdf.items_table(sale)
-    return pdf.output(dest='S').encode('latin-1')
+    pdf.items_table(sale, items)
+    # fpdf2 คืนค่าเป็น bytearray อยู่แล้ว (ไม่ต้อง encode แบบ PyFPDF เดิม)
+    return bytes(pdf.output())
 
 # --- Google API Utility ---
 
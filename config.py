@@ -13,9 +13,68 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Shared cache (เก็บเป็นไฟล์ ใช้ร่วมกันระหว่าง gunicorn workers บนเครื่องเดียวกัน)
+    # ไดเรกทอรี cache ทุกชุดว่างไว้ = อยู่ใน instance folder ของแอป (สร้างด้วยสิทธิ์ 0700 และต้องเป็นของผู้ใช้ที่รันแอป)
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 2000))
+    DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 5))
+    # ข้อมูลผู้ใช้ที่ cache ไว้ในแต่ละ worker (ถูกล้างทันทีเมื่อมีการแก้ไขผู้ใช้ผ่านระบบ)
+    USER_CACHE_SECONDS = int(os.environ.get('USER_CACHE_SECONDS', 300))
+    # ระยะห่างสูงสุดที่แต่ละ worker จะตรวจ version ของการตั้งค่าระบบในฐานข้อมูล
+    SETTINGS_VERSION_CHECK_SECONDS = float(os.environ.get('SETTINGS_VERSION_CHECK_SECONDS', 2))
+    # รวมอยู่ใน ETag ของหน้าที่ตอบ 304 ได้ (app/conditional.py) — เปลี่ยนทุกครั้งที่ deploy แม่แบบ/โค้ดใหม่
+    APP_VERSION = os.environ.get('APP_VERSION', '')
+    # จำนวน fragment ของแม่แบบ (เช่น แถวในตารางรายการ) ที่แต่ละ worker เก็บไว้ได้ (0 = ปิด)
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+
+    # Cache ไฟล์ PDF ใบเสร็จ (content-addressed, จำกัดขนาดรวมแบบ LRU)
+    RECEIPT_CACHE_DIR = os.environ.get('RECEIPT_CACHE_DIR')
+    RECEIPT_CACHE_MAX_BYTES = int(os.environ.get('RECEIPT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    RECEIPT_CACHE_MAX_AGE = int(os.environ.get('RECEIPT_CACHE_MAX_AGE', 365 * 24 * 3600))
+    RECEIPT_EXPORT_WORKERS = int(os.environ.get('RECEIPT_EXPORT_WORKERS', 2))
+
+    # Cache รูป QR Code ของงานซ่อม (PNG, content-addressed, จำกัดขนาดรวมแบบ LRU)
+    # แผ่นฉลาก QR render ด้วย QR_LABEL_WORKERS process และพิมพ์ได้ครั้งละไม่เกิน QR_LABEL_MAX_JOBS งาน
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')
+    QR_CACHE_MAX_BYTES = int(os.environ.get('QR_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    QR_CACHE_MAX_AGE = int(os.environ.get('QR_CACHE_MAX_AGE', 365 * 24 * 3600))
+    QR_LABEL_WORKERS = int(os.environ.get('QR_LABEL_WORKERS', 2))
+    QR_LABEL_MAX_JOBS = int(os.environ.get('QR_LABEL_MAX_JOBS', 210))
+
+    # ตารางสรุปรายเดือนของช่าง: scheduler ปิดเดือนที่จบแล้วและ seed เดือนใหม่ทุก TECH_ROLLUP_INTERVAL_MINUTES นาที (0 = ปิด)
+    TECH_ROLLUP_INTERVAL_MINUTES = int(os.environ.get('TECH_ROLLUP_INTERVAL_MINUTES', 60))
+
+    # ตารางสรุปยอดขายรายวัน: scheduler ประมวลผลเฉพาะบิลใหม่ทุก SALES_ROLLUP_INTERVAL_MINUTES นาที (0 = ปิด)
+    # และตรวจบิลที่สร้างภายใน SALES_ROLLUP_OVERLAP_MINUTES นาทีล่าสุดซ้ำ เผื่อ transaction ที่ commit ช้ากว่าบิลเลขถัดไป
+    SALES_ROLLUP_INTERVAL_MINUTES = int(os.environ.get('SALES_ROLLUP_INTERVAL_MINUTES', 5))
+    SALES_ROLLUP_OVERLAP_MINUTES = int(os.environ.get('SALES_ROLLUP_OVERLAP_MINUTES', 10))
+
+    # รูปแบบเลขที่เอกสาร ({year}, {month} เป็นปี/เดือนตามเวลาไทย, {seq} คือลำดับที่เริ่มใหม่ทุกช่วงเวลาที่ใช้ในรูปแบบ)
+    # ค่าเริ่มต้น 1 = ทุกเลขจองจากฐานข้อมูลตามลำดับจริง (ตรวจสอบย้อนหลังได้)
+    # ตั้ง DOCUMENT_NUMBER_BLOCK_SIZE มากกว่า 1 เพื่อให้แต่ละ worker จองไว้ครั้งละหลายเลข (เร็วขึ้น แต่เลขระหว่าง worker สลับกันและข้ามได้)
+    SALE_NUMBER_FORMAT = os.environ.get('SALE_NUMBER_FORMAT') or 'SAL{year}{seq:06d}'
+    JOB_NUMBER_FORMAT = os.environ.get('JOB_NUMBER_FORMAT') or 'SRV{year}{seq:05d}'
+    DOCUMENT_NUMBER_BLOCK_SIZE = int(os.environ.get('DOCUMENT_NUMBER_BLOCK_SIZE', 1))
+
     # การตั้งค่า LINE Bot
     LINE_CHANNEL_SECRET = os.environ.get('LINE_CHANNEL_SECRET')
     LINE_CHANNEL_ACCESS_TOKEN = os.environ.get('LINE_CHANNEL_ACCESS_TOKEN')
+    # webhook ใส่ event ลงคิว (ไม่เกิน LINE_QUEUE_SIZE) ให้ worker LINE_WORKER_THREADS ตัวประมวลผลแล้วตอบ 200 ทันที
+    # webhookEventId ถูกเก็บไว้ LINE_EVENT_RETENTION_HOURS ชั่วโมงเพื่อตัด event ที่ถูกส่งซ้ำ
+    # event ที่ยังประมวลผลไม่เสร็จ (คิวเต็ม/worker ถูก restart) ถูกใส่คิวใหม่เมื่อค้างเกิน LINE_EVENT_REQUEUE_SECONDS วินาที
+    LINE_WORKER_THREADS = int(os.environ.get('LINE_WORKER_THREADS', 4))
+    LINE_QUEUE_SIZE = int(os.environ.get('LINE_QUEUE_SIZE', 1000))
+    LINE_EVENT_RETENTION_HOURS = int(os.environ.get('LINE_EVENT_RETENTION_HOURS', 24))
+    LINE_EVENT_REQUEUE_SECONDS = int(os.environ.get('LINE_EVENT_REQUEUE_SECONDS', 60))
+    # ปลายทาง Messaging API (ตั้งเป็น http://127.0.0.1:8765 เพื่อใช้ scripts/line_api_stub.py)
+    LINE_API_ENDPOINT = os.environ.get('LINE_API_ENDPOINT') or 'https://api.line.me'
+    # แจ้งเตือนสถานะงานซ่อม: รวม event ที่เกิดภายใน LINE_PUSH_BATCH_SECONDS วินาทีเป็น multicast ชุดเดียว
+    # ส่งพร้อมกันไม่เกิน LINE_PUSH_WORKERS คำขอ รวมไม่เกิน LINE_PUSH_RATE ครั้งต่อวินาที และลองใหม่ไม่เกิน LINE_PUSH_MAX_RETRIES ครั้งเมื่อถูกจำกัดอัตราหรือ API ล่ม
+    LINE_PUSH_ENABLED = os.environ.get('LINE_PUSH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LINE_PUSH_BATCH_SECONDS = float(os.environ.get('LINE_PUSH_BATCH_SECONDS', 2))
+    LINE_PUSH_RATE = float(os.environ.get('LINE_PUSH_RATE', 100))
+    LINE_PUSH_WORKERS = int(os.environ.get('LINE_PUSH_WORKERS', 4))
+    LINE_PUSH_MAX_RETRIES = int(os.environ.get('LINE_PUSH_MAX_RETRIES', 5))
 
 class DevelopmentConfig(Config):
     """
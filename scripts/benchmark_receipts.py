@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: เวลาที่ใช้สร้าง PDF ใบเสร็จหนึ่งใบ
+
+เปรียบเทียบ
+  - legacy:   แบบเดิม — add_font() ไฟล์ Sarabun เต็มไฟล์ทุกครั้ง และให้ fontTools คำนวณ bounding box ใหม่ตอน output
+  - current:  generate_receipt_pdf() — ใช้ฟอนต์ที่ subset และ parse ไว้ครั้งเดียวต่อ process
+
+ใช้ข้อมูลจำลองในหน่วยความจำ (SQLite in-memory) ไม่แตะฐานข้อมูลจริง
+    python scripts/benchmark_receipts.py [--items 5] [--runs 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+# --- Setup for running script standalone ---
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ['DATABASE_URL'] = 'sqlite://'
+# -----------------------------------------
+
+from flask import current_app
+from app import create_app
+from app.models import Sale, SaleItem, Product, Customer, User
+from app.utils import PDF, generate_receipt_pdf
+
+
+class LegacyPDF(PDF):
+    """PDF แบบเดิมก่อนการปรับปรุง: parse ฟอนต์เต็มไฟล์ทุกครั้งที่สร้างเอกสาร"""
+    def __init__(self, *args, **kwargs):
+        super(PDF, self).__init__(*args, **kwargs)
+        font_path = os.path.join(current_app.static_folder, 'fonts', 'Sarabun-Regular.ttf')
+        self.add_font('Sarabun', '', font_path)
+        self.receipt_font = 'Sarabun'
+        self.set_font(self.receipt_font, '', 12)
+
+
+def legacy_receipt_pdf(sale, items):
+    pdf = LegacyPDF()
+    pdf.add_page()
+    pdf.customer_details(sale)
+    pdf.items_table(sale, items)
+    return bytes(pdf.output())
+
+
+def build_sample_sale(item_count):
+    customer = Customer(name='สมชาย ใจดี', phone='0812345678')
+    salesperson = User(first_name='พนักงาน', last_name='ขายดี')
+    items = [
+        SaleItem(product=Product(name=f'อะไหล่ทดสอบ หมายเลข {i}', price=150.0 + i),
+                 quantity=1 + i % 3, price_per_unit=150.0 + i)
+        for i in range(item_count)
+    ]
+    sale = Sale(sale_number='SAL00000001', customer=customer, salesperson=salesperson,
+                total_amount=sum(i.quantity * i.price_per_unit for i in items),
+                created_at=datetime(2025, 1, 1, 10, 30))
+    return sale, items
+
+
+def measure(label, func, runs):
+    func()  # warm-up (รวมการเตรียมฟอนต์ครั้งแรกของ process)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<8} median {statistics.median(timings):7.2f} ms   "
+          f"min {min(timings):7.2f} ms   max {max(timings):7.2f} ms")
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5, help='จำนวนรายการสินค้าในใบเสร็จ')
+    parser.add_argument('--runs', type=int, default=50, help='จำนวนรอบที่วัด')
+    args = parser.parse_args()
+
+    app = create_app('dev')
+    with app.app_context():
+        sale, items = build_sample_sale(args.items)
+        legacy = measure('legacy', lambda: legacy_receipt_pdf(sale, items), args.runs)
+        current = measure('current', lambda: generate_receipt_pdf(sale, items), args.runs)
+        print(f"speed-up: {legacy / current:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
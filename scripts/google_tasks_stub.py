@@ -0,0 +1,157 @@
+"""
+Google Tasks API จำลองสำหรับทดสอบ migrate_from_google_tasks.py แบบ offline
+
+LocalTasksService มีหน้าตาเหมือน service object ของ googleapiclient เท่าที่ตัวย้ายข้อมูลใช้:
+    service.tasklists().list(maxResults=..., pageToken=...).execute()
+    service.tasks().list(tasklist=..., maxResults=..., pageToken=..., updatedMin=..., ...).execute()
+ข้อมูลอ่านจากไฟล์ JSON รูปแบบ {"tasklists": [{"id": ..., "title": ..., "items": [task, ...]}, ...]}
+(หรือรายการ task อย่างเดียว ซึ่งจะถือเป็น tasklist '@default')
+
+สร้างไฟล์ตัวอย่าง:
+    python scripts/google_tasks_stub.py sample_tasks.json --tasks 5000 --lists 3
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class StubHttpError(Exception):
+    """ข้อผิดพลาดจำลองของ API (มี resp.status เหมือน googleapiclient.errors.HttpError)"""
+
+    def __init__(self, status):
+        super().__init__(f'stub HTTP {status}')
+        self.resp = type('Response', (), {'status': status})()
+
+
+class _Request:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+def _page(items, max_results, page_token):
+    start = int(page_token or 0)
+    end = start + max_results
+    response = {'items': items[start:end]}
+    if end < len(items):
+        response['nextPageToken'] = str(end)
+    return response
+
+
+class _Tasklists:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, maxResults=100, pageToken=None):
+        lists = [{'id': list_id, 'title': title} for list_id, (title, _) in self._service.lists.items()
+                 if list_id != '@default' or len(self._service.lists) == 1]
+        return _Request(lambda: self._service._call(lambda: _page(lists, maxResults, pageToken)))
+
+
+class _Tasks:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, tasklist, maxResults=100, pageToken=None, updatedMin=None,
+             showCompleted=True, showHidden=True, showDeleted=False):
+        def fetch():
+            if tasklist not in self._service.lists:
+                raise StubHttpError(404)
+            items = self._service.lists[tasklist][1]
+            if updatedMin:
+                items = [t for t in items if t.get('updated', '') >= updatedMin]
+            if not showDeleted:
+                items = [t for t in items if not t.get('deleted')]
+            if not showCompleted:
+                items = [t for t in items if t.get('status') != 'completed']
+            return _page(items, maxResults, pageToken)
+        return _Request(lambda: self._service._call(fetch))
+
+
+class LocalTasksService:
+    """
+    latency: หน่วงเวลาต่อคำขอ (วินาที) เพื่อจำลอง network
+    fail_after: ให้คำขอที่ n+1 เป็นต้นไปล้มเหลว (ใช้ทดสอบการทำต่อจาก checkpoint)
+    """
+
+    def __init__(self, path, latency=0.0, fail_after=None):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {'tasklists': [{'id': '@default', 'title': 'Default', 'items': data}]}
+        self.lists = {
+            entry['id']: (entry.get('title', entry['id']), sorted(entry.get('items', []), key=lambda t: t['id']))
+            for entry in data['tasklists']
+        }
+        if '@default' not in self.lists and data['tasklists']:
+            self.lists['@default'] = self.lists[data['tasklists'][0]['id']]
+        self.latency = latency
+        self.fail_after = fail_after
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self, fn):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_after is not None and calls > self.fail_after:
+            raise StubHttpError(503)
+        return fn()
+
+    def tasklists(self):
+        return _Tasklists(self)
+
+    def tasks(self):
+        return _Tasks(self)
+
+
+def _rfc3339(value):
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def generate_sample(task_count, list_count, seed=1):
+    """ข้อมูลตัวอย่างในรูปแบบเดียวกับที่ระบบเก่าบันทึกไว้ใน notes ของ Google Tasks"""
+    rng = random.Random(seed)
+    customers = [(f'ลูกค้าทดสอบ {i}', f'08{rng.randint(10000000, 99999999)}', f'{i} ถนนทดสอบ กรุงเทพ')
+                 for i in range(max(1, task_count // 4))]
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    tasklists = [{'id': f'list{n}', 'title': f'งานซ่อม {n}', 'items': []} for n in range(list_count)]
+    for i in range(task_count):
+        name, phone, address = rng.choice(customers)
+        created = base + timedelta(hours=i * 3)
+        reports = []
+        for r in range(rng.randint(0, 3)):
+            reports.append('--- TECH_REPORT_START ---\n' + json.dumps({
+                'summary_date': _rfc3339(created + timedelta(days=r + 1)),
+                'work_summary': f'ตรวจเช็คครั้งที่ {r + 1}',
+            }, ensure_ascii=False) + '\n--- TECH_REPORT_END ---')
+        notes = f'ลูกค้า: {name}\nเบอร์โทรศัพท์: {phone}\nที่อยู่: {address}\nอาการ: เปิดไม่ติด'
+        if reports:
+            notes += '\n\n' + '\n'.join(reports)
+        tasklists[i % list_count]['items'].append({
+            'id': f'task{i:08d}',
+            'title': f'ซ่อมเครื่อง #{i}',
+            'notes': notes,
+            'status': 'completed' if rng.random() < 0.6 else 'needsAction',
+            'created': _rfc3339(created),
+            'updated': _rfc3339(created + timedelta(days=rng.randint(0, 30))),
+        })
+    return {'tasklists': tasklists}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='สร้างไฟล์ข้อมูลตัวอย่างสำหรับ Google Tasks จำลอง')
+    parser.add_argument('path')
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--lists', type=int, default=1)
+    args = parser.parse_args()
+    with open(args.path, 'w', encoding='utf-8') as f:
+        json.dump(generate_sample(args.tasks, args.lists), f, ensure_ascii=False)
+    print(f'Wrote {args.tasks} tasks in {args.lists} list(s) to {args.path}')
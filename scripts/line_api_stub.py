@@ -0,0 +1,122 @@
+"""
+LINE Messaging API จำลองสำหรับทดสอบการตอบกลับ/แจ้งเตือนแบบ offline
+
+รองรับ POST /v2/bot/message/reply, /push, /multicast เท่าที่แอปใช้ พร้อมพฤติกรรมที่ต้องรับมือ:
+- จำกัดอัตรา (--rate คำขอต่อวินาที) เกินแล้วตอบ 429 พร้อม Retry-After
+- ล้มเหลวแบบสุ่ม (--fail-rate) ด้วย 500
+- X-Line-Retry-Key ที่เคยสำเร็จแล้วตอบ 409 เหมือน API จริง
+GET /stats คืนสถิติเป็น JSON
+
+    python scripts/line_api_stub.py --port 8765 --rate 200 --latency 0.05
+    LINE_API_ENDPOINT=http://127.0.0.1:8765 LINE_CHANNEL_ACCESS_TOKEN=test flask line benchmark
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MESSAGE_PATHS = ('/v2/bot/message/reply', '/v2/bot/message/push', '/v2/bot/message/multicast')
+
+
+class StubState:
+    def __init__(self, rate, latency, fail_rate):
+        self.rate = rate
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.stats = Counter()
+        self.retry_keys = set()
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """นับคำขอในวินาทีปัจจุบัน คืน False เมื่อเกิน rate"""
+        second = int(time.time())
+        with self._lock:
+            window, count = self._window
+            count = count + 1 if window == second else 1
+            self._window = (second, count)
+            return not self.rate or count <= self.rate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'LineApiStub/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.server.state._lock:
+                self._send(200, dict(self.server.state.stats))
+        else:
+            self._send(404, {'message': 'Not found'})
+
+    def do_POST(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path not in MESSAGE_PATHS:
+            return self._send(404, {'message': 'Not found'})
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._send(401, {'message': 'Authentication failed'})
+        if state.latency:
+            time.sleep(state.latency)
+        if not state.admit():
+            with state._lock:
+                state.stats['rate_limited'] += 1
+            return self._send(429, {'message': 'The API rate limit has been exceeded.'}, {'Retry-After': '1'})
+        if state.fail_rate and random.random() < state.fail_rate:
+            with state._lock:
+                state.stats['failed'] += 1
+            return self._send(500, {'message': 'Internal server error (stub)'})
+
+        retry_key = self.headers.get('X-Line-Retry-Key')
+        payload = json.loads(body or b'{}')
+        with state._lock:
+            if retry_key and retry_key in state.retry_keys:
+                state.stats['duplicate_retry_key'] += 1
+                return self._send(409, {'message': 'The retry key is already accepted'},
+                                  {'x-line-accepted-request-id': retry_key})
+            if retry_key:
+                state.retry_keys.add(retry_key)
+            kind = self.path.rsplit('/', 1)[-1]
+            state.stats[kind] += 1
+            state.stats['messages'] += len(payload.get('messages', []))
+            state.stats['recipients'] += len(payload['to']) if kind == 'multicast' else 1
+        self._send(200, {})
+
+
+def serve(host, port, rate, latency, fail_rate):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(rate, latency, fail_rate)
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='LINE Messaging API จำลอง')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=int, default=200, help='คำขอต่อวินาทีก่อนตอบ 429 (0 = ไม่จำกัด)')
+    parser.add_argument('--latency', type=float, default=0.0, help='หน่วงเวลาต่อคำขอ (วินาที)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='สัดส่วนคำขอที่ตอบ 500')
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.rate, args.latency, args.fail_rate)
+    print(f'LINE API stub listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,9 +1,33 @@
-import os
+"""
+ย้าย/ซิงก์งานซ่อมจาก Google Tasks เข้าระบบ (ใบงาน ลูกค้า และบันทึกรายงานช่าง)
+
+- ดึงหน้าถัดไปล่วงหน้าด้วย thread แยก (หนึ่ง thread ต่อ tasklist ทำงานพร้อมกันได้หลาย list)
+  ระหว่างที่ thread หลักบันทึกหน้าก่อนหน้าลงฐานข้อมูล — page token ของ Google ต้องไล่ตามลำดับภายใน list เดียวกัน
+- ลูกค้าซ้ำตรวจจาก map (ชื่อ, เบอร์โทรตัวเลขล้วน) ที่โหลดครั้งเดียวตอนเริ่ม ไม่ query ทีละ task
+- commit ทีละหน้า พร้อมบันทึก page token ของหน้าถัดไปลงตาราง sync_state ใน transaction เดียวกัน
+  หากล้มเหลวกลางทาง รันคำสั่งเดิมอีกครั้งจะทำต่อจากหน้าที่ค้าง (--restart เพื่อเริ่มใหม่)
+- --incremental ดึงเฉพาะ task ที่แก้ไขหลังการรันที่สำเร็จครั้งล่าสุด (updatedMin ของ Tasks API)
+  ใบงานที่เคยย้ายแล้วถูกอัปเดต ส่วนรายงานช่างที่มีอยู่แล้วจะไม่ถูกเพิ่มซ้ำ
+
+ตัวอย่าง:
+    python scripts/migrate_from_google_tasks.py                     # ย้ายทั้งหมด (หรือทำต่อจากครั้งก่อน)
+    python scripts/migrate_from_google_tasks.py --incremental       # ซิงก์เฉพาะที่เปลี่ยน
+    python scripts/migrate_from_google_tasks.py --tasklist all      # ทุก tasklist ของบัญชี
+    python scripts/google_tasks_stub.py /tmp/tasks.json --tasks 5000
+    python scripts/migrate_from_google_tasks.py --stub /tmp/tasks.json   # ทดสอบ offline
+"""
+import argparse
+import hashlib
 import json
+import os
+import queue
 import re
-from datetime import datetime
-from dateutil.parser import parse as date_parse
 import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from dateutil.parser import parse as date_parse
 
 # --- Setup for running script standalone ---
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -12,16 +36,20 @@ load_dotenv()
 # -----------------------------------------
 
 from app import create_app, db
-from app.models import Customer, User, ServiceJob, JobUpdate, ServiceJobStatus
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from app.models import Customer, User, UserRole, ServiceJob, JobUpdate, ServiceJobStatus, SyncState
 
 # --- Configuration ---
 SCOPES = ['https://www.googleapis.com/auth/tasks.readonly', 'https://www.googleapis.com/auth/drive.readonly']
-GOOGLE_TASKS_LIST_ID = os.environ.get('GOOGLE_TASKS_LIST_ID', '@default') 
+GOOGLE_TASKS_LIST_ID = os.environ.get('GOOGLE_TASKS_LIST_ID', '@default')
+STATE_NAME = 'google_tasks'
+PAGE_SIZE = 100  # สูงสุดที่ Tasks API อนุญาต
+FETCH_RETRIES = 5
+# เผื่อเวลาของเครื่องกับ Google ไม่ตรงกัน เมื่อใช้เวลาเริ่มรันเป็น updatedMin ของรอบถัดไป
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+
+# --- Parsing notes (รูปแบบที่ระบบเก่าบันทึกไว้) ---
 
-# --- Helper Functions (from old app.py) ---
 def parse_customer_info_from_notes(notes):
     info = {'name': '', 'phone': '', 'address': ''}
     if not notes: return info
@@ -45,108 +73,367 @@ def parse_tech_report_from_notes(notes):
     base_notes = re.sub(r"--- TECH_REPORT_START ---.*?--- TECH_REPORT_END ---", "", notes, flags=re.DOTALL).strip()
     return history, base_notes
 
-# --- [แก้ไข] Main Migration Logic ---
+def _parse_time(value, default=None):
+    try:
+        parsed = date_parse(value) if value else None
+    except (ValueError, OverflowError, TypeError):
+        parsed = None
+    if parsed is None:
+        return default
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _utc_naive(value):
+    """รูปเดียวกับที่อ่านกลับจากคอลัมน์ DateTime ใช้เป็นคีย์เทียบรายงานซ้ำ"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+def _rfc3339(value):
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def job_number_for(task_id):
+    """
+    เลขที่ใบงานของ task (คงที่ทุกครั้งที่รัน จึงใช้ตรวจว่าเคยย้ายแล้ว)
+    id ของ Google ยาวเกินคอลัมน์ job_number (20 ตัวอักษร) จึงใช้ hash แทน
+    """
+    return 'MIG-' + hashlib.sha1(task_id.encode('utf-8')).hexdigest()[:16]
+
+def _legacy_job_number(task_id):
+    # เลขที่ใบงานที่สคริปต์รุ่นก่อนใช้ (ยังตรวจหาเพื่อไม่สร้างใบงานซ้ำ)
+    return f'MIG-{task_id}'
+
+
+# --- Google Tasks API ---
+
 def get_google_service_with_service_account(api_name, api_version):
     """สร้าง Service Object โดยใช้ Service Account JSON จาก Environment Variable"""
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
     service_account_json_str = os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON')
     if not service_account_json_str:
         raise ValueError("Environment variable 'GOOGLE_SERVICE_ACCOUNT_JSON' is not set on Render.com.")
-    
+    credentials_info = json.loads(service_account_json_str)
+    creds = service_account.Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+    return build(api_name, api_version, credentials=creds, cache_discovery=False)
+
+def _is_retryable(error):
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return status is None or int(status) in (429, 500, 502, 503, 504)
+
+def _execute(request_factory):
+    """เรียก API พร้อม retry แบบ exponential backoff สำหรับ error ชั่วคราว"""
+    for attempt in range(FETCH_RETRIES):
+        try:
+            return request_factory().execute()
+        except Exception as e:
+            if attempt == FETCH_RETRIES - 1 or not _is_retryable(e):
+                raise
+            time.sleep(min(2 ** attempt, 30))
+
+class TaskSource:
+    """
+    ห่อ service ของ Tasks API ให้ใช้จากหลาย thread ได้
+    (service ของ googleapiclient ใช้ httplib2 ซึ่งไม่ thread-safe จึงสร้างแยกต่อ thread)
+    """
+
+    def __init__(self, service_factory):
+        self._factory = service_factory
+        self._local = threading.local()
+
+    def service(self):
+        if not hasattr(self._local, 'service'):
+            self._local.service = self._factory()
+        return self._local.service
+
+    def tasklist_ids(self, requested):
+        if requested != 'all':
+            return [requested]
+        ids, token = [], None
+        while True:
+            response = _execute(lambda: self.service().tasklists().list(maxResults=100, pageToken=token))
+            ids.extend(item['id'] for item in response.get('items', []))
+            token = response.get('nextPageToken')
+            if not token:
+                return ids
+
+    def fetch_page(self, tasklist, page_token, updated_min):
+        params = dict(tasklist=tasklist, maxResults=PAGE_SIZE, showCompleted=True, showHidden=True)
+        if page_token:
+            params['pageToken'] = page_token
+        if updated_min:
+            params['updatedMin'] = updated_min
+        response = _execute(lambda: self.service().tasks().list(**params))
+        return response.get('items', []), response.get('nextPageToken')
+
+
+def prefetch_pages(source, cursors, updated_min, workers, depth):
+    """
+    ดึงหน้าของแต่ละ tasklist ด้วย thread pool แล้วส่งเข้าคิวขนาดจำกัด (depth หน้า)
+    คิวมีลำดับ FIFO และแต่ละ list มี thread เดียว หน้าของ list เดียวกันจึงมาตามลำดับเสมอ
+    คืน iterator ของ (tasklist, items, next_page_token)
+    """
+    pages = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    pending = queue.Queue()
+    for tasklist, page_token in cursors.items():
+        pending.put((tasklist, page_token))
+    done = object()
+
+    def worker():
+        while not stop.is_set():
+            try:
+                tasklist, page_token = pending.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                while not stop.is_set():
+                    items, next_token = source.fetch_page(tasklist, page_token, updated_min)
+                    pages.put((tasklist, items, next_token))
+                    if not next_token:
+                        break
+                    page_token = next_token
+            except Exception as e:
+                pages.put(e)
+                return
+        pages.put(done)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(workers, len(cursors))))]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
     try:
-        credentials_info = json.loads(service_account_json_str)
-        creds = service_account.Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
-        service = build(api_name, api_version, credentials=creds)
-        return service
-    except Exception as e:
-        print(f"Error creating Google service with Service Account: {e}")
+        while finished < len(threads):
+            page = pages.get()
+            if page is done:
+                finished += 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        stop.set()
+        # ให้ thread ที่รอใส่คิวอยู่ได้ออกจากลูป
+        while any(thread.is_alive() for thread in threads):
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+# --- Checkpoint ---
+
+def load_state():
+    row = db.session.get(SyncState, STATE_NAME)
+    return json.loads(row.state) if row else {}
+
+def stage_state(state):
+    """บันทึกสถานะลง session (commit พร้อมข้อมูลของหน้านั้น)"""
+    row = db.session.get(SyncState, STATE_NAME)
+    if row is None:
+        row = SyncState(name=STATE_NAME)
+        db.session.add(row)
+    row.state = json.dumps(state)
+
+
+# --- Writing ---
+
+def _phone_digits(value):
+    return re.sub(r'\D', '', value or '')
+
+def _customer_key(name, phone):
+    return ' '.join((name or '').split()).casefold(), _phone_digits(phone)
+
+class Migrator:
+    def __init__(self, author):
+        self.author_id = author.id
+        self.customers = {}
+        self.stats = dict(tasks=0, skipped=0, jobs_created=0, jobs_updated=0, customers_created=0, updates_added=0)
+
+    def load_customers(self):
+        """map (ชื่อ, เบอร์ตัวเลขล้วน) -> customer id ของลูกค้าทั้งหมด อ่านครั้งเดียว"""
+        rows = db.session.query(Customer.id, Customer.name, Customer.phone).execution_options(yield_per=5000)
+        for customer_id, name, phone in rows:
+            self.customers.setdefault(_customer_key(name, phone), customer_id)
+
+    def _customer_for(self, info):
+        key = _customer_key(info['name'], info['phone'])
+        customer = self.customers.get(key)
+        if customer is None:
+            customer = Customer(name=info['name'][:100], phone=(info['phone'] or None) and info['phone'][:20],
+                                address=info['address'] or None)
+            db.session.add(customer)
+            self.customers[key] = customer
+            self.stats['customers_created'] += 1
+        return customer
+
+    def process_page(self, items):
+        """เพิ่ม/อัปเดตใบงานของหนึ่งหน้า (ไม่ commit) — query ฐานข้อมูลคงที่ต่อหน้า ไม่ขึ้นกับจำนวน task"""
+        tasks = [task for task in items if task.get('id') and not task.get('deleted')]
+        numbers = {}
+        for task in tasks:
+            numbers[job_number_for(task['id'])] = task['id']
+            numbers[_legacy_job_number(task['id'])] = task['id']
+        existing = {}
+        if numbers:
+            for job in ServiceJob.query.filter(ServiceJob.job_number.in_(list(numbers))):
+                existing[numbers[job.job_number]] = job
+        known_updates = set()
+        if existing:
+            rows = db.session.query(JobUpdate.service_job_id, JobUpdate.summary, JobUpdate.created_at) \
+                .filter(JobUpdate.service_job_id.in_([job.id for job in existing.values()]))
+            known_updates = {(job_id, summary, _utc_naive(created_at)) for job_id, summary, created_at in rows}
+
+        with db.session.no_autoflush:
+            for task in tasks:
+                self.stats['tasks'] += 1
+                tech_reports, base_notes_text = parse_tech_report_from_notes(task.get('notes', ''))
+                customer_info = parse_customer_info_from_notes(base_notes_text)
+                if not customer_info.get('name'):
+                    self.stats['skipped'] += 1
+                    continue
+
+                customer = self._customer_for(customer_info)
+                status = ServiceJobStatus.COMPLETED if task.get('status') == 'completed' else ServiceJobStatus.RECEIVED
+                created_at = _parse_time(task.get('created'), datetime.now(timezone.utc))
+                title = (task.get('title') or '(ไม่มีชื่อ)')[:200]
+
+                job = existing.get(task['id'])
+                if job is None:
+                    job = ServiceJob(job_number=job_number_for(task['id']), created_at=created_at)
+                    db.session.add(job)
+                    self.stats['jobs_created'] += 1
+                else:
+                    self.stats['jobs_updated'] += 1
+                job.title = title
+                job.problem_description = base_notes_text
+                job.status = status
+                if status == ServiceJobStatus.COMPLETED and job.completed_at is None:
+                    job.completed_at = _parse_time(task.get('completed'))
+                if isinstance(customer, Customer):
+                    job.customer = customer
+                else:
+                    job.customer_id = customer
+
+                for report in tech_reports:
+                    summary = report.get('work_summary') or 'No summary provided.'
+                    report_date = _parse_time(report.get('summary_date'), created_at)
+                    if job.id is not None and (job.id, summary, _utc_naive(report_date)) in known_updates:
+                        continue
+                    db.session.add(JobUpdate(service_job=job, author_id=self.author_id,
+                                             summary=summary, created_at=report_date))
+                    self.stats['updates_added'] += 1
+
+        db.session.flush()
+        # ลูกค้าที่เพิ่งสร้างได้ id แล้ว เก็บเป็น id เพื่อไม่ถือ ORM object ไว้ข้าม commit
+        for key, value in self.customers.items():
+            if isinstance(value, Customer):
+                self.customers[key] = value.id
+
+
+def migrate_data(source, tasklist, incremental=False, restart=False, workers=4, prefetch=8):
+    state = load_state()
+    if restart:
+        state.pop('run', None)
+    run = state.get('run')
+    if run and (run.get('incremental', False) != incremental):
+        print(f"[INFO] Resuming the unfinished {'incremental' if run.get('incremental') else 'full'} run.")
+        incremental = run.get('incremental', False)
+
+    if not run:
+        updated_min = None
+        if incremental:
+            if not state.get('last_sync'):
+                print("[ERROR] No completed run to sync from. Run a full migration first.")
+                return None
+            updated_min = state['last_sync']
+        lists = source.tasklist_ids(tasklist)
+        run = {
+            'started_at': _rfc3339(datetime.now(timezone.utc)),
+            'incremental': incremental,
+            'updated_min': updated_min,
+            'cursors': {list_id: None for list_id in lists},
+        }
+        state['run'] = run
+        stage_state(state)
+        db.session.commit()
+        print(f"[1/3] Starting {'incremental' if incremental else 'full'} run over {len(lists)} task list(s)"
+              + (f" (tasks updated since {updated_min})" if updated_min else ''))
+    else:
+        print(f"[1/3] Resuming run started at {run['started_at']} ({len(run['cursors'])} task list(s) left)")
+
+    default_user = User.query.filter_by(role=UserRole.ADMIN).order_by(User.id).first()
+    if not default_user:
+        print("[ERROR] Default admin user not found. Please ensure the app has run once to create it.")
         return None
 
-def get_all_google_tasks(service):
-    tasks = []
-    request = service.tasks().list(tasklist=GOOGLE_TASKS_LIST_ID, maxResults=100, showCompleted=True, showHidden=True)
-    while request is not None:
-        response = request.execute()
-        tasks.extend(response.get('items', []))
-        request = service.tasks().list_next(request, response)
-    return tasks
+    migrator = Migrator(default_user)
+    print("[2/3] Loading existing customers...")
+    migrator.load_customers()
+    print(f"      {len(migrator.customers)} customers loaded.")
+
+    print("[3/3] Fetching and saving pages...")
+    started = time.monotonic()
+    pages = prefetch_pages(source, dict(run['cursors']), run['updated_min'], workers, prefetch)
+    for page_number, (list_id, items, next_token) in enumerate(pages, start=1):
+        try:
+            migrator.process_page(items)
+            if next_token:
+                run['cursors'][list_id] = next_token
+            else:
+                run['cursors'].pop(list_id, None)
+            stage_state(state)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        elapsed = time.monotonic() - started
+        print(f"  -> page {page_number} ({list_id}): {migrator.stats['tasks']} tasks, "
+              f"{migrator.stats['tasks'] / elapsed if elapsed else 0:.0f} tasks/s")
+
+    # รอบนี้ครบทุก list แล้ว: รอบ incremental ถัดไปดึงตั้งแต่เวลาเริ่มรอบนี้ (เผื่อเวลาคลาดเคลื่อน)
+    last_sync = date_parse(run['started_at']) - INCREMENTAL_OVERLAP
+    stage_state({'last_sync': _rfc3339(last_sync)})
+    db.session.commit()
+    return migrator.stats
 
-def migrate_data():
-    print("--- Starting Data Migration using Service Account ---")
 
-    # 1. Get Google Service
-    print("[1/5] Authenticating with Google Service Account...")
-    try:
-        tasks_service = get_google_service_with_service_account('tasks', 'v1')
-        if not tasks_service:
-            return
-        print("      Authentication successful.")
-    except Exception as e:
-        print(f"[ERROR] Could not authenticate. Details: {e}")
-        return
-
-    # 2. Fetch all tasks
-    print("[2/5] Fetching all tasks from Google Tasks...")
-    all_tasks = get_all_google_tasks(tasks_service)
-    print(f"      Found {len(all_tasks)} tasks to migrate.")
-
-    app = create_app(os.getenv('FLASK_CONFIG') or 'prod') # Use 'prod' config on server
+def main():
+    parser = argparse.ArgumentParser(description='ย้ายงานซ่อมจาก Google Tasks เข้าระบบ')
+    parser.add_argument('--tasklist', default=GOOGLE_TASKS_LIST_ID, help="tasklist id หรือ 'all'")
+    parser.add_argument('--incremental', action='store_true', help='ดึงเฉพาะ task ที่แก้ไขหลังการรันสำเร็จครั้งล่าสุด')
+    parser.add_argument('--restart', action='store_true', help='ไม่ทำต่อจาก checkpoint เดิม เริ่มรอบใหม่')
+    parser.add_argument('--workers', type=int, default=4, help='จำนวน thread ที่ดึงข้อมูลพร้อมกัน (ต่อ tasklist)')
+    parser.add_argument('--prefetch', type=int, default=8, help='จำนวนหน้าที่ดึงรอไว้ล่วงหน้าสูงสุด')
+    parser.add_argument('--stub', metavar='JSON', help='ใช้ Google Tasks จำลองจากไฟล์ (ทดสอบ offline)')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='หน่วงเวลาต่อคำขอของ API จำลอง (วินาที)')
+    parser.add_argument('--stub-fail-after', type=int, help='ให้ API จำลองล้มเหลวหลังคำขอที่ n (ทดสอบการทำต่อ)')
+    args = parser.parse_args()
+
+    print("--- Starting Google Tasks migration ---")
+    if args.stub:
+        from google_tasks_stub import LocalTasksService
+        stub = LocalTasksService(args.stub, latency=args.stub_latency, fail_after=args.stub_fail_after)
+        source = TaskSource(lambda: stub)
+    else:
+        source = TaskSource(lambda: get_google_service_with_service_account('tasks', 'v1'))
+
+    app = create_app(os.getenv('FLASK_CONFIG') or 'prod')  # Use 'prod' config on server
     with app.app_context():
-        print("[3/5] Preparing database...")
-        default_user = User.query.filter_by(role='ADMIN').first()
-        if not default_user:
-            print("[ERROR] Default admin user not found. Please ensure the app has run once to create it.")
-            return
-        print("      Database ready.")
-
-        print("[4/5] Processing and inserting data...")
-        for i, task_data in enumerate(all_tasks):
-            print(f"  -> Processing task {i+1}/{len(all_tasks)}: {task_data.get('title')}")
-            notes = task_data.get('notes', '')
-            tech_reports, base_notes_text = parse_tech_report_from_notes(notes)
-            customer_info = parse_customer_info_from_notes(base_notes_text)
-
-            if not customer_info.get('name'):
-                print("     [SKIPPING] Task has no customer name.")
-                continue
-
-            customer = Customer.query.filter_by(name=customer_info['name'], phone=customer_info['phone']).first()
-            if not customer:
-                customer = Customer(name=customer_info['name'], phone=customer_info['phone'], address=customer_info['address'])
-                db.session.add(customer)
-                db.session.flush()
-
-            job_status = ServiceJobStatus.COMPLETED if task_data.get('status') == 'completed' else ServiceJobStatus.RECEIVED
-            job_number = f"MIG-{task_data.get('id', i)}"
-            created_at_val = date_parse(task_data.get('created')) if task_data.get('created') else datetime.utcnow()
-
-            service_job = ServiceJob(
-                job_number=job_number, title=task_data.get('title'),
-                problem_description=base_notes_text, customer_id=customer.id,
-                status=job_status, created_at=created_at_val
-            )
-            db.session.add(service_job)
-            db.session.flush()
-
-            for report in tech_reports:
-                summary = report.get('work_summary', 'No summary provided.')
-                try: report_date = date_parse(report.get('summary_date'))
-                except: report_date = service_job.created_at
-                job_update = JobUpdate(
-                    service_job_id=service_job.id, author_id=default_user.id,
-                    summary=summary, created_at=report_date
-                )
-                db.session.add(job_update)
-        
-        print("[5/5] Committing all changes to the database...")
         try:
-            db.session.commit()
-            print("      Successfully committed all data.")
+            stats = migrate_data(source, args.tasklist, incremental=args.incremental, restart=args.restart,
+                                 workers=args.workers, prefetch=args.prefetch)
         except Exception as e:
-            print(f"[ERROR] An error occurred during database commit. Rolling back.")
-            print(f"      Details: {e}")
-            db.session.rollback()
+            print(f"[ERROR] Migration stopped: {e}")
+            print("      Progress up to the last saved page is kept; run the same command again to resume.")
+            sys.exit(1)
+    if stats is not None:
+        print("--- Data Migration Finished ---")
+        print('      ' + ', '.join(f'{key}={value}' for key, value in stats.items()))
 
-    print("--- Data Migration Finished ---")
 
 if __name__ == '__main__':
-    migrate_data()
\ No newline at end of file
+    main()